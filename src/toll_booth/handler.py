@@ -1,15 +1,17 @@
+import importlib
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
-import rapidjson
-from algernon import ajson
 from algernon.aws import lambda_logged
 from algernon.aws.task_setup import stated, rebuild_event
 from aws_xray_sdk.core import xray_recorder
 
-from toll_booth.obj.graph.serializers import GqlDecoder
-from toll_booth.tasks import mutation, vertex, edge_connection, query
+from toll_booth.obj import metrics
+from toll_booth.obj.config_cache import ConfigCache
+from toll_booth.obj.graph.loader import clear_request_loader
+from toll_booth.obj.graph.serializers import GqlEncoder
 
 
 ENVIRON_VARIABLES = [
@@ -19,48 +21,56 @@ ENVIRON_VARIABLES = [
     'GRAPH_GQL_ENDPOINT',
     'GRAPH_DB_ENDPOINT',
     'GRAPH_DB_READER_ENDPOINT',
+    'GRAPH_DB_READER_ENDPOINTS',
     'INDEX_TABLE_NAME',
     'SENSITIVE_TABLE_NAME',
     'PROGRESS_TABLE_NAME',
     'FIRE_HOSE_NAME'
 ]
 
+_task_modules = {
+    'Vertex': 'toll_booth.tasks.vertex',
+    'Mutation': 'toll_booth.tasks.mutation',
+    'EdgeConnection': 'toll_booth.tasks.edge_connection',
+    'Query': 'toll_booth.tasks.query'
+}
+
+
+def _metric_dimensions(event):
+    entry = event
+    if isinstance(event, list):
+        entry = event[0] if event else {}
+    return {'type_name': str(entry.get('type_name')), 'field_name': str(entry.get('field_name'))}
+
 
 def _load_config(variable_names):
-    client = boto3.client('ssm')
-    response = client.get_parameters(Names=[x for x in variable_names])
-    results = [(x['Name'], x['Value']) for x in response['Parameters']]
-    for entry in results:
-        os.environ[entry[0]] = entry[1]
+    config_cache = ConfigCache.for_variables(variable_names)
+    config_cache.load()
+    logging.debug(f'config cache stats: {config_cache.stats}')
+
+
+def invalidate_config():
+    ConfigCache.invalidate_all()
+
+
+def _get_task_module(type_name):
+    module_name = _task_modules.get(type_name)
+    if module_name is None:
+        return None
+    return importlib.import_module(module_name)
 
 
 def _decision_tree(type_name, field_name, args, source, result, request, identity):
     decision_args = (type_name, field_name, args, source, result, request, identity)
-    if type_name == 'Vertex':
-        if field_name in vertex.known_fields:
-            return vertex.handler(*decision_args)
-    if type_name == 'Mutation':
-        if field_name in mutation.known_fields:
-            return mutation.handler(*decision_args)
-    if type_name == 'EdgeConnection':
-        if field_name in edge_connection.known_fields:
-            return edge_connection.handler(*decision_args)
-    if type_name == 'Query':
-        return query.handler(*decision_args)
+    task_module = _get_task_module(type_name)
+    if task_module is not None:
+        known_fields = getattr(task_module, 'known_fields', None)
+        if known_fields is None or field_name in known_fields:
+            return task_module.handler(*decision_args)
     raise RuntimeError(f'could not resolve how to deal with {type_name}.{field_name}')
 
 
-@lambda_logged
-@xray_recorder.capture('alg_gql')
-def handler(event, context):
-    logging.info(f'received a call to run a graph_object command: event/context: {event}/{context}')
-    _load_config(ENVIRON_VARIABLES)
-    if isinstance(event, list):
-        results = []
-        for entry in event:
-            result = handler(entry, context)
-            results.append(result)
-        return results
+def _parse_entry(event):
     gql_context = event['context']
     field_name = event['field_name']
     type_name = event['type_name']
@@ -69,24 +79,106 @@ def handler(event, context):
     result = gql_context['result']
     request = gql_context['request']
     identity = gql_context['identity']
+    return type_name, field_name, args, source, result, request, identity
+
 
-    results = _decision_tree(type_name, field_name, args, source, result, request, identity)
+def _resolve_entry(event):
+    with metrics.timed('resolve'):
+        results = _decision_tree(*_parse_entry(event))
     logging.debug(f'results after the decision tree: {results}')
-    strung_results = ajson.dumps(results)
-    logging.debug(f'results after first round of json encoding: {strung_results}')
-    encoded_results = rapidjson.loads(strung_results, object_hook=GqlDecoder.object_hook)
+    with metrics.timed('gql_encoding'):
+        encoded_results = GqlEncoder.encode(results)
     logging.info(f'results after GQL encoding: {encoded_results}')
     return encoded_results
 
 
+def _resolve_batch_entry(event):
+    """the result of one entry of a BatchInvoke, in the shape the batch response template reads an error from"""
+    try:
+        return {'data': _resolve_entry(event)}
+    except Exception as e:
+        metrics.record_count('batch_entry_errors')
+        logging.error(f'failed to resolve batch entry: {event}, error: {e}', exc_info=True)
+        return {'data': None, 'errorMessage': str(e), 'errorType': type(e).__name__}
+
+
+def _group_batchable_entries(events):
+    batch_groups = {}
+    for pointer, event in enumerate(events):
+        type_name, field_name = event.get('type_name'), event.get('field_name')
+        task_module = _get_task_module(type_name)
+        if field_name in getattr(task_module, 'batch_fields', ()):
+            batch_groups.setdefault((type_name, field_name), []).append(pointer)
+    return batch_groups
+
+
+def _resolve_batch_group(type_name, field_name, events):
+    task_module = _get_task_module(type_name)
+    entries = [_parse_entry(x)[2:] for x in events]
+    with metrics.timed('resolve'):
+        results = task_module.batch_handler(type_name, field_name, entries)
+    logging.debug(f'results after the batched decision tree: {results}')
+    with metrics.timed('gql_encoding'):
+        return [GqlEncoder.encode(x) for x in results]
+
+
+def _resolve_batch(events):
+    results = [None] * len(events)
+    unresolved = set(range(len(events)))
+    for (type_name, field_name), pointers in _group_batchable_entries(events).items():
+        try:
+            batch_results = _resolve_batch_group(type_name, field_name, [events[x] for x in pointers])
+        except Exception as e:
+            logging.error(f'failed to resolve batch of {type_name}.{field_name}, '
+                          f'falling back to resolving each entry: {e}', exc_info=True)
+            continue
+        for pointer, batch_result in zip(pointers, batch_results):
+            results[pointer] = {'data': batch_result}
+            unresolved.discard(pointer)
+    unresolved = sorted(unresolved)
+    max_workers = min(len(unresolved), int(os.getenv('BATCH_MAX_WORKERS', 10)))
+    if max_workers <= 1:
+        entry_results = [_resolve_batch_entry(events[x]) for x in unresolved]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            entry_results = list(executor.map(_resolve_batch_entry, [events[x] for x in unresolved]))
+    for pointer, entry_result in zip(unresolved, entry_results):
+        results[pointer] = entry_result
+    return results
+
+
+@lambda_logged
+@xray_recorder.capture('alg_gql')
+def handler(event, context):
+    logging.info(f'received a call to run a graph_object command: event/context: {event}/{context}')
+    start = time.perf_counter()
+    with metrics.timed('config_load'):
+        _load_config(ENVIRON_VARIABLES)
+    try:
+        if isinstance(event, list):
+            metrics.record_count('batch_size', len(event))
+            return _resolve_batch(event)
+        return _resolve_entry(event)
+    finally:
+        clear_request_loader()
+        metrics.record_time('invocation', (time.perf_counter() - start) * 1000)
+        metrics.flush(_metric_dimensions(event))
+
+
 @lambda_logged
 @stated
 @xray_recorder.capture('alg_gql_sfn')
 def sfn_handler(event, context):
     event = rebuild_event(event)
     logging.info(f'received a call to run graphing operation, sfn mode: {event}/{context}')
+    start = time.perf_counter()
     task_kwargs = event['task_kwargs']
     type_name = task_kwargs['type_name']
     field_name = task_kwargs['field_name']
     args = task_kwargs['args']
-    return mutation.handler(type_name, field_name, args, {}, {}, {}, {})
+    try:
+        mutation = _get_task_module('Mutation')
+        return mutation.handler(type_name, field_name, args, {}, {}, {}, {})
+    finally:
+        metrics.record_time('invocation', (time.perf_counter() - start) * 1000)
+        metrics.flush(_metric_dimensions(task_kwargs))
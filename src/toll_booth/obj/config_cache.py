@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from toll_booth.obj import metrics, registry
+
+_max_parameters_per_call = 10
+
+
+class ConfigCache:
+    """Holds the values pulled from the parameter store for the life of the container
+
+        values are written into os.environ when loaded, so the rest of the code can keep using os.getenv,
+        the store is only called again once the ttl has lapsed or the cache has been invalidated
+    """
+    _caches: Dict[Tuple[str, ...], 'ConfigCache'] = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, variable_names: List[str], ttl: float = None, background_refresh: bool = None):
+        if ttl is None:
+            ttl = float(os.getenv('CONFIG_CACHE_TTL', 300))
+        if background_refresh is None:
+            background_refresh = os.getenv('CONFIG_CACHE_BACKGROUND_REFRESH', 'False') == 'True'
+        self._variable_names = tuple(variable_names)
+        self._ttl = ttl
+        self._background_refresh = background_refresh
+        self._values = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._errors = 0
+
+    @classmethod
+    def for_variables(cls, variable_names: List[str]) -> 'ConfigCache':
+        cache_key = tuple(variable_names)
+        with cls._caches_lock:
+            if cache_key not in cls._caches:
+                cls._caches[cache_key] = cls(variable_names)
+            return cls._caches[cache_key]
+
+    @classmethod
+    def invalidate_all(cls):
+        with cls._caches_lock:
+            for config_cache in cls._caches.values():
+                config_cache.invalidate()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def is_expired(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at >= self._ttl
+
+    @property
+    def values(self) -> Dict[str, str]:
+        return dict(self._values)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'refreshes': self._refreshes,
+            'errors': self._errors
+        }
+
+    def load(self) -> Dict[str, str]:
+        if not self.is_expired:
+            self._hits += 1
+            metrics.record_count('config_cache_hits')
+            return self._values
+        if self.is_loaded and self._background_refresh:
+            self._hits += 1
+            metrics.record_count('config_cache_hits')
+            self._start_background_refresh()
+            return self._values
+        with self._lock:
+            if not self.is_expired:
+                self._hits += 1
+                metrics.record_count('config_cache_hits')
+                return self._values
+            self._misses += 1
+            metrics.record_count('config_cache_misses')
+            self._refresh()
+        logging.debug(f'config cache loaded from the parameter store, stats: {self.stats}')
+        return self._values
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = None
+
+    def _start_background_refresh(self):
+        # a lock of its own, as the one guarding the values may be held through a fetch from the store
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._background_worker, daemon=True)
+            self._refresh_thread.start()
+
+    def _background_worker(self):
+        generation = self._generation
+        try:
+            values = _fetch_parameters(self._variable_names)
+        except Exception as e:
+            self._errors += 1
+            logging.warning(f'background refresh of the config cache failed, serving stale values: {e}')
+            return
+        with self._lock:
+            self._refreshes += 1
+            if generation == self._generation:
+                self._store(values)
+
+    def _refresh(self):
+        self._store(_fetch_parameters(self._variable_names))
+
+    def _store(self, values: Dict[str, str]):
+        self._values = values
+        self._loaded_at = time.monotonic()
+        self._apply()
+
+    def _apply(self):
+        for variable_name, variable_value in self._values.items():
+            os.environ[variable_name] = variable_value
+
+
+def _fetch_parameters(variable_names: Tuple[str, ...]) -> Dict[str, str]:
+    client = registry.get_boto3_client('ssm')
+    values = {}
+    for pointer in range(0, len(variable_names), _max_parameters_per_call):
+        names = list(variable_names[pointer:pointer + _max_parameters_per_call])
+        response = client.get_parameters(Names=names)
+        for entry in response['Parameters']:
+            values[entry['Name']] = entry['Value']
+    return values
@@ -0,0 +1,212 @@
+import csv
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+from toll_booth.obj import metrics, registry
+from toll_booth.obj.graph.generators import derive_stored_values
+from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
+from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty
+
+_vertex_system_columns = ('~id', '~label')
+_edge_system_columns = ('~id', '~from', '~to', '~label')
+
+
+def _from_decimal(value: Decimal):
+    """a whole decimal is stored as a Long and any other as a Double, as it is bound for a gremlin upsert"""
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+def _csv_type(value: Any) -> str:
+    if isinstance(value, Decimal):
+        value = _from_decimal(value)
+    if isinstance(value, bool):
+        return 'Bool'
+    if isinstance(value, int):
+        return 'Long'
+    if isinstance(value, float):
+        return 'Double'
+    if isinstance(value, datetime):
+        return 'Date'
+    return 'String'
+
+
+def _csv_value(value: Any) -> str:
+    if isinstance(value, Decimal):
+        value = _from_decimal(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _vertex_columns(object_properties: List[ObjectProperty]) -> Dict[str, List[str]]:
+    """vertex properties have set cardinality, so a property keeps both of its values in one column
+
+        a header names each property once, with one type for all of its values, so a property whose values
+        differ in type, as a number does from its property map, is written as String
+    """
+    stored_values = {}
+    for object_property in object_properties:
+        stored_values.setdefault(object_property.property_name, []).extend(derive_stored_values(object_property))
+    columns = {}
+    for property_name, values in stored_values.items():
+        csv_types = {_csv_type(x) for x in values}
+        csv_type = csv_types.pop() if len(csv_types) == 1 else 'String'
+        columns[f'{property_name}:{csv_type}[]'] = [_csv_value(x).replace(';', '\\;') for x in values]
+    return columns
+
+
+def _edge_columns(object_properties: List[ObjectProperty]) -> Dict[str, List[str]]:
+    """edge properties hold a single value, the last one written, just as they are left by the gremlin upsert"""
+    last_values = {}
+    for object_property in object_properties:
+        last_values[object_property.property_name] = derive_stored_values(object_property)[-1]
+    return {f'{x}:{_csv_type(y)}': [_csv_value(y)] for x, y in last_values.items()}
+
+
+class _Shard:
+    def __init__(self, file_name: str, local_path: str, header: Tuple[str, ...]):
+        self.file_name = file_name
+        self.local_path = local_path
+        self.header = header
+        self.rows = 0
+        self._file = open(local_path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(header)
+
+    @property
+    def size(self) -> int:
+        return self._file.tell()
+
+    def write(self, row: List[str]):
+        self._writer.writerow(row)
+        self.rows += 1
+
+    def close(self):
+        self._file.close()
+
+
+class BulkLoadExporter:
+    """Streams vertexes and edges into the csv files read by the Neptune bulk loader, for loads too big for gremlin
+
+        every property is encoded as generators encodes it for an upsert, the value and then its property map.
+        rows are written as they arrive, to a shard for each distinct set of columns, and a shard is closed once it
+        reaches shard_bytes, so memory stays flat however many objects pass through. at most max_open_shards are
+        open at once, the least recently used is closed to make room. the destination is a local directory, or an
+        s3://bucket/prefix, in which case each shard is staged in the temp directory and uploaded as it closes
+    """
+    def __init__(self,
+                 destination: str,
+                 shard_bytes: int = None,
+                 max_open_shards: int = None,
+                 s3_client=None):
+        if shard_bytes is None:
+            shard_bytes = int(os.getenv('BULK_EXPORT_SHARD_BYTES', 64 * 1024 * 1024))
+        if max_open_shards is None:
+            max_open_shards = int(os.getenv('BULK_EXPORT_MAX_OPEN_SHARDS', 16))
+        self._bucket_name, self._prefix = None, destination
+        if destination.startswith('s3://'):
+            self._bucket_name, _, self._prefix = destination[len('s3://'):].partition('/')
+            self._prefix = self._prefix.strip('/')
+        else:
+            os.makedirs(destination, exist_ok=True)
+        self._shard_bytes = shard_bytes
+        self._max_open_shards = max(max_open_shards, 1)
+        self._s3_client = s3_client
+        self._open_shards: 'OrderedDict[Tuple[str, ...], _Shard]' = OrderedDict()
+        self._shard_counts = {'vertexes': 0, 'edges': 0}
+        self._written = []
+
+    @property
+    def written(self) -> List[str]:
+        """the location of every shard closed so far"""
+        return list(self._written)
+
+    def export_vertexes(self, vertex_scalars: Iterable[InputVertex]) -> int:
+        exported = 0
+        for vertex_scalar in vertex_scalars:
+            object_properties = list(vertex_scalar.vertex_properties or [])
+            object_properties.extend([vertex_scalar.id_value, vertex_scalar.identifier_stem])
+            system_values = [vertex_scalar.internal_id, vertex_scalar.vertex_type]
+            self._write('vertexes', _vertex_system_columns, system_values, _vertex_columns(object_properties))
+            exported += 1
+        metrics.record_count('bulk_export_vertexes', exported)
+        return exported
+
+    def export_edges(self, edge_scalars: Iterable[InputEdge]) -> int:
+        exported = 0
+        for edge_scalar in edge_scalars:
+            object_properties = list(edge_scalar.edge_properties or [])
+            object_properties.extend([edge_scalar.id_value, edge_scalar.identifier_stem])
+            system_values = [
+                edge_scalar.internal_id, edge_scalar.source_vertex_internal_id,
+                edge_scalar.target_vertex_internal_id, edge_scalar.edge_label
+            ]
+            self._write('edges', _edge_system_columns, system_values, _edge_columns(object_properties))
+            exported += 1
+        metrics.record_count('bulk_export_edges', exported)
+        return exported
+
+    def close(self) -> List[str]:
+        """closes, and uploads, every shard still open, returning the location of every shard written"""
+        while self._open_shards:
+            _, shard = self._open_shards.popitem(last=False)
+            self._finish(shard)
+        return self.written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _write(self, kind: str, system_columns: Tuple[str, ...], system_values: List[str],
+               columns: Dict[str, List[str]]):
+        property_headers = tuple(sorted(columns))
+        header = system_columns + property_headers
+        shard = self._open_shards.get(header)
+        if shard is None:
+            shard = self._open(kind, header)
+        self._open_shards.move_to_end(header)
+        shard.write(system_values + [';'.join(columns[x]) for x in property_headers])
+        if shard.size >= self._shard_bytes:
+            del self._open_shards[header]
+            self._finish(shard)
+
+    def _open(self, kind: str, header: Tuple[str, ...]) -> _Shard:
+        if len(self._open_shards) >= self._max_open_shards:
+            _, least_recent = self._open_shards.popitem(last=False)
+            self._finish(least_recent)
+        self._shard_counts[kind] += 1
+        file_name = f'{kind}-{self._shard_counts[kind]:05d}.csv'
+        local_path = os.path.join(self._prefix, file_name)
+        if self._bucket_name is not None:
+            local_path = os.path.join(tempfile.gettempdir(), f'bulk_export-{os.getpid()}-{id(self)}-{file_name}')
+        shard = _Shard(file_name, local_path, header)
+        self._open_shards[header] = shard
+        return shard
+
+    def _finish(self, shard: _Shard):
+        shard.close()
+        metrics.record_count('bulk_export_shards')
+        location = self._upload(shard) if self._bucket_name is not None else shard.local_path
+        logging.info(f'wrote {shard.rows} rows to the bulk load shard: {location}')
+        self._written.append(location)
+
+    def _upload(self, shard: _Shard) -> str:
+        s3_client = self._s3_client
+        if s3_client is None:
+            s3_client = registry.get_boto3_client('s3')
+        file_key = '/'.join(x for x in (self._prefix, shard.file_name) if x)
+        try:
+            with metrics.timed('bulk_export_upload'):
+                s3_client.upload_file(shard.local_path, self._bucket_name, file_key)
+        finally:
+            os.remove(shard.local_path)
+        return f's3://{self._bucket_name}/{file_key}'
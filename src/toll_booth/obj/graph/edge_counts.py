@@ -0,0 +1,29 @@
+import os
+from typing import Any, Dict
+
+edge_count_prefix = '__edge_count#'
+edge_counts_ready = '__edge_counts_ready'
+
+
+def materialize_edge_counts() -> bool:
+    return os.getenv('MATERIALIZED_EDGE_COUNTS', 'false').lower() == 'true'
+
+
+def edge_count_key(edge_label: str) -> str:
+    return f'{edge_count_prefix}{edge_label}'
+
+
+def is_edge_count_key(property_name: str) -> bool:
+    """the counters, and the flag saying they can be trusted, are kept on the vertex but are not vertex properties"""
+    return property_name.startswith(edge_count_prefix) or property_name == edge_counts_ready
+
+
+def parse_label_counts(label_counts: Dict[str, Any]) -> Dict[str, int]:
+    """strips the counter prefix from materialized counts, and drops the labels counted down to nothing"""
+    parsed = {}
+    for edge_label, edge_count in label_counts.items():
+        if edge_label.startswith(edge_count_prefix):
+            edge_label = edge_label[len(edge_count_prefix):]
+        if int(edge_count) > 0:
+            parsed[edge_label] = int(edge_count)
+    return parsed
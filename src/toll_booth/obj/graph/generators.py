@@ -1,33 +1,39 @@
-import json
 from datetime import datetime
-from typing import List, Dict, Tuple
+from typing import Any, List, Dict, Tuple
 
 from algernon import ajson
 
+from toll_booth.obj.graph.edge_counts import edge_count_key, edge_count_prefix, edge_counts_ready, \
+    materialize_edge_counts
 from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty, SensitivePropertyValue, \
     StoredPropertyValue, LocalPropertyValue
 from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
+from toll_booth.obj.graph.trident.queries import GremlinQuery
 
 
-def _derive_object_properties(object_properties: List[ObjectProperty]) -> str:
-    property_commands = []
+def _derive_object_properties(query: GremlinQuery, object_properties: List[ObjectProperty]) -> GremlinQuery:
     for entry in object_properties:
-        property_commands.append(_derive_property_value(entry))
-    return f".{'.'.join(property_commands)}"
+        _derive_property_value(query, entry)
+    return query
 
 
-def _derive_property_value(object_property: ObjectProperty) -> str:
+def _derive_property_value(query: GremlinQuery, object_property: ObjectProperty) -> GremlinQuery:
     property_name = object_property.property_name
+    for stored_property_value in derive_stored_values(object_property):
+        if isinstance(stored_property_value, datetime):
+            query.append(".property({}, datetime({}))", property_name, stored_property_value.isoformat())
+        else:
+            query.append(".property({}, {})", property_name, stored_property_value)
+    return query
+
+
+def derive_stored_values(object_property: ObjectProperty) -> List[Any]:
+    """the values written to the graph for an object property, in order: the value itself, then its property map"""
     stored_property_value, property_map = _derive_property_map(object_property)
-    commands = [
-        f"property('{property_name}', {stored_property_value})",
-        f"property('{property_name}', '{ajson.dumps(property_map)}')",
-    ]
-    command = '.'.join(commands)
-    return command
+    return [stored_property_value, ajson.dumps(property_map)]
 
 
-def _derive_property_map(object_property: ObjectProperty) -> Tuple[str, Dict]:
+def _derive_property_map(object_property: ObjectProperty) -> Tuple[Any, Dict]:
     property_value = object_property.property_value
     property_type = type(property_value).__name__
     if property_type == 'SensitivePropertyValue':
@@ -39,36 +45,34 @@ def _derive_property_map(object_property: ObjectProperty) -> Tuple[str, Dict]:
     raise NotImplementedError(f'do not know how to parse object_property of type: {property_type}')
 
 
-def _derive_sensitive_property_map(object_property: SensitivePropertyValue) -> Tuple[str, Dict]:
+def _derive_sensitive_property_map(object_property: SensitivePropertyValue) -> Tuple[Any, Dict]:
     property_map = {
         '__typename': 'SensitivePropertyValue',
         'data_type': object_property.data_type,
         'pointer': object_property.property_value
     }
-    property_value = f'"{object_property.property_value}"'
-    return property_value, property_map
+    return str(object_property.property_value), property_map
 
 
-def _derive_stored_property_map(object_property: StoredPropertyValue) -> Tuple[str, Dict]:
+def _derive_stored_property_map(object_property: StoredPropertyValue) -> Tuple[Any, Dict]:
     property_map = {
         '__type_name': 'StoredPropertyValue',
         'data_type': object_property.data_type,
         'storage_class': object_property.storage_class,
         'storage_uri': object_property.storage_uri
     }
-    property_value = f'"{object_property.property_value}"'
-    return property_value, property_map
+    return str(object_property.property_value), property_map
 
 
-def _derive_local_property_map(object_property: LocalPropertyValue) -> Tuple[str, Dict]:
+def _derive_local_property_map(object_property: LocalPropertyValue) -> Tuple[Any, Dict]:
     property_value = object_property.property_value
     property_data_type = object_property.data_type
     if property_data_type == 'S':
-        property_value = json.dumps(property_value)
+        property_value = str(property_value)
+    if property_data_type == 'B':
+        property_value = property_value == 'true'
     if property_data_type == 'DT':
-        date_time_value = datetime.utcfromtimestamp(property_value)
-        graphed_datetime_value = date_time_value.isoformat()
-        property_value = f"datetime('{graphed_datetime_value}')"
+        property_value = datetime.utcfromtimestamp(float(property_value))
     property_map = {
         '__typename': 'LocalPropertyValue',
         'data_type': property_data_type,
@@ -83,45 +87,51 @@ def create_edge_command(edge_internal_id: str,
                         identifier_stem: ObjectProperty,
                         from_internal_id: str,
                         to_internal_id: str,
-                        edge_properties: List[ObjectProperty] = None) -> str:
-    import re
+                        edge_properties: List[ObjectProperty] = None,
+                        count_edges: bool = None) -> GremlinQuery:
     if not edge_properties:
         edge_properties = []
+    if count_edges is None:
+        count_edges = materialize_edge_counts()
     edge_properties.append(id_value)
     edge_properties.append(identifier_stem)
-    command = f"g" \
-        f".E('{edge_internal_id}')" \
-        f".fold()" \
-        f".coalesce(unfold()," \
-        f" addE('{edge_label}').from(g.V('{from_internal_id}')).to(g.V('{to_internal_id}'))" \
-        f".property(id, '{edge_internal_id}')" \
-        f"{_derive_object_properties(edge_properties)})"
-    command = re.sub(r'\s+', ' ', command)
-    return command
+    # looked up from its source vertex rather than g.E(), so the upsert can also run as a step of a larger traversal
+    query = GremlinQuery.build(
+        "g.V({}).outE({}).hasId({}).fold().coalesce(unfold(), addE({}).from(V({})).to(V({})).property(id, {})",
+        from_internal_id, edge_label, edge_internal_id, edge_label, from_internal_id, to_internal_id,
+        edge_internal_id)
+    _derive_object_properties(query, edge_properties)
+    if count_edges:
+        # inside the addE branch, so the counters only move when the edge is new
+        query.append(".sideEffect(bothV()")
+        append_count_update(query, edge_label, 1)
+        query.append(")")
+    return query.append(")")
 
 
 def create_vertex_command(vertex_internal_id: str,
                           vertex_type: str,
                           id_value: ObjectProperty,
                           identifier_stem: ObjectProperty,
-                          vertex_properties: List[ObjectProperty] = None) -> str:
-    import re
+                          vertex_properties: List[ObjectProperty] = None,
+                          count_edges: bool = None) -> GremlinQuery:
     if not vertex_properties:
         vertex_properties = []
+    if count_edges is None:
+        count_edges = materialize_edge_counts()
     vertex_properties.append(id_value)
     vertex_properties.append(identifier_stem)
-    command = f"g" \
-        f".V('{vertex_internal_id}')" \
-        f".fold()" \
-        f".coalesce(unfold()," \
-        f" addV('{vertex_type}')" \
-        f".property(id, '{vertex_internal_id}')" \
-        f"{_derive_object_properties(vertex_properties)})"
-    command = re.sub(r'\s+', ' ', command)
-    return command
-
-
-def create_vertex_command_from_scalar(vertex_scalar: InputVertex):
+    query = GremlinQuery.build(
+        "g.V({}).fold().coalesce(unfold(), addV({}).property(id, {})",
+        vertex_internal_id, vertex_type, vertex_internal_id)
+    _derive_object_properties(query, vertex_properties)
+    if count_edges:
+        # a new vertex has no edges, so its counters start out ready
+        query.append(".property(single, {}, true)", edge_counts_ready)
+    return query.append(")")
+
+
+def create_vertex_command_from_scalar(vertex_scalar: InputVertex) -> GremlinQuery:
     kwargs = {
         'vertex_internal_id': vertex_scalar.internal_id,
         'vertex_type': vertex_scalar.vertex_type,
@@ -132,7 +142,7 @@ def create_vertex_command_from_scalar(vertex_scalar: InputVertex):
     return create_vertex_command(**kwargs)
 
 
-def create_edge_command_from_scalar(edge_scalar: InputEdge):
+def create_edge_command_from_scalar(edge_scalar: InputEdge) -> GremlinQuery:
     kwargs = {
         'edge_internal_id': edge_scalar.internal_id,
         'edge_label': edge_scalar.edge_label,
@@ -143,3 +153,34 @@ def create_edge_command_from_scalar(edge_scalar: InputEdge):
         'edge_properties': edge_scalar.edge_properties
     }
     return create_edge_command(**kwargs)
+
+
+def append_count_update(query: GremlinQuery, edge_label: str, delta: int) -> GremlinQuery:
+    """adds delta to the counter of edge_label on the vertexes the traversal is on"""
+    counter_key = edge_count_key(edge_label)
+    return query.append(
+        '.property(single, {}, union(values({}), constant({})).sum())', counter_key, counter_key, delta)
+
+
+def append_edge_count_query(query: GremlinQuery, edge_labels: List[str] = None) -> GremlinQuery:
+    """the edge count of each label, for the vertex the traversal is on
+
+        a vertex carrying the ready flag is answered from its counters, one property for each label,
+        any other vertex, added before the counters were kept or not yet rebuilt, by counting its edges
+    """
+    query.append('choose(has({}), properties(', edge_counts_ready)
+    if edge_labels:
+        query.append('{}', [edge_count_key(x) for x in edge_labels])
+    query.append(').hasKey(startingWith({})).group().by(key).by(value()), bothE()', edge_count_prefix)
+    if edge_labels:
+        query.append('.hasLabel({})', edge_labels)
+    return query.append('.groupCount().by(label))')
+
+
+def create_edge_count_command(internal_id: str, label_counts: Dict[str, Any]) -> GremlinQuery:
+    """replaces every counter on a vertex with the counts given, then flags the counters as ready"""
+    query = GremlinQuery.build(
+        'g.V({}).sideEffect(properties().hasKey(startingWith({})).drop())', internal_id, edge_count_prefix)
+    for edge_label, edge_count in label_counts.items():
+        query.append('.property(single, {}, {})', edge_count_key(edge_label), int(edge_count))
+    return query.append('.property(single, {}, true)', edge_counts_ready)
@@ -4,11 +4,10 @@ from datetime import timezone, datetime
 from decimal import Decimal
 from typing import Dict, Union
 
-import boto3
-import dateutil
 from algernon import AlgObject
 from botocore.exceptions import ClientError
 
+from toll_booth.obj import registry
 from toll_booth.obj.graph.troubles import SensitiveValueAlreadyStored
 
 
@@ -181,8 +180,10 @@ def _set_property_value_data_type(property_value: str, data_type: str) -> Union[
                                f'is not acceptable boolean. accepted are: true, false literally')
         return property_value
     if data_type == 'DT':
+        from dateutil import parser
+
         try:
-            test_datetime = dateutil.parser.parse(property_value)
+            test_datetime = parser.parse(property_value)
         except ValueError:
             test_datetime = datetime.fromtimestamp(float(property_value))
         if test_datetime.tzinfo is None or test_datetime.tzinfo.utcoffset(test_datetime) is None:
@@ -215,7 +216,7 @@ def _update_sensitive_data(source_internal_id: str,
         import os
         sensitive_table_name = os.environ['SENSITIVES_TABLE_NAME']
     logging.debug(f'starting an update_sensitive_data function: {source_internal_id}, {property_name}')
-    resource = boto3.resource('dynamodb')
+    resource = registry.get_boto3_resource('dynamodb')
     table = resource.Table(sensitive_table_name)
     logging.debug(f'starting to create the sensitive pointer: {source_internal_id}, {property_name}')
     insensitive_value = _create_sensitive_pointer(property_name, source_internal_id)
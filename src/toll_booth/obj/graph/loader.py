@@ -0,0 +1,144 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List
+
+from toll_booth.obj import registry
+
+
+class OgmLoader:
+    """Sits in front of the Ogm for the life of a single request
+
+        identical lookups made while resolving a request, or a BatchInvoke batch, are served from memory,
+        lookups already in flight on another thread are waited on rather than sent again,
+        and lookups for many ids are deduped and sent to the graph as a single query
+    """
+    def __init__(self, ogm=None):
+        if ogm is None:
+            ogm = registry.get_ogm()
+        self._ogm = ogm
+        self._lock = threading.Lock()
+        self._loaded: Dict[Hashable, Future] = {}
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self._hits, 'misses': self._misses, 'entries': len(self._loaded)}
+
+    def load_vertex(self, internal_id: str):
+        return self.load_vertexes([internal_id])[0]
+
+    def load_vertexes(self, internal_ids: List[str]) -> List[Any]:
+        return self._load_many('vertex', internal_ids, self._ogm.query_vertexes)
+
+    def load_vertex_properties(self, internal_id: str, property_names: List[str] = None):
+        load_key = ('vertex_properties', internal_id, tuple(property_names or ()))
+        return self._load(load_key, lambda: self._ogm.query_vertex_properties(internal_id, property_names))
+
+    def load_edge_connections(self, internal_id: str, edge_labels: List[str] = None):
+        return self.load_edge_connections_many([internal_id], edge_labels)[0]
+
+    def load_edge_connections_many(self, internal_ids: List[str], edge_labels: List[str] = None) -> List[Any]:
+        label_key = tuple(edge_labels or ())
+
+        def _fetch_many(missing_ids):
+            edge_connections = self._ogm.query_edge_connections_many(missing_ids, list(label_key))
+            # a vertex that is not in the graph has no edges, just as Ogm.query_edge_connections reports it
+            return {x: edge_connections.get(x, []) for x in missing_ids}
+
+        return self._load_many(('edge_connections', label_key), internal_ids, _fetch_many)
+
+    def load_connected_edge_page(self,
+                                 username: str,
+                                 internal_id: str,
+                                 edge_label: str,
+                                 page_size: int,
+                                 next_token: str = None):
+        load_key = ('connected_edge_page', username, internal_id, edge_label, page_size, next_token)
+        return self._load(load_key, lambda: self._ogm.get_connected_edge_page(
+            username, internal_id, edge_label, page_size, next_token))
+
+    def clear(self):
+        with self._lock:
+            logging.debug(f'clearing the request loader, stats: {self.stats}')
+            self._loaded = {}
+            self._hits = 0
+            self._misses = 0
+
+    def _load(self, load_key: Hashable, fetch: Callable[[], Any]) -> Any:
+        with self._lock:
+            loaded = self._loaded.get(load_key)
+            if loaded is not None:
+                self._hits += 1
+                claimed = False
+            else:
+                self._misses += 1
+                loaded = Future()
+                self._loaded[load_key] = loaded
+                claimed = True
+        if claimed:
+            try:
+                loaded.set_result(fetch())
+            except Exception as e:
+                self._forget([load_key])
+                loaded.set_exception(e)
+        return loaded.result()
+
+    def _load_many(self,
+                   namespace: Hashable,
+                   keys: List[str],
+                   fetch_many: Callable[[List[str]], Dict[str, Any]]) -> List[Any]:
+        pending = {}
+        claimed = {}
+        with self._lock:
+            for key in keys:
+                if key in pending:
+                    continue
+                load_key = (namespace, key)
+                loaded = self._loaded.get(load_key)
+                if loaded is not None:
+                    self._hits += 1
+                    pending[key] = loaded
+                    continue
+                self._misses += 1
+                loaded = Future()
+                self._loaded[load_key] = loaded
+                pending[key] = loaded
+                claimed[key] = loaded
+        if claimed:
+            try:
+                fetched = fetch_many(list(claimed.keys()))
+            except Exception as e:
+                self._forget([(namespace, x) for x in claimed])
+                for loaded in claimed.values():
+                    loaded.set_exception(e)
+            else:
+                for key, loaded in claimed.items():
+                    loaded.set_result(fetched.get(key))
+        return [pending[x].result() for x in keys]
+
+    def _forget(self, load_keys):
+        with self._lock:
+            for load_key in load_keys:
+                self._loaded.pop(load_key, None)
+
+
+_request_loader = None
+_request_loader_lock = threading.Lock()
+
+
+def get_request_loader() -> OgmLoader:
+    global _request_loader
+    with _request_loader_lock:
+        if _request_loader is None:
+            _request_loader = OgmLoader()
+        return _request_loader
+
+
+def clear_request_loader():
+    global _request_loader
+    with _request_loader_lock:
+        if _request_loader is not None:
+            _request_loader.clear()
+        _request_loader = None
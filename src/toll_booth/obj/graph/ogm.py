@@ -1,12 +1,19 @@
 import logging
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Tuple
 
 from aws_xray_sdk.core import xray_recorder
 
-from toll_booth.obj.graph.generators import create_vertex_command_from_scalar, create_edge_command_from_scalar
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.edge_counts import materialize_edge_counts, parse_label_counts
+from toll_booth.obj.graph.generators import create_vertex_command_from_scalar, create_edge_command_from_scalar, \
+    append_count_update, append_edge_count_query, create_edge_count_command
 from toll_booth.obj.graph.gql_scalars.connected_edges import PageInfo, ConnectedEdge, ConnectedEdgePage
 from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
+from toll_booth.obj.graph.prefetch import get_edge_page_prefetcher
 from toll_booth.obj.graph.trident import TridentDriver
+from toll_booth.obj.graph.trident.batching import CommandResult
+from toll_booth.obj.graph.trident.queries import GremlinQuery
 from toll_booth.obj.graph.trident.trident_obj.pages import PaginationToken
 
 
@@ -18,17 +25,28 @@ class Ogm:
 
     @xray_recorder.capture()
     def query_vertex(self, internal_id: str):
-        query = f"g.V('{internal_id}')"
-        results = self._trident_driver.execute(query, read_only=True)
+        query = GremlinQuery.build('g.V({})', internal_id)
+        results = self._trident_driver.execute(query, read_only=True, compact=True)
         for result in results:
             return result
 
+    @xray_recorder.capture()
+    def query_vertexes(self, internal_ids: List[str]) -> Dict[str, Any]:
+        """looks the vertexes up VERTEX_LOOKUP_CHUNK_SIZE at a time, the chunks sent side by side"""
+        chunk_size = max(int(os.getenv('VERTEX_LOOKUP_CHUNK_SIZE', 100)), 1)
+        chunks = [internal_ids[x:x + chunk_size] for x in range(0, len(internal_ids), chunk_size)]
+        queries = [GremlinQuery.build('g.V({})', x) for x in chunks]
+        if len(queries) == 1:
+            chunk_results = [self._trident_driver.execute(queries[0], read_only=True, compact=True)]
+        else:
+            chunk_results = self._trident_driver.execute_many(queries, read_only=True, compact=True)
+        return {x.vertex_id: x for y in chunk_results for x in y}
+
     @xray_recorder.capture()
     def query_vertex_properties(self, internal_id: str, property_names: List[str] = None):
         if not property_names:
             property_names = []
-        filter_string = ','.join('"{0}"'.format(w) for w in property_names)
-        query = f'g.V("{internal_id}").propertyMap([{filter_string}])'
+        query = GremlinQuery.build('g.V({}).propertyMap([{}])', internal_id, property_names)
         results = self._trident_driver.execute(query, read_only=True)
         logging.info(f'results from the query_vertex_properties query: {results}')
         if not results:
@@ -37,13 +55,44 @@ class Ogm:
 
     @xray_recorder.capture()
     def delete_vertex(self, internal_id: str):
-        command = f"g.V('{internal_id}').drop()"
-        return self._trident_driver.execute(command)
+        neighbour_counts = {}
+        neighbour_ids = []
+        if materialize_edge_counts():
+            # the edges of the vertex go with it, so the counters at their far ends must come down by as many
+            query = GremlinQuery.build(
+                "g.V({}).bothE().as('e').otherV().hasId(neq({})).group().by(id).by(select('e').groupCount().by(label))",
+                internal_id, internal_id)
+            for result in self._trident_driver.read_from_writer(query):
+                neighbour_counts.update(result)
+            neighbour_ids = list(neighbour_counts)
+        elif getattr(self._trident_driver, 'query_cache', None) is not None:
+            neighbour_query = GremlinQuery.build('g.V({}).both().id()', internal_id)
+            neighbour_ids = self._trident_driver.read_from_writer(neighbour_query)
+        command = GremlinQuery.build('g.V({}).drop()', internal_id)
+        results = self._trident_driver.execute(command)
+        if neighbour_counts:
+            self._decrement_edge_counts(neighbour_counts)
+        # the neighbours lose their edges to the vertex, so their cached edge connections are stale too
+        self._trident_driver.invalidate([internal_id] + list(neighbour_ids))
+        return results
 
     @xray_recorder.capture()
     def delete_edge(self, internal_id: str):
-        command = f"g.E('{internal_id}').drop()"
-        return self._trident_driver.execute(command)
+        vertex_ids = []
+        if getattr(self._trident_driver, 'query_cache', None) is not None:
+            vertex_ids = self._trident_driver.read_from_writer(GremlinQuery.build('g.E({}).bothV().id()', internal_id))
+        command = GremlinQuery.build('g.E({})', internal_id)
+        if materialize_edge_counts():
+            # the key of the counter is named for the label, so the label has to be known before the drop
+            label_query = GremlinQuery.build('g.E({}).label()', internal_id)
+            edge_labels = self._trident_driver.read_from_writer(label_query)
+            for edge_label in edge_labels:
+                command.append('.sideEffect(bothV()')
+                append_count_update(command, edge_label, -1)
+                command.append(')')
+        results = self._trident_driver.execute(command.append('.drop()'))
+        self._trident_driver.invalidate(vertex_ids)
+        return results
 
     @xray_recorder.capture()
     def graph_vertex(self, vertex_scalar: InputVertex):
@@ -55,6 +104,44 @@ class Ogm:
         command = create_edge_command_from_scalar(edge_scalar)
         return self._trident_driver.execute(command)
 
+    @xray_recorder.capture()
+    def graph_vertexes(self, vertex_scalars: List[InputVertex]) -> List[CommandResult]:
+        """upserts every vertex, a chunk of them per request, returning a result for each, in the order given
+
+            each chunk is one traversal, g.inject(0).project('r0', 'r1', ...), with the fold().coalesce() upsert of
+            each vertex as one of its by() steps, and the vertex it left behind selected out of the step's key
+        """
+        return self._graph_many([create_vertex_command_from_scalar(x) for x in vertex_scalars])
+
+    @xray_recorder.capture()
+    def graph_edges(self, edge_scalars: List[InputEdge]) -> List[CommandResult]:
+        """upserts every edge, a chunk of them per request, returning a result for each, in the order given
+
+            the vertexes at either end must already be in the graph, send them through graph_vertexes first
+        """
+        return self._graph_many([create_edge_command_from_scalar(x) for x in edge_scalars])
+
+    def _graph_many(self, commands: List[GremlinQuery]) -> List[CommandResult]:
+        # the upserts are guarded by fold().coalesce(), so a chunk that fails can be split and sent again safely
+        command_results = self._write_many(commands)
+        failed = [x for x in command_results if not x.succeeded]
+        if failed:
+            logging.warning(f'{len(failed)} of {len(commands)} upserts to the graph failed, first: {failed[0]}')
+        metrics.record_count('graph_upserts', len(commands))
+        metrics.record_count('graph_upsert_failures', len(failed))
+        return command_results
+
+    def _write_many(self, commands: List[GremlinQuery]) -> List[CommandResult]:
+        if not commands:
+            return []
+        batch_writer = self._trident_driver.batch_writer()
+        try:
+            for command in commands:
+                batch_writer.add(command)
+            return batch_writer.flush()
+        finally:
+            batch_writer.close()
+
     @xray_recorder.capture()
     def get_connected_edge_page(self,
                                 username: str,
@@ -62,32 +149,68 @@ class Ogm:
                                 edge_label: str,
                                 page_size: int,
                                 next_token: str = None) -> ConnectedEdgePage:
-        pagination_token = PaginationToken(username, 0, page_size)
         if next_token:
             pagination_token = PaginationToken.from_encrypted_token(next_token, username)
-        inclusive_start = pagination_token.inclusive_start
-        exclusive_end = inclusive_start + page_size
-        query = f"g.V('{internal_id}').bothE().hasLabel('{edge_label}').range({inclusive_start}, {exclusive_end + 1})"
-        edges = self._trident_driver.execute(query, read_only=True)
+        elif os.getenv('EDGE_PAGINATION', 'offset') == 'cursor':
+            pagination_token = PaginationToken.for_cursor(username, page_size)
+        else:
+            pagination_token = PaginationToken(username, 0, page_size)
+        prefetcher = get_edge_page_prefetcher()
+        if prefetcher is None:
+            return self._query_connected_edge_page(internal_id, edge_label, page_size, pagination_token)[0]
+        scope = (internal_id, edge_label, page_size)
+        connected_edge_page = prefetcher.take(pagination_token, scope)
+        if connected_edge_page is None:
+            connected_edge_page, more = self._query_connected_edge_page(
+                internal_id, edge_label, page_size, pagination_token)
+        else:
+            more = connected_edge_page.to_gql['page_info'].to_gql['more']
+        if more:
+            next_token = connected_edge_page.to_gql['page_info'].to_gql['next_token']
+            prefetcher.schedule(
+                next_token, lambda x: self._query_connected_edge_page(internal_id, edge_label, page_size, x), scope)
+        return connected_edge_page
+
+    def _query_connected_edge_page(self,
+                                   internal_id: str,
+                                   edge_label: str,
+                                   page_size: int,
+                                   pagination_token: PaginationToken) -> Tuple[ConnectedEdgePage, bool]:
+        query = GremlinQuery.build('g.V({}).bothE().hasLabel({})', internal_id, edge_label)
+        if pagination_token.is_cursor:
+            # pages stay stable as edges are added, but the order step still reads and sorts every edge past the
+            # cursor, O(degree log degree) a page where range() reads only up to the page, so it is not the default
+            if pagination_token.last_internal_id:
+                query.append('.has(id, gt({}))', pagination_token.last_internal_id)
+            query.append('.order().by(id).limit({})', page_size + 1)
+        else:
+            inclusive_start = pagination_token.inclusive_start
+            query.append('.range({}, {})', inclusive_start, inclusive_start + page_size + 1)
+        edges = self._trident_driver.execute(query, read_only=True, compact=True)
         more = len(edges) > page_size
         if more:
             edges = edges[:-1]
-        pagination_token.increment()
-        connected_edges = [ConnectedEdge.from_raw_edge(x, internal_id) for x in edges]
-        page_info = PageInfo(pagination_token, more)
-        return ConnectedEdgePage(connected_edges, page_info)
+        pagination_token.increment(edges[-1].internal_id if edges else None)
+        with metrics.timed('scalar_construction'):
+            connected_edges = [ConnectedEdge.from_raw_edge(x, internal_id) for x in edges]
+            page_info = PageInfo(pagination_token, more)
+            return ConnectedEdgePage(connected_edges, page_info), more
 
     @xray_recorder.capture()
     def query_edge_connections(self,
                                internal_id: str,
                                edge_labels: List[str] = None) -> List[Dict[str, Any]]:
-        filter_statement = ''
-        if edge_labels:
-            edge_filter = ', '.join([f"'{x}'" for x in edge_labels])
-            filter_statement = f'.hasLabel({edge_filter})'
-        query = f"g.V('{internal_id}').bothE(){filter_statement}.group().by(label).by(count())"
+        if materialize_edge_counts():
+            query = append_edge_count_query(GremlinQuery.build('g.V({}).', internal_id), edge_labels)
+        else:
+            query = GremlinQuery.build('g.V({}).bothE()', internal_id)
+            if edge_labels:
+                query.append('.hasLabel({})', edge_labels)
+            query.append('.group().by(label).by(count())')
         results = self._trident_driver.execute(query, read_only=True)
         for result in results:
+            result = parse_label_counts(result)
+            metrics.record_count('scalars_constructed', len(result))
             return [
                 {
                     'edge_label': x,
@@ -96,6 +219,60 @@ class Ogm:
                     'source_internal_id': internal_id
                 } for x, y in result.items()]
 
+    @xray_recorder.capture()
+    def query_edge_connections_many(self,
+                                    internal_ids: List[str],
+                                    edge_labels: List[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        query = GremlinQuery.build('g.V({}).group().by(id).by(', internal_ids)
+        if materialize_edge_counts():
+            append_edge_count_query(query, edge_labels).append(')')
+        else:
+            query.append('bothE()')
+            if edge_labels:
+                query.append('.hasLabel({})', edge_labels)
+            query.append('.groupCount().by(label))')
+        results = self._trident_driver.execute(query, read_only=True)
+        edge_connections = {}
+        for result in results:
+            metrics.record_count('scalars_constructed', len(result))
+            for internal_id, label_counts in result.items():
+                label_counts = parse_label_counts(label_counts)
+                edge_connections[internal_id] = [
+                    {
+                        'edge_label': x,
+                        'total_count': y,
+                        '__typename': 'EdgeConnection',
+                        'source_internal_id': internal_id
+                    } for x, y in label_counts.items()]
+        return edge_connections
+
+    @xray_recorder.capture()
+    def rebuild_edge_counts(self, internal_ids: List[str]) -> List[CommandResult]:
+        """counts the edges of each vertex afresh and replaces its counters, repairing any drift
+
+            edges written while a vertex is being rebuilt may be missed, rebuild it again once writes have settled
+        """
+        query = GremlinQuery.build('g.V({}).group().by(id).by(bothE().groupCount().by(label))', internal_ids)
+        commands = []
+        for result in self._trident_driver.read_from_writer(query):
+            commands.extend(create_edge_count_command(x, y) for x, y in result.items())
+        command_results = self._write_many(commands)
+        failed = [x for x in command_results if not x.succeeded]
+        if failed:
+            logging.warning(f'could not rebuild the edge counts of {len(failed)} of {len(commands)} vertexes')
+        return command_results
+
+    def _decrement_edge_counts(self, neighbour_counts: Dict[str, Dict[str, int]]):
+        commands = []
+        for internal_id, label_counts in neighbour_counts.items():
+            command = GremlinQuery.build('g.V({})', internal_id)
+            for edge_label, edge_count in label_counts.items():
+                append_count_update(command, edge_label, -int(edge_count))
+            commands.append(command)
+        failed = [x for x in self._write_many(commands) if not x.succeeded]
+        if failed:
+            logging.warning(f'could not bring down the edge counts of {len(failed)} vertexes, rebuild them to repair')
+
     @xray_recorder.capture()
     def run_read_query(self, query, read_only):
         return self._trident_driver.execute(query, read_only=read_only)
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Optional
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.trident.trident_obj.pages import PaginationToken
+
+
+class EdgePagePrefetcher:
+    """Fetches the next pages of a connected edge pagination in the background, while the current one is served
+
+        pages are held for the life of the container, keyed on the pagination_id of their token and their position,
+        so a client asking for the next page on the same warm container is answered from memory, or waits on the
+        fetch already in flight for it. pages are dropped after ttl seconds, they may miss edges added since
+    """
+    def __init__(self, window: int = None, ttl: float = None, max_entries: int = None, max_workers: int = None):
+        if window is None:
+            window = int(os.getenv('EDGE_PAGE_PREFETCH_WINDOW', 1))
+        if ttl is None:
+            ttl = float(os.getenv('EDGE_PAGE_PREFETCH_TTL', 60))
+        if max_entries is None:
+            max_entries = int(os.getenv('EDGE_PAGE_PREFETCH_MAX_ENTRIES', 256))
+        if max_workers is None:
+            max_workers = int(os.getenv('EDGE_PAGE_PREFETCH_WORKERS', 4))
+        self._window = window
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._pages: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+
+    @staticmethod
+    def page_key(pagination_token: PaginationToken, scope: Hashable = None) -> Hashable:
+        return pagination_token.pagination_id, pagination_token.inclusive_start, scope
+
+    def take(self, pagination_token: PaginationToken, scope: Hashable = None) -> Optional[Any]:
+        """the prefetched page for the token, waiting on it if it is still in flight, or None if there is none
+
+            scope is whatever else the page depends on, a token is only ever served pages fetched in the same scope
+        """
+        page_key = self.page_key(pagination_token, scope)
+        with self._lock:
+            prefetched = self._pages.pop(page_key, None)
+        if prefetched is None or prefetched[1] < time.monotonic():
+            metrics.record_count('edge_page_prefetch_misses')
+            return None
+        try:
+            page = prefetched[0].result()
+        except Exception as e:
+            logging.warning(f'prefetching an edge page failed, fetching it again: {e}')
+            metrics.record_count('edge_page_prefetch_misses')
+            return None
+        metrics.record_count('edge_page_prefetch_hits')
+        return page
+
+    def schedule(self,
+                 next_token: PaginationToken,
+                 fetch_page: Callable[[PaginationToken], Any],
+                 scope: Hashable = None):
+        """starts fetching the window of pages from next_token on
+
+            fetch_page returns the page for the token it is given, and if there are more, and advances the token
+        """
+        page_key = self.page_key(next_token, scope)
+        with self._lock:
+            if page_key in self._pages:
+                return
+            future = Future()
+            self._store(page_key, future)
+        self._executor.submit(self._prefetch, next_token.copy(), fetch_page, scope, future, self._window)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def _store(self, page_key: Hashable, future: Future):
+        self._pages[page_key] = (future, time.monotonic() + self._ttl)
+        while len(self._pages) > self._max_entries:
+            self._pages.popitem(last=False)
+
+    def _prefetch(self, pagination_token: PaginationToken, fetch_page, scope: Hashable, future: Future, remaining: int):
+        metrics.record_count('edge_page_prefetches')
+        try:
+            page, more = fetch_page(pagination_token)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        future.set_result(page)
+        if not more or remaining <= 1:
+            return
+        next_key = self.page_key(pagination_token, scope)
+        with self._lock:
+            if next_key in self._pages:
+                return
+            next_future = Future()
+            self._store(next_key, next_future)
+        self._prefetch(pagination_token.copy(), fetch_page, scope, next_future, remaining - 1)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_edge_page_prefetcher() -> Optional[EdgePagePrefetcher]:
+    """the container wide prefetcher, or None unless EDGE_PAGE_PREFETCH is set"""
+    global _prefetcher
+    if os.getenv('EDGE_PAGE_PREFETCH', 'false').lower() != 'true':
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = EdgePagePrefetcher()
+        return _prefetcher
+
+
+def reset_edge_page_prefetcher():
+    global _prefetcher
+    with _prefetcher_lock:
+        _prefetcher = None
@@ -1,8 +1,11 @@
 import importlib
 import json
 import logging
+from datetime import datetime
 from decimal import Decimal
 
+from algernon import AlgObject
+
 
 class GqlDecoder(json.JSONDecoder):
     def __init__(self, *args, **kwargs):
@@ -40,3 +43,29 @@ class GqlDecoder(json.JSONDecoder):
         alg_gql = alg_obj.to_gql
         logging.debug(f'gql variant of {alg_obj} is {alg_gql}')
         return alg_gql
+
+
+class GqlEncoder:
+    """Walks a result graph once, swapping every AlgObject for its to_gql value
+
+        produces the same structure as running the results through ajson.dumps and then rapidjson.loads with the
+        GqlDecoder object_hook, without building the intermediate json string
+    """
+    @classmethod
+    def encode(cls, obj):
+        if isinstance(obj, (str, int, float, bool, Decimal)) or obj is None:
+            return obj
+        if isinstance(obj, dict):
+            return {x: cls.encode(y) for x, y in obj.items()}
+        if isinstance(obj, list):
+            return [cls.encode(x) for x in obj]
+        if isinstance(obj, tuple):
+            return tuple(cls.encode(x) for x in obj)
+        if isinstance(obj, (set, frozenset)):
+            return [cls.encode(x) for x in obj]
+        if isinstance(obj, datetime):
+            return str(obj.timestamp())
+        if isinstance(obj, AlgObject):
+            return cls.encode(obj.to_gql)
+        logging.debug(f'do not know how to GQL encode {obj} of type {type(obj)}, passing it through')
+        return obj
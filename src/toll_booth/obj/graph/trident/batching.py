@@ -0,0 +1,192 @@
+import logging
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Union
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.trident.queries import GremlinQuery, to_script
+from toll_booth.obj.graph.trident.retries import is_idempotent_command
+from toll_booth.obj.graph.trident.troubles import AmbiguousNeptuneException, TridentBatchException
+
+_chainable_starts = ('g.V(', 'g.addV(', 'g.addE(', 'g.inject(')
+_root_traversal = re.compile(r'\bg\.')
+
+
+class CommandResult:
+    def __init__(self, command: Union[GremlinQuery, str], results: List[Any] = None, exception: Exception = None):
+        self._command = command
+        self._results = results
+        self._exception = exception
+
+    @property
+    def command(self) -> Union[GremlinQuery, str]:
+        return self._command
+
+    @property
+    def results(self) -> List[Any]:
+        return self._results
+
+    @property
+    def exception(self) -> Exception:
+        return self._exception
+
+    @property
+    def succeeded(self) -> bool:
+        return self._exception is None
+
+    def __repr__(self):
+        if self.succeeded:
+            return f'CommandResult({self._command}, results={self._results})'
+        return f'CommandResult({self._command}, exception={self._exception})'
+
+
+def can_share_chunk(command: Union[GremlinQuery, str]) -> bool:
+    """a command can run as a step of a larger traversal if it starts from a step that can also start mid-traversal
+
+        commands starting from g.E(), or spawning other traversals from g, are sent in a chunk of their own
+    """
+    command = to_script(command)
+    if not command.startswith(_chainable_starts):
+        return False
+    return not _root_traversal.search(command, 2)
+
+
+def build_chunk_query(commands: List[Union[GremlinQuery, str]]) -> GremlinQuery:
+    """one traversal that runs every command, in order and in a single transaction, returning the results of each
+
+        each command becomes a by() step of a project() rooted at g, so the results of the nth are under rn
+    """
+    if len(commands) == 1:
+        return GremlinQuery.join(commands)
+    keys = ', '.join(f"'r{x}'" for x in range(len(commands)))
+    steps = GremlinQuery.join([_to_step(x) for x in commands], '')
+    return GremlinQuery(f'g.inject(0).project({keys}){steps.script}', steps.bindings)
+
+
+def _to_step(command: Union[GremlinQuery, str]) -> GremlinQuery:
+    if not can_share_chunk(command):
+        raise ValueError(f'command can not be sent as part of a larger traversal: {command}')
+    step = GremlinQuery.join([command])
+    return GremlinQuery(f'.by({step.script[2:]}.fold())', step.bindings)
+
+
+def parse_chunk_results(commands: List[Union[GremlinQuery, str]], results: List[Any]) -> List[List[Any]]:
+    if len(commands) == 1:
+        return [results]
+    if len(results) != 1 or not isinstance(results[0], dict) or len(results[0]) != len(commands):
+        raise RuntimeError(f'expected the results of {len(commands)} commands from a batch, got {results}')
+    return [results[0][f'r{x}'] for x in range(len(commands))]
+
+
+class TridentBatchWriter:
+    """Collects write commands and sends them in chunks, bounded by bytes and by command count
+
+        each chunk is a single traversal, so it is applied as one transaction. a chunk that fails is split in half
+        and each half sent again, until the commands at fault are isolated, and every other command still lands.
+        up to max_workers chunks are in flight at once, while the caller keeps adding commands, so with more than
+        one worker a later chunk can land before an earlier one. commands that depend on one another, an edge on
+        the vertexes it joins, must either share a writer with a single worker or be sent by separate writers
+    """
+    def __init__(self,
+                 send: Callable[[GremlinQuery], List[Any]],
+                 max_bytes: int = None,
+                 max_commands: int = None,
+                 max_workers: int = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv('GRAPH_DB_BATCH_MAX_BYTES', 256 * 1024))
+        if max_commands is None:
+            max_commands = int(os.getenv('GRAPH_DB_BATCH_MAX_COMMANDS', 50))
+        if max_workers is None:
+            max_workers = int(os.getenv('GRAPH_DB_BATCH_CONCURRENCY', 4))
+        self._send = send
+        self._max_bytes = max_bytes
+        self._max_commands = max(max_commands, 1)
+        self._max_workers = max(max_workers, 1)
+        self._executor = None
+        self._pending = []
+        self._pending_bytes = 0
+        self._submitted: List[Future] = []
+
+    def add(self, command: Union[GremlinQuery, str]):
+        if not can_share_chunk(command):
+            self._submit_pending()
+            self._pending.append(command)
+            self._submit_pending()
+            return
+        command_bytes = len(str(command).encode('utf-8'))
+        if self._pending and self._pending_bytes + command_bytes > self._max_bytes:
+            self._submit_pending()
+        self._pending.append(command)
+        self._pending_bytes += command_bytes
+        if len(self._pending) >= self._max_commands:
+            self._submit_pending()
+
+    def flush(self) -> List[CommandResult]:
+        """waits on every chunk, returning a result for each command added since the last flush, in order"""
+        self._submit_pending()
+        submitted, self._submitted = self._submitted, []
+        command_results = []
+        for future in submitted:
+            command_results.extend(future.result())
+        return command_results
+
+    def flush_or_raise(self) -> List[CommandResult]:
+        command_results = self.flush()
+        failed = [x for x in command_results if not x.succeeded]
+        if failed:
+            raise TridentBatchException(command_results)
+        return command_results
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.flush_or_raise()
+        finally:
+            self.close()
+
+    def _submit_pending(self):
+        if not self._pending:
+            return
+        chunk, self._pending, self._pending_bytes = self._pending, [], 0
+        if self._max_workers == 1:
+            future = Future()
+            future.set_result(self._send_chunk(chunk))
+            self._submitted.append(future)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        self._submitted.append(self._executor.submit(self._send_chunk, chunk))
+
+    def _send_chunk(self, chunk: List[Union[GremlinQuery, str]]) -> List[CommandResult]:
+        metrics.record_count('neptune_batch_chunks')
+        metrics.record_count('neptune_batch_commands', len(chunk))
+        chunk_query = build_chunk_query(chunk)
+        try:
+            with metrics.timed('neptune_batch_chunk'):
+                results = self._send(chunk_query)
+        except Exception as e:
+            return self._bisect(chunk, chunk_query, e)
+        return [CommandResult(x, y) for x, y in zip(chunk, parse_chunk_results(chunk, results))]
+
+    def _bisect(self, chunk: List[Union[GremlinQuery, str]], chunk_query: GremlinQuery,
+                exception: Exception) -> List[CommandResult]:
+        if isinstance(exception, AmbiguousNeptuneException) and not is_idempotent_command(chunk_query):
+            # the chunk may have been applied, so sending any of it again could write it twice
+            logging.warning(f'a batch of {len(chunk)} commands may or may not have been applied: {exception}')
+            return [CommandResult(x, exception=exception) for x in chunk]
+        if len(chunk) == 1:
+            logging.warning(f'a command in a batch failed: {exception}')
+            metrics.record_count('neptune_batch_failed_commands')
+            return [CommandResult(chunk[0], exception=exception)]
+        metrics.record_count('neptune_batch_bisections')
+        midpoint = len(chunk) // 2
+        return self._send_chunk(chunk[:midpoint]) + self._send_chunk(chunk[midpoint:])
@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from toll_booth.obj import metrics
+
+_whitespace = re.compile(r'\s+')
+_element_lookup = re.compile(r'\b(?:[VE]|hasId)\(([^()]*)\)')
+_quoted = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+
+def normalize_query(query_text: str) -> str:
+    return _whitespace.sub(' ', query_text).strip()
+
+
+def _cache_key(query_text: str, compact: bool) -> str:
+    """untyped and typed responses decode to different objects, so the same query is cached once for each"""
+    cache_key = normalize_query(query_text)
+    if compact:
+        return f'compact {cache_key}'
+    return cache_key
+
+
+def extract_internal_ids(query_text: str) -> Set[str]:
+    """the ids of every vertex and edge a query looks up directly, as in g.V('x'), g.E('y'), V('z') or hasId('w')"""
+    internal_ids = set()
+    for lookup in _element_lookup.findall(query_text):
+        for single_quoted, double_quoted in _quoted.findall(lookup):
+            internal_ids.add(single_quoted or double_quoted)
+    return internal_ids
+
+
+def estimate_size(obj: Any) -> int:
+    """a rough, but cheap, count of the bytes held by a decoded result"""
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        size += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, int, float)):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, '__dict__'):
+            stack.extend(current.__dict__.values())
+    return size
+
+
+def _copy_result(results):
+    if isinstance(results, list):
+        return list(results)
+    if isinstance(results, dict):
+        return dict(results)
+    return results
+
+
+class _CachedResult:
+    __slots__ = ('results', 'size', 'expires_at', 'internal_ids')
+
+    def __init__(self, results, size, expires_at, internal_ids):
+        self.results = results
+        self.size = size
+        self.expires_at = expires_at
+        self.internal_ids = internal_ids
+
+
+class QueryResultCache:
+    """Holds the results of read only queries for the life of the container, bounded by entries, bytes and age
+
+        queries are keyed on their normalized text and whether they were sent compact, and indexed by the
+        internal_ids they look up, so a write to a vertex or edge drops every cached read that touched it
+    """
+    def __init__(self, max_entries: int = None, max_bytes: int = None, ttl: float = None):
+        if max_entries is None:
+            max_entries = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 10000))
+        if max_bytes is None:
+            max_bytes = int(os.getenv('QUERY_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+        if ttl is None:
+            ttl = float(os.getenv('QUERY_CACHE_TTL', 60))
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, _CachedResult]' = OrderedDict()
+        self._by_internal_id: Dict[str, Set[str]] = {}
+        self._edge_vertexes: Dict[str, Set[str]] = {}
+        self._vertex_edges: Dict[str, Set[str]] = {}
+        self._generation = 0
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_ratio': self._hits / lookups if lookups else 0.0
+            }
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, query_text: str, compact: bool = False) -> Optional[List[Any]]:
+        cache_key = _cache_key(query_text, compact)
+        with self._lock:
+            cached = self._entries.get(cache_key)
+            if cached is not None and cached.expires_at < time.monotonic():
+                self._remove(cache_key)
+                cached = None
+            if cached is None:
+                self._misses += 1
+                metrics.record_count('query_cache_misses')
+                return None
+            self._entries.move_to_end(cache_key)
+            self._hits += 1
+        metrics.record_count('query_cache_hits')
+        return _copy_result(cached.results)
+
+    def put(self, query_text: str, results: Any, generation: int = None, compact: bool = False):
+        """stores a result, unless something was invalidated since the read that produced it began"""
+        cache_key = _cache_key(query_text, compact)
+        internal_ids = extract_internal_ids(cache_key)
+        if not internal_ids:
+            return
+        size = estimate_size(results) + sys.getsizeof(cache_key)
+        if size > self._max_bytes:
+            return
+        edge_vertexes = self._find_edge_vertexes(results)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if cache_key in self._entries:
+                self._remove(cache_key)
+            self._entries[cache_key] = _CachedResult(
+                _copy_result(results), size, time.monotonic() + self._ttl, internal_ids)
+            self._bytes += size
+            for internal_id in internal_ids:
+                self._by_internal_id.setdefault(internal_id, set()).add(cache_key)
+            if len(self._edge_vertexes) > self._max_entries * 10:
+                self._edge_vertexes.clear()
+                self._vertex_edges.clear()
+            for edge_id, vertex_ids in edge_vertexes.items():
+                self._edge_vertexes.setdefault(edge_id, set()).update(vertex_ids)
+                for vertex_id in vertex_ids:
+                    self._vertex_edges.setdefault(vertex_id, set()).add(edge_id)
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate(self, internal_ids: Iterable[str]):
+        """drops every cached read of the given vertexes or edges, of the vertexes at either end of those edges,
+            and of the edges known to hang off those vertexes
+        """
+        with self._lock:
+            self._generation += 1
+            pending = set(internal_ids)
+            for internal_id in list(pending):
+                pending.update(self._edge_vertexes.pop(internal_id, ()))
+            for internal_id in list(pending):
+                pending.update(self._vertex_edges.pop(internal_id, ()))
+            removed = 0
+            for internal_id in pending:
+                for cache_key in self._by_internal_id.pop(internal_id, ()):
+                    if cache_key in self._entries:
+                        self._remove(cache_key)
+                        removed += 1
+        if removed:
+            logging.debug(f'invalidated {removed} cached reads for internal_ids: {pending}')
+
+    def invalidate_query(self, query_text: str):
+        self.invalidate(extract_internal_ids(query_text))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_internal_id.clear()
+            self._edge_vertexes.clear()
+            self._vertex_edges.clear()
+            self._bytes = 0
+
+    def publish_metrics(self):
+        stats = self.stats
+        metrics.record_bytes('query_cache_bytes', stats['bytes'])
+        metrics.record_count('query_cache_entries', stats['entries'])
+        # counts are summed, so the hit ratio is left to CloudWatch, from query_cache_hits and query_cache_misses
+
+    def _remove(self, cache_key: str):
+        cached = self._entries.pop(cache_key)
+        self._bytes -= cached.size
+        for internal_id in cached.internal_ids:
+            cache_keys = self._by_internal_id.get(internal_id)
+            if cache_keys is not None:
+                cache_keys.discard(cache_key)
+                if not cache_keys:
+                    del self._by_internal_id[internal_id]
+
+    @staticmethod
+    def _find_edge_vertexes(results) -> Dict[str, Set[str]]:
+        edge_vertexes = {}
+        if not isinstance(results, list):
+            return edge_vertexes
+        for result in results:
+            in_id, out_id = getattr(result, 'in_id', None), getattr(result, 'out_id', None)
+            if in_id is not None and out_id is not None:
+                edge_vertexes[result.internal_id] = {in_id, out_id}
+        return edge_vertexes
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[QueryResultCache]:
+    """the container wide cache, or None unless QUERY_CACHE_ENABLED is set"""
+    global _query_cache
+    if os.getenv('QUERY_CACHE_ENABLED', 'false').lower() != 'true':
+        return None
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryResultCache()
+        return _query_cache
+
+
+def publish_query_cache_metrics():
+    if _query_cache is not None:
+        _query_cache.publish_metrics()
+
+
+metrics.add_flush_hook(publish_query_cache_metrics)
+
+
+def reset_query_cache():
+    global _query_cache
+    with _query_cache_lock:
+        _query_cache = None
@@ -4,91 +4,86 @@ import hmac
 import json
 import logging
 import os
+import threading
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from typing import Dict, Any
+from typing import Dict, Any, List, Union
 
-import rapidjson
 import requests
-from algernon.aws.squirrel import Opossum
+from requests.adapters import HTTPAdapter
 
-from toll_booth.obj.graph.trident.trident_obj.edge import TridentEdge
-from toll_booth.obj.graph.trident.trident_obj.path import TridentPath
-from toll_booth.obj.graph.trident.trident_obj.properties import TridentProperty
-from toll_booth.obj.graph.trident.trident_obj.vertex import TridentVertex
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.trident.credentials import CredentialProvider, TridentCredentials, \
+    get_credential_provider
+from toll_booth.obj.graph.trident.decoders import GraphsonDecoder, TridentDecoder, UntypedGraphsonDecoder, \
+    decode_graphson_response, default_decoder
+from toll_booth.obj.graph.trident.queries import GremlinQuery, to_request
+from toll_booth.obj.graph.trident.retries import RetryPolicy, classify_response, is_idempotent_command
+from toll_booth.obj.graph.trident.troubles import NeptuneException
 
 
-class TridentDecoder(json.JSONDecoder):
-    def __init__(self, *args, **kwargs):
-        json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
+def _encode_binding(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'can not bind a value of type: {type(value).__name__}')
 
-    @staticmethod
-    def object_hook(obj):
-        if '@type' not in obj:
-            return obj
-        obj_type = obj['@type']
-        obj_value = obj['@value']
-        if obj_type == 'g:T':
-            if obj_value == 'id':
-                return 'internal_id'
-            if obj_value == 'label':
-                return 'label'
-        if obj_type == 'g:Int32':
-            return Decimal(obj_value)
-        if obj_type == 'g:Int64':
-            return Decimal(obj_value)
-        if obj_type == 'g:List':
-            return obj_value
-        if obj_type == 'g:Set':
-            return set(obj_value)
-        if obj_type == 'g:Date':
-            return datetime.datetime.fromtimestamp(obj_value/1000)
-        if obj_type == 'g:Map':
-            created_map = {}
-            i = 0
-            while i < len(obj_value):
-                created_map[obj_value[i]] = obj_value[i + 1]
-                i += 2
-            return created_map
-        if obj_type == 'g:Vertex':
-            trident_vertex = TridentVertex(obj_value['id'], obj_value['label'], obj_value.get('properties'))
-            return trident_vertex
-        if obj_type == 'g:Edge':
-            to_vertex = TridentVertex(obj_value['inV'], obj_value['inVLabel'])
-            from_vertex = TridentVertex(obj_value['outV'], obj_value['outVLabel'])
-            return TridentEdge(obj_value['id'], obj_value['label'], from_vertex, to_vertex)
-        if obj_type == 'g:VertexProperty':
-            return TridentProperty(obj_value['label'], obj_value['value'])
-        if obj_type == 'g:Path':
-            return TridentPath(obj_value['labels'], obj_value['objects'])
-        return obj
+
+def generate_payload(command: Union[GremlinQuery, str]) -> str:
+    script, bindings = to_request(command)
+    if bindings is None:
+        return json.dumps({'gremlin': script})
+    return json.dumps({'gremlin': script, 'bindings': bindings}, default=_encode_binding)
 
 
 class TridentNotary:
     _region = os.getenv('AWS_REGION', 'us-east-1')
     _service = 'neptune-db'
 
-    def __init__(self, neptune_endpoint: str, session: requests.session = None):
+    def __init__(self,
+                 neptune_endpoint: str,
+                 session: requests.session = None,
+                 retry_policy: RetryPolicy = None,
+                 decoder: GraphsonDecoder = None,
+                 compact_responses: bool = None,
+                 credential_provider: CredentialProvider = None,
+                 max_concurrency: int = None):
         if neptune_endpoint is None:
             raise RuntimeError('must specify neptune endpoint when calling the trident_notary')
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv('GRAPH_DB_MAX_CONCURRENCY', 16))
         if not session:
             session = requests.session()
+            # one pooled connection for each request send_many may have in flight
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency))
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        if decoder is None:
+            decoder = default_decoder
+        if compact_responses is None:
+            compact_responses = os.getenv('GRAPH_DB_COMPACT_RESPONSES', 'false').lower() == 'true'
         self._session = session
+        self._retry_policy = retry_policy
+        self._decoder = decoder
+        self._compact_decoder = UntypedGraphsonDecoder() if compact_responses else None
         self._neptune_endpoint = neptune_endpoint
         self._uri = '/gremlin/'
         self._method = 'POST'
         self._host = neptune_endpoint + ':8182'
         self._signed_headers = 'host;x-amz-date'
         self._algorithm = 'AWS4-HMAC-SHA256'
-        access_key = os.getenv('AWS_ACCESS_KEY_ID', None)
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY', None)
-        self._session_token = os.getenv('AWS_SESSION_TOKEN', None)
-        if access_key is None or secret_key is None:
-            access_key, secret_key = Opossum.get_trident_user_key()
-        self._access_key = access_key
-        self._secret_key = secret_key
-        self._credentials = f"Credentials={self._access_key}"
+        if credential_provider is None:
+            credential_provider = get_credential_provider()
+        self._credential_provider = credential_provider
         self._request_url = f'https://{neptune_endpoint}:8182{self._uri}'
+        self._canonical_request_prefix = f'{self._method}\n{self._uri}\n\nhost:{self._host}\nx-amz-date:'
+        self._canonical_request_infix = f'\n\n{self._signed_headers}\n'
+        self._scope_suffix = f'/{self._region}/{self._service}/aws4_request'
+        self._authorization_infix = f', SignedHeaders={self._signed_headers}, Signature='
+        self._signing_key_cache = None
+        self._max_concurrency = max(max_concurrency, 1)
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
     @classmethod
     def get_for_writer(cls, **kwargs):
@@ -100,31 +95,102 @@ class TridentNotary:
         endpoint = kwargs.get('graph_db_reader_endpoint', os.getenv('GRAPH_DB_READER_ENDPOINT', None))
         return cls(endpoint)
 
-    def send(self, command: str) -> Dict[str, Any]:
-        t = datetime.datetime.utcnow()
-        amz_date = t.strftime('%Y%m%dT%H%M%SZ')
-        date_stamp = t.strftime('%Y%m%d')
-        canonical_request, request_parameters = self._generate_canonical_request(amz_date, command)
+    def send(self, command: Union[GremlinQuery, str], read_only: bool = False, compact: bool = False) -> Dict[str, Any]:
+        """compact asks for untyped GraphSON, only set it for queries returning whole vertexes or edges,
+            it is ignored unless compact_responses is set, as only some engine versions serve it
+        """
+        idempotent = read_only or is_idempotent_command(command)
+        decoder = self._decoder
+        if compact and self._compact_decoder is not None:
+            decoder = self._compact_decoder
+        return self._retry_policy.call(lambda: self._send(command, decoder), idempotent, self._on_retry)
+
+    def send_many(self,
+                  commands: List[Union[GremlinQuery, str]],
+                  read_only: bool = False,
+                  compact: bool = False) -> List[Any]:
+        """sends the commands at once, up to max_concurrency in flight, each signed, retried and decoded as send does,
+            returning the results in the order given
+        """
+        if len(commands) < 2 or self._max_concurrency < 2:
+            return [self.send(x, read_only, compact) for x in commands]
+        executor = self._get_executor()
+        return list(executor.map(lambda x: self.send(x, read_only, compact), commands))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency)
+            return self._executor
+
+    def generate_signed_headers(self, method: str, uri: str, payload: str = '') -> Dict[str, str]:
+        """signs any request to the endpoint, not just a POST to /gremlin/, used to open a WebSocket session"""
+        amz_date = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        date_stamp = amz_date[:8]
+        payload_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        canonical_request = f'{method}\n{uri}\n\nhost:{self._host}\nx-amz-date:{amz_date}' \
+            f'{self._canonical_request_infix}{payload_hash}'
         credential_scope = self._generate_scope(date_stamp)
         string_to_sign = self._generate_string_to_sign(canonical_request, amz_date, credential_scope)
-        signature = self._generate_signature(string_to_sign, date_stamp)
-        headers = self._generate_headers(credential_scope, signature, amz_date)
+        credentials = self._credential_provider.get()
+        signature = self._generate_signature(string_to_sign, date_stamp, credentials)
+        headers = self._generate_headers(credential_scope, signature, amz_date, credentials)
+        headers['Host'] = self._host
+        return headers
+
+    def _on_retry(self, exception: Exception):
+        if isinstance(exception, NeptuneException) and exception.error_code == 'ReadOnlyViolationException':
+            logging.info('the writer endpoint is read only, likely mid failover, dropping pooled connections')
+            self._session.close()
+
+    def _send(self, command: Union[GremlinQuery, str], decoder=None) -> Dict[str, Any]:
+        if decoder is None:
+            decoder = self._decoder
+        with metrics.timed('sigv4_signing'):
+            amz_date = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+            date_stamp = amz_date[:8]
+            canonical_request, request_parameters = self._generate_canonical_request(amz_date, command)
+            credential_scope = self._generate_scope(date_stamp)
+            string_to_sign = self._generate_string_to_sign(canonical_request, amz_date, credential_scope)
+            credentials = self._credential_provider.get()
+            signature = self._generate_signature(string_to_sign, date_stamp, credentials)
+            headers = self._generate_headers(credential_scope, signature, amz_date, credentials)
+        headers['Accept'] = decoder.accept
+        headers['Accept-Encoding'] = 'gzip'
         logging.debug(f'sending a command to the remote database: {command}')
-        get_results = self._session.post(self._request_url, headers=headers, data=request_parameters)
+        metrics.record_count('neptune_requests')
+        metrics.record_bytes('neptune_request_bytes', len(request_parameters))
+        with metrics.timed('neptune_round_trip'):
+            get_results = self._session.post(self._request_url, headers=headers, data=request_parameters)
+        self._record_response_size(get_results, decoder)
         if get_results.status_code != 200:
-            raise RuntimeError(f'error passing command to remote database: {get_results.text}, command: {command}')
-        response_json = rapidjson.loads(get_results.text)
-        results = response_json['result']['data']
-        logging.debug(f'received a response from the graph database: {results}')
-        results = rapidjson.loads(rapidjson.dumps(results), object_hook=TridentDecoder.object_hook)
-        logging.debug(f'after parsing and transforming the response from the graph database, results: {results}')
+            metrics.record_count('neptune_errors')
+            if get_results.status_code == 403:
+                # expired or revoked, the next request signs with freshly fetched credentials, unless another
+                # request has already replaced the ones refused here
+                self._credential_provider.invalidate(credentials)
+            raise classify_response(get_results.status_code, get_results.text, str(command))
+        with metrics.timed('graphson_decode'):
+            results = decode_graphson_response(get_results.content, decoder)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f'after parsing and transforming the response from the graph database, results: {results}')
         return results
 
+    @staticmethod
+    def _record_response_size(response: requests.Response, decoder):
+        response_bytes = len(response.content)
+        metrics.record_bytes('neptune_response_bytes', response_bytes)
+        if decoder.accept != GraphsonDecoder.accept:
+            metrics.record_count('neptune_compact_responses')
+        wire_bytes = response.headers.get('Content-Length')
+        if response.headers.get('Content-Encoding') == 'gzip' and wire_bytes is not None:
+            metrics.record_bytes('neptune_response_wire_bytes', int(wire_bytes))
+            metrics.record_bytes('neptune_response_bytes_saved', response_bytes - int(wire_bytes))
+
     def _generate_canonical_request(self, amz_date, command):
-        payload = json.dumps({'gremlin': command})
-        canonical_headers = f'host:{self._host}\nx-amz-date:{amz_date}\n'
+        payload = generate_payload(command)
         payload_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
-        canon_request = f"{self._method}\n{self._uri}\n\n{canonical_headers}\n{self._signed_headers}\n{payload_hash}"
+        canon_request = f'{self._canonical_request_prefix}{amz_date}{self._canonical_request_infix}{payload_hash}'
         return canon_request, payload
 
     def _generate_string_to_sign(self, canonical_request, amz_date, scope):
@@ -132,28 +198,34 @@ class TridentNotary:
         return f"{self._algorithm}\n{amz_date}\n{scope}\n{hash_request}"
 
     def _generate_scope(self, date_stamp):
-        return f"{date_stamp}/{self._region}/{self._service}/aws4_request"
+        return f"{date_stamp}{self._scope_suffix}"
 
-    def _get_signature_key(self, date_stamp):
-        k_date = self._sign(f'AWS4{self._secret_key}'.encode('utf-8'), date_stamp)
+    def _get_signature_key(self, date_stamp, secret_key):
+        signing_key_cache = self._signing_key_cache
+        if signing_key_cache is not None and signing_key_cache[0] == (date_stamp, secret_key):
+            return signing_key_cache[1]
+        k_date = self._sign(f'AWS4{secret_key}'.encode('utf-8'), date_stamp)
         k_region = self._sign(k_date, self._region)
         k_service = self._sign(k_region, self._service)
         k_signing = self._sign(k_service, 'aws4_request')
+        self._signing_key_cache = ((date_stamp, secret_key), k_signing)
         return k_signing
 
-    def _generate_signature(self, string_to_sign, date_stamp):
-        signing_key = self._get_signature_key(date_stamp)
+    def _generate_signature(self, string_to_sign, date_stamp, credentials: TridentCredentials = None):
+        if credentials is None:
+            credentials = self._credential_provider.get()
+        signing_key = self._get_signature_key(date_stamp, credentials.secret_key)
         signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
         return signature
 
-    def _generate_headers(self, credential_scope, signature, amz_date):
-        credentials_entry = f'Credential={self._access_key}/{credential_scope}'
-        headers_entry = f'SignedHeaders={self._signed_headers}'
-        signature_entry = f'Signature={signature}'
-        authorization_header = f"{self._algorithm} {credentials_entry}, {headers_entry}, {signature_entry}"
+    def _generate_headers(self, credential_scope, signature, amz_date, credentials: TridentCredentials = None):
+        if credentials is None:
+            credentials = self._credential_provider.get()
+        authorization_header = f'{self._algorithm} Credential={credentials.access_key}/{credential_scope}' \
+            f'{self._authorization_infix}{signature}'
         headers = {'x-amz-date': amz_date, 'Authorization': authorization_header}
-        if self._session_token:
-            headers['x-amz-security-token'] = self._session_token
+        if credentials.session_token:
+            headers['x-amz-security-token'] = credentials.session_token
         return headers
 
     @classmethod
@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
+
+from toll_booth.obj import metrics
+
+
+class TridentCredentials:
+    __slots__ = ('access_key', 'secret_key', 'session_token', 'expires_at')
+
+    def __init__(self, access_key: str, secret_key: str, session_token: str = None, expires_at: float = None):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.session_token = session_token
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f'TridentCredentials({self.access_key}, expires_at={self.expires_at})'
+
+
+def _parse_expiration(expiration: Optional[str]) -> Optional[float]:
+    if not expiration:
+        return None
+    try:
+        expires_at = datetime.fromisoformat(expiration.replace('Z', '+00:00'))
+    except ValueError:
+        logging.warning(f'could not parse the expiration of the credentials in the environment: {expiration}')
+        return None
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at.timestamp()
+
+
+def fetch_trident_credentials() -> TridentCredentials:
+    """the keys in the environment if there are any, otherwise the keys of the trident user from the secret store"""
+    access_key = os.getenv('AWS_ACCESS_KEY_ID', None)
+    secret_key = os.getenv('AWS_SECRET_ACCESS_KEY', None)
+    if access_key is not None and secret_key is not None:
+        expires_at = _parse_expiration(os.getenv('AWS_CREDENTIAL_EXPIRATION'))
+        return TridentCredentials(access_key, secret_key, os.getenv('AWS_SESSION_TOKEN', None), expires_at)
+    from algernon.aws.squirrel import Opossum
+
+    access_key, secret_key = Opossum.get_trident_user_key()
+    return TridentCredentials(access_key, secret_key)
+
+
+class CredentialProvider:
+    """Holds the credentials used to sign requests to the remote database, fetching them again before they lapse
+
+        credentials are kept for ttl seconds, or until their own expiry if that is sooner. within refresh_ahead
+        seconds of that, the first caller to notice fetches new ones while every other caller keeps signing
+        with the current ones, so only one fetch is ever in flight and no request waits on it unless it must.
+        the credentials, when they lapse and when they were fetched are swapped in together as one tuple,
+        so a caller never sees the parts of two different fetches
+    """
+    def __init__(self,
+                 fetch: Callable[[], TridentCredentials] = None,
+                 ttl: float = None,
+                 refresh_ahead: float = None,
+                 min_refetch: float = None,
+                 clock: Callable[[], float] = time.time):
+        if fetch is None:
+            fetch = fetch_trident_credentials
+        if ttl is None:
+            ttl = float(os.getenv('TRIDENT_CREDENTIALS_TTL', 3600))
+        if refresh_ahead is None:
+            refresh_ahead = float(os.getenv('TRIDENT_CREDENTIALS_REFRESH_AHEAD', 300))
+        if min_refetch is None:
+            min_refetch = float(os.getenv('TRIDENT_CREDENTIALS_MIN_REFETCH', 10))
+        self._fetch = fetch
+        self._ttl = ttl
+        self._refresh_ahead = refresh_ahead
+        self._min_refetch = min_refetch
+        self._clock = clock
+        self._current: Optional[Tuple[TridentCredentials, float, float]] = None
+        self._fetch_lock = threading.Lock()
+
+    def get(self) -> TridentCredentials:
+        current = self._current
+        now = self._clock()
+        if current is not None and now < current[1] - self._refresh_ahead:
+            return current[0]
+        if current is not None and now < current[1]:
+            # still good for a while yet, so only refresh if no one else is already doing it
+            if not self._fetch_lock.acquire(blocking=False):
+                return current[0]
+            try:
+                return self._refresh(current[0])
+            finally:
+                self._fetch_lock.release()
+        with self._fetch_lock:
+            current = self._current
+            if current is not None and self._clock() < current[1] - self._refresh_ahead:
+                return current[0]
+            return self._refresh(None)
+
+    def invalidate(self, refused: TridentCredentials = None):
+        """drops the current credentials, for when the remote database has refused them
+
+            given the refused credentials, they are only dropped if they are still the current ones and were
+            fetched more than min_refetch seconds ago, so a burst of refused requests fetches new ones at most once
+        """
+        with self._fetch_lock:
+            current = self._current
+            if current is None:
+                return
+            if refused is not None:
+                if refused is not current[0]:
+                    return
+                if self._clock() - current[2] < self._min_refetch:
+                    return
+            self._current = None
+
+    def _refresh(self, current: Optional[TridentCredentials]) -> TridentCredentials:
+        metrics.record_count('trident_credential_fetches')
+        try:
+            with metrics.timed('trident_credential_fetch'):
+                credentials = self._fetch()
+        except Exception as e:
+            if current is None:
+                raise
+            logging.warning(f'could not refresh the credentials for the remote database, keeping the current ones: {e}')
+            return current
+        fetched_at = self._clock()
+        expires_at = fetched_at + self._ttl
+        if credentials.expires_at is not None:
+            expires_at = min(expires_at, credentials.expires_at)
+        self._current = (credentials, expires_at, fetched_at)
+        return credentials
+
+
+_credential_provider = None
+_credential_provider_lock = threading.Lock()
+
+
+def get_credential_provider() -> CredentialProvider:
+    """the container wide provider, shared by every reader and writer notary"""
+    global _credential_provider
+    with _credential_provider_lock:
+        if _credential_provider is None:
+            _credential_provider = CredentialProvider()
+        return _credential_provider
+
+
+def reset_credential_provider():
+    global _credential_provider
+    with _credential_provider_lock:
+        _credential_provider = None
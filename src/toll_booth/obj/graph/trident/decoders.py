@@ -0,0 +1,194 @@
+import datetime
+import json
+from decimal import Decimal
+from typing import Any, Callable, Dict, Union
+
+import rapidjson
+
+from toll_booth.obj.graph.trident.trident_obj.edge import TridentEdge
+from toll_booth.obj.graph.trident.trident_obj.path import TridentPath
+from toll_booth.obj.graph.trident.trident_obj.properties import TridentProperty
+from toll_booth.obj.graph.trident.trident_obj.vertex import TridentVertex
+
+
+class _TokenValues(dict):
+    def __missing__(self, key):
+        return key
+
+
+_t_values = _TokenValues({
+    'id': 'internal_id',
+    'label': 'label',
+    'key': 'key',
+    'value': 'value',
+})
+
+
+def _decode_floating_decimal(obj_value):
+    return Decimal(str(obj_value))
+
+
+def _decode_list(obj_value):
+    return obj_value
+
+
+def _decode_date(obj_value):
+    return datetime.datetime.fromtimestamp(obj_value/1000)
+
+
+def _decode_map(obj_value):
+    return dict(zip(obj_value[::2], obj_value[1::2]))
+
+
+def _decode_vertex(obj_value):
+    return TridentVertex(obj_value['id'], obj_value['label'], obj_value.get('properties'))
+
+
+def _decode_edge(obj_value):
+    to_vertex = TridentVertex(obj_value['inV'], obj_value['inVLabel'])
+    from_vertex = TridentVertex(obj_value['outV'], obj_value['outVLabel'])
+    return TridentEdge(obj_value['id'], obj_value['label'], from_vertex, to_vertex)
+
+
+def _decode_vertex_property(obj_value):
+    return TridentProperty(obj_value['label'], obj_value['value'])
+
+
+def _decode_path(obj_value):
+    return TridentPath(obj_value['labels'], obj_value['objects'])
+
+
+# builtins are used as handlers wherever they fit, they decode without a Python frame per object
+_decimal_numbers = {
+    'g:Int32': Decimal,
+    'g:Int64': Decimal,
+    'g:Float': _decode_floating_decimal,
+    'g:Double': _decode_floating_decimal,
+}
+_native_numbers = {
+    'g:Int32': int,
+    'g:Int64': int,
+    'g:Float': float,
+    'g:Double': float,
+}
+_handlers = {
+    'g:T': _t_values.__getitem__,
+    'g:List': _decode_list,
+    'g:Set': set,
+    'g:Date': _decode_date,
+    'g:Timestamp': _decode_date,
+    'g:Map': _decode_map,
+    'g:UUID': str,
+    'g:Vertex': _decode_vertex,
+    'g:Edge': _decode_edge,
+    'g:VertexProperty': _decode_vertex_property,
+    'g:Path': _decode_path,
+}
+
+
+class GraphsonDecoder:
+    """Decodes GraphSON objects into Trident objects with a single table lookup per object
+
+        numbers decode to Decimal by default, matching what the rest of the stack stores and serves,
+        or to int and float when native_numbers is set. unknown types are passed through untouched
+    """
+    accept = 'application/vnd.gremlin-v3.0+json'
+
+    def __init__(self, native_numbers: bool = False, handlers: Dict[str, Callable[[Any], Any]] = None):
+        decode_table = dict(_handlers)
+        decode_table.update(_native_numbers if native_numbers else _decimal_numbers)
+        if handlers:
+            decode_table.update(handlers)
+        self._native_numbers = native_numbers
+        self._decode_table = decode_table
+        self.object_hook = self._build_object_hook(decode_table)
+
+    @property
+    def native_numbers(self) -> bool:
+        return self._native_numbers
+
+    def register(self, graphson_type: str, handler: Callable[[Any], Any]):
+        """handler receives the @value of every object with the given @type, and returns what it decodes to"""
+        self._decode_table[graphson_type] = handler
+
+    def loads(self, graphson: Union[str, bytes]) -> Any:
+        return rapidjson.loads(graphson, object_hook=self.object_hook)
+
+    @staticmethod
+    def _build_object_hook(decode_table):
+        get_handler = decode_table.get
+
+        def object_hook(obj):
+            if '@type' not in obj:
+                return obj
+            handler = get_handler(obj['@type'])
+            if handler is None:
+                return obj
+            return handler(obj['@value'])
+        return object_hook
+
+
+def _decode_untyped_value(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return Decimal(value)
+    return value
+
+
+def _decode_untyped_element(element):
+    if not isinstance(element, dict) or 'id' not in element or 'label' not in element:
+        return element
+    if 'inV' in element and 'outV' in element:
+        to_vertex = TridentVertex(element['inV'], element['inVLabel'])
+        from_vertex = TridentVertex(element['outV'], element['outVLabel'])
+        return TridentEdge(element['id'], element['label'], from_vertex, to_vertex)
+    vertex_properties = {}
+    for property_name, entries in element.get('properties', {}).items():
+        vertex_properties[property_name] = [
+            TridentProperty(property_name, _decode_untyped_value(x['value'])) for x in entries]
+    return TridentVertex(element['id'], element['label'], vertex_properties)
+
+
+class UntypedGraphsonDecoder:
+    """Decodes untyped GraphSON, where no value is wrapped in @type and @value, and most responses are half the size
+
+        without types, a date can not be told from a number, or an id key from a property named id,
+        so only the vertexes and edges at the top level of the results are rebuilt, into the same Trident objects
+        the GraphsonDecoder returns. it is only safe for queries that return whole vertexes or edges
+    """
+    accept = 'application/vnd.gremlin-v3.0+json;types=false'
+
+    def loads(self, graphson: Union[str, bytes]) -> Any:
+        response_json = rapidjson.loads(graphson, number_mode=rapidjson.NM_DECIMAL)
+        result = response_json.get('result')
+        if result and isinstance(result.get('data'), list):
+            result['data'] = [_decode_untyped_element(x) for x in result['data']]
+        return response_json
+
+
+default_decoder = GraphsonDecoder()
+
+
+def register(graphson_type: str, handler: Callable[[Any], Any]):
+    """adds or replaces how the default decoder, and so every TridentNotary, decodes a GraphSON type"""
+    default_decoder.register(graphson_type, handler)
+
+
+class TridentDecoder(json.JSONDecoder):
+    def __init__(self, *args, **kwargs):
+        json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
+
+    @staticmethod
+    def object_hook(obj):
+        return default_decoder.object_hook(obj)
+
+
+def decode_graphson_response(response_content: bytes,
+                             decoder: Union[GraphsonDecoder, UntypedGraphsonDecoder] = None) -> Any:
+    """decodes the raw bytes of a Gremlin response straight into Trident objects, in a single pass
+
+        the envelope around result.data carries no @type, so the object hook passes it through untouched
+    """
+    if decoder is None:
+        decoder = default_decoder
+    response_json = decoder.loads(response_content)
+    return response_json['result']['data']
@@ -0,0 +1,128 @@
+import os
+import re
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+_binding_name = re.compile(r'\b_p(\d+)\b')
+
+
+def quote_literal(value: Any) -> str:
+    """renders a value as a Gremlin literal that is always parsed back as the same value, whatever it contains"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, Decimal)):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, datetime):
+        return f"datetime('{value.isoformat()}')"
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return f"[{', '.join(quote_literal(x) for x in value)}]"
+    escaped = str(value).replace('\\', '\\\\').replace("'", "\\'").replace('\n', '\\n').replace('\r', '\\r')
+    return f"'{escaped}'"
+
+
+def use_bindings() -> bool:
+    return os.getenv('GRAPH_DB_USE_BINDINGS', 'false').lower() == 'true'
+
+
+class GremlinQuery:
+    """A Gremlin script template, with every id and value held apart from the script in its bindings
+
+        sent with bindings, the script text is identical for every call of the same shape, so the server can
+        reuse what it compiled for it. rendered inline, each binding is quoted back into the script as a literal,
+        which is the default as Neptune only honours bindings on some engine versions
+    """
+    def __init__(self, script: str = '', bindings: Dict[str, Any] = None):
+        self._script = script
+        self._bindings = dict(bindings) if bindings else {}
+
+    @classmethod
+    def build(cls, template: str, *values) -> 'GremlinQuery':
+        """binds each value to the next {} in template, a list or tuple binds each of its members, comma separated"""
+        query = cls()
+        query.append(template, *values)
+        return query
+
+    @classmethod
+    def join(cls, queries: Iterable[Union['GremlinQuery', str]], separator: str = ';') -> 'GremlinQuery':
+        joined = cls()
+        scripts = []
+        for query in queries:
+            scripts.append(joined._absorb(query))
+        joined._script = separator.join(scripts)
+        return joined
+
+    @property
+    def script(self) -> str:
+        return self._script
+
+    @property
+    def bindings(self) -> Dict[str, Any]:
+        return dict(self._bindings)
+
+    def bind(self, value: Any) -> str:
+        binding_name = f'_p{len(self._bindings)}'
+        self._bindings[binding_name] = value
+        return binding_name
+
+    def append(self, template: str, *values) -> 'GremlinQuery':
+        binding_names = []
+        for value in values:
+            if isinstance(value, (list, tuple)):
+                binding_names.append(', '.join(self.bind(x) for x in value))
+                continue
+            binding_names.append(self.bind(value))
+        self._script += template.format(*binding_names)
+        return self
+
+    def render(self) -> str:
+        if not self._bindings:
+            return self._script
+        bindings = self._bindings
+        return _binding_name.sub(
+            lambda x: quote_literal(bindings[x.group(0)]) if x.group(0) in bindings else x.group(0), self._script)
+
+    def to_request(self, with_bindings: bool = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        if with_bindings is None:
+            with_bindings = use_bindings()
+        if with_bindings and self._bindings:
+            return self._script, self.bindings
+        return self.render(), None
+
+    def _absorb(self, query: Union['GremlinQuery', str]) -> str:
+        if not isinstance(query, GremlinQuery):
+            return query
+        offset = len(self._bindings)
+        for binding_name, value in query._bindings.items():
+            self._bindings[f'_p{int(binding_name[2:]) + offset}'] = value
+        return _binding_name.sub(lambda x: f'_p{int(x.group(1)) + offset}', query._script)
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        return f'GremlinQuery({self._script!r}, {self._bindings!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, GremlinQuery):
+            return False
+        return self._script == other._script and self._bindings == other._bindings
+
+    def __hash__(self):
+        return hash(self._script)
+
+
+def to_request(command: Union[GremlinQuery, str], with_bindings: bool = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    if isinstance(command, GremlinQuery):
+        return command.to_request(with_bindings)
+    return command, None
+
+
+def to_script(command: Union[GremlinQuery, str]) -> str:
+    if isinstance(command, GremlinQuery):
+        return command.script
+    return command
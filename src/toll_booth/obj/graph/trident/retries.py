@@ -0,0 +1,116 @@
+import logging
+import os
+import random
+import socket
+import time
+from typing import Callable, Any, Union
+
+import rapidjson
+import requests
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.trident.queries import GremlinQuery, to_script
+from toll_booth.obj.graph.trident.troubles import NeptuneException, TransientNeptuneException, \
+    AmbiguousNeptuneException
+
+# Neptune rolls these back before anything is written, or never starts the command at all
+_transient_error_codes = {
+    'ConcurrentModificationException',
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ReadOnlyViolationException',
+    'MemoryLimitExceededException',
+    'QueryLimitExceededException',
+}
+_ambiguous_error_codes = {
+    'InternalFailureException',
+}
+_ambiguous_status_codes = {500, 502, 503, 504}
+_upsert_markers = ('coalesce(unfold(), add', 'coalesce(unfold(),add')
+_counter_update_marker = 'union(values('
+
+
+def is_idempotent_command(command: Union[GremlinQuery, str]) -> bool:
+    """a command can be sent twice without harm if every addV/addE in it is guarded by a fold().coalesce() upsert
+
+        reads, drop() and property updates are idempotent on their own
+    """
+    command = to_script(command)
+    additions = command.count('addV(') + command.count('addE(')
+    guarded = sum(command.count(x) for x in _upsert_markers)
+    # an edge counter moved outside an upsert would move again, a guarded addE carries at most one with it
+    counter_updates = command.count(_counter_update_marker)
+    return additions <= guarded and counter_updates <= guarded
+
+
+def classify_response(status_code: int, response_text: str, command: str) -> NeptuneException:
+    error_code, detailed_message = None, response_text
+    try:
+        error_body = rapidjson.loads(response_text)
+        if isinstance(error_body, dict):
+            error_code = error_body.get('code')
+            detailed_message = error_body.get('detailedMessage', response_text)
+    except ValueError:
+        pass
+    if status_code == 429 or error_code in _transient_error_codes:
+        return TransientNeptuneException(status_code, error_code, detailed_message, command)
+    if error_code in _ambiguous_error_codes or (error_code is None and status_code in _ambiguous_status_codes):
+        return AmbiguousNeptuneException(status_code, error_code, detailed_message, command)
+    return NeptuneException(status_code, error_code, detailed_message, command)
+
+
+class RetryPolicy:
+    """Sends a command again after a Neptune failure that is safe to retry, backing off with full jitter
+
+        transient failures (write conflicts, throttling, failover) are always retried,
+        ambiguous failures (a 5xx with no known cause, a dropped connection) only when the command is idempotent
+    """
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None):
+        if max_attempts is None:
+            max_attempts = int(os.getenv('NEPTUNE_MAX_ATTEMPTS', 5))
+        if base_delay is None:
+            base_delay = float(os.getenv('NEPTUNE_RETRY_BASE_DELAY_MS', 50)) / 1000
+        if max_delay is None:
+            max_delay = float(os.getenv('NEPTUNE_RETRY_MAX_DELAY_MS', 2000)) / 1000
+        self._max_attempts = max(max_attempts, 1)
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+    @property
+    def max_attempts(self) -> int:
+        return self._max_attempts
+
+    def should_retry(self, exception: Exception, idempotent: bool) -> bool:
+        if isinstance(exception, TransientNeptuneException):
+            return True
+        if isinstance(exception, AmbiguousNeptuneException):
+            return idempotent
+        if isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return idempotent
+        if isinstance(exception, (ConnectionError, TimeoutError, socket.timeout)):
+            return idempotent
+        return False
+
+    def get_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self._max_delay, self._base_delay * (2 ** attempt)))
+
+    def call(self, function: Callable[[], Any], idempotent: bool, on_retry: Callable[[Exception], None] = None):
+        attempt = 0
+        while True:
+            try:
+                return function()
+            except Exception as e:
+                if not self.should_retry(e, idempotent):
+                    raise
+                attempt += 1
+                if attempt >= self._max_attempts:
+                    logging.warning(f'giving up on a command to the remote database after {attempt} attempts: {e}')
+                    metrics.record_count('neptune_retries_exhausted')
+                    raise
+                delay = self.get_delay(attempt - 1)
+                logging.info(f'retrying a command to the remote database in {delay:.3f}s, attempt {attempt}: {e}')
+                metrics.record_count('neptune_retries')
+                metrics.record_time('neptune_retry_backoff', delay * 1000)
+                if on_retry is not None:
+                    on_retry(e)
+                time.sleep(delay)
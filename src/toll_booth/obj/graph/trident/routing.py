@@ -0,0 +1,238 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, List, Union
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.trident.retries import RetryPolicy
+from toll_booth.obj.graph.trident.troubles import NeptuneException, TransientNeptuneException, \
+    AmbiguousNeptuneException
+
+
+def _is_endpoint_failure(exception: Exception) -> bool:
+    """a failure that says something about the endpoint, rather than the query that was sent to it"""
+    if isinstance(exception, (TransientNeptuneException, AmbiguousNeptuneException)):
+        return True
+    if isinstance(exception, NeptuneException):
+        return False
+    return isinstance(exception, OSError)
+
+
+def _parse_endpoints(endpoints: Union[str, List[str]]) -> List[str]:
+    if isinstance(endpoints, str):
+        endpoints = endpoints.split(',')
+    return [x.strip() for x in endpoints if x and x.strip()]
+
+
+class ReaderEndpoint:
+    def __init__(self, endpoint: str, notary):
+        self.endpoint = endpoint
+        self.notary = notary
+        self.ewma_ms = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejected_until = None
+        self.probing = False
+
+    @property
+    def score(self) -> float:
+        # an endpoint with no history yet scores best, so every replica is measured early on
+        if self.ewma_ms is None:
+            return 0
+        return self.ewma_ms * (self.in_flight + 1)
+
+
+class ReaderPool:
+    """Spreads reads across several Neptune reader instances, sending each to the least loaded one
+
+        load is the EWMA of an endpoint's round trips times the requests it has in flight.
+        an endpoint failing failure_threshold times in a row is ejected for ejection_seconds, then re-probed
+        with a single request before it takes traffic again. when hedge_reads is set, a read still running
+        after the p95 of recent round trips is sent to a second endpoint as well, and the first answer wins
+    """
+    def __init__(self,
+                 endpoints: List[ReaderEndpoint],
+                 retry_policy: RetryPolicy = None,
+                 ewma_weight: float = None,
+                 failure_threshold: int = None,
+                 ejection_seconds: float = None,
+                 hedge_reads: bool = None,
+                 hedge_min_samples: int = 20):
+        if not endpoints:
+            raise RuntimeError('must specify at least one reader endpoint for the reader pool')
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        if ewma_weight is None:
+            ewma_weight = float(os.getenv('READER_POOL_EWMA_WEIGHT', 0.3))
+        if failure_threshold is None:
+            failure_threshold = int(os.getenv('READER_POOL_FAILURE_THRESHOLD', 3))
+        if ejection_seconds is None:
+            ejection_seconds = float(os.getenv('READER_POOL_EJECTION_SECONDS', 30))
+        if hedge_reads is None:
+            hedge_reads = os.getenv('READER_POOL_HEDGE_READS', 'false').lower() == 'true'
+        self._endpoints = endpoints
+        self._retry_policy = retry_policy
+        self._ewma_weight = ewma_weight
+        self._failure_threshold = failure_threshold
+        self._ejection_seconds = ejection_seconds
+        self._hedge_reads = hedge_reads
+        self._hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._hedge_executor = None
+
+    @classmethod
+    def from_endpoints(cls, endpoints: Union[str, List[str]], notary_class=None, **kwargs):
+        if notary_class is None:
+            from toll_booth.obj.graph.trident.connections import TridentNotary
+
+            notary_class = TridentNotary
+        # the pool retries on its own, so that a retry can go to a different replica
+        reader_endpoints = [ReaderEndpoint(x, notary_class(x, retry_policy=RetryPolicy(1)))
+                            for x in _parse_endpoints(endpoints)]
+        return cls(reader_endpoints, **kwargs)
+
+    @classmethod
+    def get_for_reader(cls, **kwargs):
+        endpoints = kwargs.get('reader_endpoints', os.getenv('GRAPH_DB_READER_ENDPOINTS'))
+        if not endpoints:
+            endpoints = kwargs.get('graph_db_reader_endpoint', os.getenv('GRAPH_DB_READER_ENDPOINT'))
+        return cls.from_endpoints(endpoints, kwargs.get('notary_class'), hedge_reads=kwargs.get('hedge_reads'))
+
+    @property
+    def endpoints(self) -> List[ReaderEndpoint]:
+        return list(self._endpoints)
+
+    @property
+    def hedge_threshold_ms(self):
+        with self._lock:
+            if len(self._latencies) < self._hedge_min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    def send(self, command: str, read_only: bool = True, compact: bool = False) -> Any:
+        tried = set()
+
+        def _attempt():
+            if self._hedge_reads:
+                return self._send_hedged(command, read_only, tried, compact)
+            reader_endpoint = self._choose(tried)
+            return self._send_to(reader_endpoint, command, read_only, compact)
+        return self._retry_policy.call(_attempt, True)
+
+    def send_many(self, commands: List[str], read_only: bool = True, compact: bool = False) -> List[Any]:
+        executor = self._get_executor()
+        return list(executor.map(lambda x: self.send(x, read_only, compact), commands))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                max_workers = int(os.getenv('READER_POOL_MAX_WORKERS', 4 * len(self._endpoints)))
+                self._executor = ThreadPoolExecutor(max_workers=max_workers)
+            return self._executor
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        # apart from the pool send_many runs on, as a hedged read blocks its worker until a sub-request answers
+        with self._lock:
+            if self._hedge_executor is None:
+                max_workers = int(os.getenv('READER_POOL_MAX_WORKERS', 4 * len(self._endpoints)))
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * max_workers)
+            return self._hedge_executor
+
+    def _choose(self, tried: set = None) -> ReaderEndpoint:
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for reader_endpoint in self._endpoints:
+                if reader_endpoint.ejected_until is not None:
+                    if reader_endpoint.ejected_until > now or reader_endpoint.probing:
+                        continue
+                    reader_endpoint.probing = True
+                    logging.info(f'probing ejected reader endpoint: {reader_endpoint.endpoint}')
+                    return self._claim(reader_endpoint, tried)
+                candidates.append(reader_endpoint)
+            untried = [x for x in candidates if not tried or x.endpoint not in tried]
+            if untried:
+                candidates = untried
+            if not candidates:
+                # every replica is ejected, the one due back soonest is the best remaining bet
+                candidates = [min(self._endpoints, key=lambda x: x.ejected_until or 0)]
+            return self._claim(min(candidates, key=lambda x: x.score), tried)
+
+    @staticmethod
+    def _claim(reader_endpoint: ReaderEndpoint, tried: set = None) -> ReaderEndpoint:
+        reader_endpoint.in_flight += 1
+        if tried is not None:
+            tried.add(reader_endpoint.endpoint)
+        return reader_endpoint
+
+    def _send_to(self, reader_endpoint: ReaderEndpoint, command: str, read_only: bool, compact: bool = False) -> Any:
+        start = time.perf_counter()
+        try:
+            results = reader_endpoint.notary.send(command, read_only=read_only, compact=compact)
+        except Exception as e:
+            self._record_failure(reader_endpoint, e)
+            raise
+        self._record_success(reader_endpoint, (time.perf_counter() - start) * 1000)
+        return results
+
+    def _send_hedged(self, command: str, read_only: bool, tried: set, compact: bool = False) -> Any:
+        executor = self._get_hedge_executor()
+        primary = executor.submit(self._send_to, self._choose(tried), command, read_only, compact)
+        hedge_threshold_ms = self.hedge_threshold_ms
+        if hedge_threshold_ms is None or len(self._endpoints) < 2:
+            return primary.result()
+        done, _ = wait([primary], timeout=hedge_threshold_ms / 1000)
+        if done:
+            return primary.result()
+        metrics.record_count('neptune_hedged_reads')
+        hedge = executor.submit(self._send_to, self._choose(tried), command, read_only, compact)
+        pending = {primary, hedge}
+        first_exception = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.record_count('neptune_hedge_wins')
+                    return future.result()
+                if first_exception is None:
+                    first_exception = future.exception()
+        raise first_exception
+
+    def _record_success(self, reader_endpoint: ReaderEndpoint, round_trip_ms: float):
+        with self._lock:
+            reader_endpoint.in_flight -= 1
+            if reader_endpoint.ewma_ms is None:
+                reader_endpoint.ewma_ms = round_trip_ms
+            else:
+                weight = self._ewma_weight
+                reader_endpoint.ewma_ms = weight * round_trip_ms + (1 - weight) * reader_endpoint.ewma_ms
+            reader_endpoint.consecutive_failures = 0
+            if reader_endpoint.ejected_until is not None:
+                logging.info(f'reader endpoint: {reader_endpoint.endpoint} is healthy again')
+            reader_endpoint.ejected_until = None
+            reader_endpoint.probing = False
+            self._latencies.append(round_trip_ms)
+
+    def _record_failure(self, reader_endpoint: ReaderEndpoint, exception: Exception):
+        with self._lock:
+            reader_endpoint.in_flight -= 1
+            if not _is_endpoint_failure(exception):
+                reader_endpoint.probing = False
+                return
+            reader_endpoint.consecutive_failures += 1
+            should_eject = reader_endpoint.probing \
+                or reader_endpoint.consecutive_failures >= self._failure_threshold
+            reader_endpoint.probing = False
+            if should_eject:
+                reader_endpoint.ejected_until = time.monotonic() + self._ejection_seconds
+        if should_eject:
+            logging.warning(f'ejecting reader endpoint: {reader_endpoint.endpoint} for {self._ejection_seconds}s, '
+                            f'after {reader_endpoint.consecutive_failures} failures, last: {exception}')
+            metrics.record_count('reader_endpoint_ejections')
@@ -0,0 +1,387 @@
+import base64
+import hashlib
+import logging
+import os
+import socket
+import ssl
+import struct
+import threading
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import rapidjson
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.trident.connections import TridentNotary
+from toll_booth.obj.graph.trident.decoders import GraphsonDecoder, default_decoder
+from toll_booth.obj.graph.trident.queries import GremlinQuery, to_request
+from toll_booth.obj.graph.trident.retries import RetryPolicy, classify_response, is_idempotent_command
+from toll_booth.obj.graph.trident.troubles import NeptuneException, TridentSocketClosedException
+
+_websocket_guid = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_mime_type = b'application/vnd.gremlin-v3.0+json'
+_request_prefix = bytes([len(_mime_type)]) + _mime_type
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+_success_codes = {200, 204, 206}
+
+
+def accept_key(websocket_key: bytes) -> str:
+    return base64.b64encode(hashlib.sha1(websocket_key + _websocket_guid).digest()).decode('ascii')
+
+
+def _mask(mask_key: bytes, payload: bytes) -> bytes:
+    payload_length = len(payload)
+    repeated_key = (mask_key * (payload_length // 4 + 1))[:payload_length]
+    masked = int.from_bytes(payload, 'big') ^ int.from_bytes(repeated_key, 'big')
+    return masked.to_bytes(payload_length, 'big')
+
+
+def encode_frame(opcode: int, payload: bytes, masked: bool = True) -> bytes:
+    """builds a single, final RFC 6455 frame; frames from a client must be masked, frames from a server must not"""
+    payload_length = len(payload)
+    mask_bit = 0x80 if masked else 0
+    if payload_length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, mask_bit | payload_length)
+    elif payload_length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, mask_bit | 126, payload_length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, mask_bit | 127, payload_length)
+    if not masked:
+        return header + payload
+    mask_key = os.urandom(4)
+    return header + mask_key + _mask(mask_key, payload)
+
+
+def read_frame(read_exact: Callable[[int], bytes]) -> Tuple[bool, int, bytes]:
+    """reads one frame, returning (fin, opcode, unmasked payload)"""
+    first_byte, second_byte = struct.unpack('!BB', read_exact(2))
+    payload_length = second_byte & 0x7F
+    if payload_length == 126:
+        payload_length = struct.unpack('!H', read_exact(2))[0]
+    elif payload_length == 127:
+        payload_length = struct.unpack('!Q', read_exact(8))[0]
+    mask_key = read_exact(4) if second_byte & 0x80 else None
+    payload = read_exact(payload_length) if payload_length else b''
+    if mask_key is not None:
+        payload = _mask(mask_key, payload)
+    return bool(first_byte & 0x80), first_byte & 0x0F, payload
+
+
+def encode_request(request_id: str, command: str, bindings: Dict[str, Any] = None) -> bytes:
+    args = {'gremlin': command, 'language': 'gremlin-groovy'}
+    if bindings:
+        args['bindings'] = bindings
+    request = {'requestId': request_id, 'op': 'eval', 'processor': '', 'args': args}
+    return _request_prefix + rapidjson.dumps(request, number_mode=rapidjson.NM_DECIMAL).encode('utf-8')
+
+
+class _PendingRequest:
+    __slots__ = ('command', 'future', 'results')
+
+    def __init__(self, command: str):
+        self.command = command
+        self.future = Future()
+        self.results = []
+
+
+class TridentSocket:
+    """A single WebSocket session to the Gremlin endpoint, with any number of requests in flight on it
+
+        requests are tagged with a requestId and written as soon as they are submitted,
+        a reader thread matches each response back to its request, gathering the partial (206) batches
+        of a streamed result until the final 200 arrives
+    """
+    def __init__(self,
+                 host: str,
+                 port: int = 8182,
+                 path: str = '/gremlin',
+                 headers: Dict[str, str] = None,
+                 use_ssl: bool = True,
+                 connect_timeout: float = None,
+                 decoder: GraphsonDecoder = None):
+        if connect_timeout is None:
+            connect_timeout = float(os.getenv('GRAPH_DB_CONNECT_TIMEOUT', 10))
+        if decoder is None:
+            decoder = default_decoder
+        self._decoder = decoder
+        self._send_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[str, _PendingRequest] = {}
+        self._closed_reason = None
+        raw_socket = socket.create_connection((host, port), timeout=connect_timeout)
+        if use_ssl:
+            raw_socket = ssl.create_default_context().wrap_socket(raw_socket, server_hostname=host)
+        raw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket = raw_socket
+        self._reader = raw_socket.makefile('rb')
+        try:
+            self._handshake(host, port, path, headers or {})
+        except Exception:
+            self._socket.close()
+            raise
+        raw_socket.settimeout(None)
+        self._reader_thread = threading.Thread(target=self._read_loop, name='trident_socket_reader', daemon=True)
+        self._reader_thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed_reason is not None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def submit(self, command: str, bindings: Dict[str, Any] = None) -> Future:
+        request_id = str(uuid.uuid4())
+        pending = _PendingRequest(command)
+        with self._pending_lock:
+            if self._closed_reason is not None:
+                raise TridentSocketClosedException(self._closed_reason)
+            self._pending[request_id] = pending
+        frame = encode_frame(OP_BINARY, encode_request(request_id, command, bindings))
+        metrics.record_bytes('neptune_request_bytes', len(frame))
+        try:
+            with self._send_lock:
+                self._socket.sendall(frame)
+        except OSError as e:
+            self._close(f'could not write to the socket: {e}')
+        return pending.future
+
+    def abandon(self, future: Future):
+        """stops waiting on a request, any response that still arrives for it is dropped"""
+        with self._pending_lock:
+            for request_id, pending in self._pending.items():
+                if pending.future is future:
+                    del self._pending[request_id]
+                    return
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            with self._send_lock:
+                self._socket.sendall(encode_frame(OP_CLOSE, struct.pack('!H', 1000)))
+        except OSError:
+            pass
+        self._close('closed by the client')
+
+    def _handshake(self, host: str, port: int, path: str, headers: Dict[str, str]):
+        websocket_key = base64.b64encode(os.urandom(16))
+        request_lines = [
+            f'GET {path} HTTP/1.1',
+            f'Host: {host}:{port}',
+            'Upgrade: websocket',
+            'Connection: Upgrade',
+            f'Sec-WebSocket-Key: {websocket_key.decode("ascii")}',
+            'Sec-WebSocket-Version: 13',
+        ]
+        request_lines.extend(f'{x}: {y}' for x, y in headers.items() if x.lower() != 'host')
+        self._socket.sendall(('\r\n'.join(request_lines) + '\r\n\r\n').encode('utf-8'))
+        status_line = self._reader.readline().decode('latin-1').strip()
+        response_headers = {}
+        while True:
+            header_line = self._reader.readline().decode('latin-1').strip()
+            if not header_line:
+                break
+            header_name, _, header_value = header_line.partition(':')
+            response_headers[header_name.strip().lower()] = header_value.strip()
+        if not status_line.startswith('HTTP/1.1 101'):
+            raise ConnectionError(f'the remote database refused the WebSocket upgrade: {status_line}')
+        if response_headers.get('sec-websocket-accept') != accept_key(websocket_key):
+            raise ConnectionError('the remote database returned an invalid Sec-WebSocket-Accept')
+
+    def _read_exact(self, byte_count: int) -> bytes:
+        data = self._reader.read(byte_count)
+        if len(data) != byte_count:
+            raise EOFError('the remote database closed the connection')
+        return data
+
+    def _read_loop(self):
+        fragments = []
+        try:
+            while True:
+                fin, opcode, payload = read_frame(self._read_exact)
+                if opcode == OP_PING:
+                    with self._send_lock:
+                        self._socket.sendall(encode_frame(OP_PONG, payload))
+                    continue
+                if opcode == OP_PONG:
+                    continue
+                if opcode == OP_CLOSE:
+                    self._close('closed by the remote database')
+                    return
+                fragments.append(payload)
+                if not fin:
+                    continue
+                message, fragments = b''.join(fragments), []
+                metrics.record_bytes('neptune_response_bytes', len(message))
+                self._handle_message(message)
+        except Exception as e:
+            self._close(f'{type(e).__name__}: {e}')
+
+    def _handle_message(self, message: bytes):
+        with metrics.timed('graphson_decode'):
+            response = self._decoder.loads(message)
+        request_id = response.get('requestId')
+        with self._pending_lock:
+            pending = self._pending.get(request_id)
+        if pending is None:
+            logging.warning(f'received a response for an unknown request: {request_id}')
+            return
+        status = response.get('status', {})
+        status_code = status.get('code')
+        if status_code not in _success_codes:
+            self._finish(request_id)
+            metrics.record_count('neptune_errors')
+            pending.future.set_exception(classify_response(status_code, status.get('message', ''), pending.command))
+            return
+        data = (response.get('result') or {}).get('data')
+        if isinstance(data, list):
+            pending.results.extend(data)
+        elif data is not None:
+            pending.results.append(data)
+        if status_code == 206:
+            return
+        self._finish(request_id)
+        pending.future.set_result(pending.results)
+
+    def _finish(self, request_id: str):
+        with self._pending_lock:
+            self._pending.pop(request_id, None)
+
+    def _close(self, reason: str):
+        with self._pending_lock:
+            if self._closed_reason is not None:
+                return
+            self._closed_reason = reason
+            pending, self._pending = self._pending, {}
+        logging.debug(f'closing the session to the remote database, {len(pending)} requests pending: {reason}')
+        for pending_request in pending.values():
+            if not pending_request.future.done():
+                pending_request.future.set_exception(TridentSocketClosedException(reason))
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+class TridentSocketNotary:
+    """Sends commands to the remote database over a signed WebSocket session instead of one HTTPS POST each
+
+        the session is shared by every thread using the notary, so their requests are pipelined on one connection.
+        a dropped session is reopened on the next request, and failures are retried exactly as the TridentNotary does
+    """
+    def __init__(self,
+                 neptune_endpoint: str,
+                 retry_policy: RetryPolicy = None,
+                 decoder: GraphsonDecoder = None,
+                 signer: TridentNotary = None,
+                 port: int = 8182,
+                 use_ssl: bool = True,
+                 request_timeout: float = None):
+        if neptune_endpoint is None:
+            raise RuntimeError('must specify neptune endpoint when calling the trident_socket_notary')
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        if signer is None:
+            signer = TridentNotary(neptune_endpoint, retry_policy=retry_policy, decoder=decoder)
+        if request_timeout is None:
+            request_timeout = float(os.getenv('GRAPH_DB_REQUEST_TIMEOUT', 120))
+        self._neptune_endpoint = neptune_endpoint
+        self._retry_policy = retry_policy
+        self._decoder = decoder
+        self._signer = signer
+        self._port = port
+        self._use_ssl = use_ssl
+        self._request_timeout = request_timeout
+        self._socket = None
+        self._socket_lock = threading.Lock()
+
+    @classmethod
+    def get_for_writer(cls, **kwargs):
+        endpoint = kwargs.get('graph_db_endpoint', os.getenv('GRAPH_DB_ENDPOINT', None))
+        return cls(endpoint)
+
+    @classmethod
+    def get_for_reader(cls, **kwargs):
+        endpoint = kwargs.get('graph_db_reader_endpoint', os.getenv('GRAPH_DB_READER_ENDPOINT', None))
+        return cls(endpoint)
+
+    def send(self, command: Union[GremlinQuery, str], read_only: bool = False, compact: bool = False) -> List[Any]:
+        """compact is accepted for parity with the TridentNotary, responses on a session are always typed"""
+        idempotent = read_only or is_idempotent_command(command)
+        return self._retry_policy.call(lambda: self._wait(command, *self._submit(command)), idempotent, self._on_retry)
+
+    def send_many(self,
+                  commands: List[Union[GremlinQuery, str]],
+                  read_only: bool = False,
+                  compact: bool = False) -> List[Any]:
+        """writes every command before waiting on any of them, falling back to send for the ones that need a retry
+
+            compact is accepted for parity with the TridentNotary, as it is by send
+        """
+        submitted = []
+        for command in commands:
+            try:
+                submitted.append(self._submit(command))
+            except Exception as e:
+                submitted.append(e)
+        results = []
+        for command, request in zip(commands, submitted):
+            try:
+                if isinstance(request, Exception):
+                    raise request
+                results.append(self._wait(command, *request))
+            except Exception as e:
+                if not self._retry_policy.should_retry(e, read_only or is_idempotent_command(command)):
+                    raise
+                self._on_retry(e)
+                results.append(self.send(command, read_only))
+        return results
+
+    def close(self):
+        with self._socket_lock:
+            if self._socket is not None:
+                self._socket.close()
+            self._socket = None
+
+    def _get_socket(self) -> TridentSocket:
+        with self._socket_lock:
+            if self._socket is None or self._socket.closed:
+                with metrics.timed('neptune_connect'):
+                    headers = self._signer.generate_signed_headers('GET', '/gremlin')
+                    self._socket = TridentSocket(
+                        self._neptune_endpoint, self._port, headers=headers,
+                        use_ssl=self._use_ssl, decoder=self._decoder)
+                metrics.record_count('neptune_connections')
+            return self._socket
+
+    def _submit(self, command: Union[GremlinQuery, str]) -> Tuple[TridentSocket, Future]:
+        logging.debug(f'sending a command to the remote database: {command}')
+        metrics.record_count('neptune_requests')
+        trident_socket = self._get_socket()
+        return trident_socket, trident_socket.submit(*to_request(command))
+
+    def _wait(self, command: str, trident_socket: TridentSocket, future: Future) -> List[Any]:
+        with metrics.timed('neptune_round_trip'):
+            try:
+                return future.result(self._request_timeout)
+            except FutureTimeoutError:
+                trident_socket.abandon(future)
+                raise TimeoutError(f'no response from the remote database after {self._request_timeout}s: {command}')
+
+    def _on_retry(self, exception: Exception):
+        read_only_writer = isinstance(exception, NeptuneException) \
+            and exception.error_code == 'ReadOnlyViolationException'
+        if read_only_writer or isinstance(exception, ConnectionError):
+            logging.info(f'dropping the session to the remote database before retrying: {exception}')
+            self.close()
@@ -1,37 +1,161 @@
+import os
+from typing import Any, List, Union
+
 from toll_booth.obj.graph.trident.connections import TridentNotary
+from toll_booth.obj.graph.trident.batching import CommandResult, TridentBatchWriter
+from toll_booth.obj.graph.trident.caching import QueryResultCache, get_query_cache
+from toll_booth.obj.graph.trident.queries import GremlinQuery
+from toll_booth.obj.graph.trident.routing import ReaderPool
+from toll_booth.obj.graph.trident.troubles import TridentBatchException
+
+
+def _get_notary_class(transport: str):
+    if transport == 'https':
+        return TridentNotary
+    if transport == 'websocket':
+        from toll_booth.obj.graph.trident.sockets import TridentSocketNotary
+
+        return TridentSocketNotary
+    raise RuntimeError(f'unknown transport for the remote database: {transport}, expected https or websocket')
 
 
 class TridentDriver:
     def __init__(self, **kwargs):
-        self._read_notary = kwargs.get('read_notary', TridentNotary.get_for_reader(**kwargs))
-        self._write_notary = kwargs.get('write_notary', TridentNotary.get_for_writer(**kwargs))
+        transport = kwargs.get('transport', os.getenv('GRAPH_DB_TRANSPORT', 'https'))
+        read_notary = kwargs.get('read_notary')
+        if read_notary is None and kwargs.get('reader_endpoints', os.getenv('GRAPH_DB_READER_ENDPOINTS')):
+            read_notary = ReaderPool.get_for_reader(notary_class=_get_notary_class(transport), **kwargs)
+        if read_notary is None:
+            read_notary = _get_notary_class(transport).get_for_reader(**kwargs)
+        write_notary = kwargs.get('write_notary')
+        if write_notary is None:
+            write_notary = _get_notary_class(transport).get_for_writer(**kwargs)
+        self._read_notary = read_notary
+        self._write_notary = write_notary
+        self._query_cache = kwargs.get('query_cache', get_query_cache())
         self._batch_mode = False
+        self._batch_writer = None
+        self._batch_results = []
+
+    @property
+    def query_cache(self) -> QueryResultCache:
+        return self._query_cache
+
+    @property
+    def batch_results(self) -> List[CommandResult]:
+        """a result for each command of the last batch, in the order they were executed"""
+        return self._batch_results
+
+    def batch_writer(self, **kwargs) -> TridentBatchWriter:
+        """a writer that sends its commands to the writer endpoint in chunks, see TridentBatchWriter
+
+            unless max_workers is 1 chunks may land out of order, so only send commands that do not depend on each other
+        """
+        return TridentBatchWriter(self._send_batch_chunk, **kwargs)
+
+    def invalidate(self, internal_ids: List[str]):
+        if self._query_cache is not None:
+            self._query_cache.invalidate(internal_ids)
 
     def get(self, internal_id):
-        command = "g.V('%s')" % internal_id
+        command = GremlinQuery.build('g.V({})', internal_id)
         return self.execute(command, True)
 
-    def execute(self, query_text: str, read_only: bool = False):
+    def execute(self, query_text: Union[GremlinQuery, str], read_only: bool = False, compact: bool = False):
+        """compact asks for an untyped response, only for reads returning whole vertexes or edges"""
         if self._batch_mode is True:
-            self._batch_commands.append(query_text)
+            self._batch_writer.add(query_text)
             return
-        notary = self._write_notary
-        if read_only:
-            notary = self._read_notary
-        results = notary.send(query_text)
+        query_cache = self._query_cache
+        if not read_only:
+            try:
+                return self._write_notary.send(query_text, read_only=False)
+            finally:
+                if query_cache is not None:
+                    query_cache.invalidate_query(str(query_text))
+        notary = self._read_notary
+        if query_cache is None:
+            return notary.send(query_text, read_only=True, compact=compact)
+        # the cache is keyed on the rendered text, so the same query matches however its values were sent
+        rendered_text = str(query_text)
+        results = query_cache.get(rendered_text, compact)
+        if results is not None:
+            return results
+        generation = query_cache.generation
+        results = notary.send(query_text, read_only=True, compact=compact)
+        query_cache.put(rendered_text, results, generation, compact)
         return results
 
+    def read_from_writer(self, query_text: Union[GremlinQuery, str]):
+        """a read sent to the writer, past the cache, for a value a write is about to depend on
+
+            the replicas lag the writer, and the cache may hold a read from before the last write
+        """
+        return self._write_notary.send(query_text, read_only=True)
+
+    def execute_many(self,
+                     queries: List[Union[GremlinQuery, str]],
+                     read_only: bool = False,
+                     compact: bool = False) -> List[Any]:
+        """runs the queries independently, overlapping their round trips as far as the notary allows,
+            and returns the results in order. reads are served from the cache where they can be
+        """
+        if self._batch_mode is True:
+            for query_text in queries:
+                self._batch_writer.add(query_text)
+            return
+        query_cache = self._query_cache
+        if not read_only:
+            try:
+                return self._send_many(self._write_notary, queries, False, False)
+            finally:
+                if query_cache is not None:
+                    for query_text in queries:
+                        query_cache.invalidate_query(str(query_text))
+        if query_cache is None:
+            return self._send_many(self._read_notary, queries, True, compact)
+        results = [query_cache.get(str(x), compact) for x in queries]
+        missing = [x for x, y in enumerate(results) if y is None]
+        if missing:
+            generation = query_cache.generation
+            fetched = self._send_many(self._read_notary, [queries[x] for x in missing], True, compact)
+            for pointer, result in zip(missing, fetched):
+                results[pointer] = result
+                query_cache.put(str(queries[pointer]), result, generation, compact)
+        return results
+
+    @staticmethod
+    def _send_many(notary, queries: List[Union[GremlinQuery, str]], read_only: bool, compact: bool) -> List[Any]:
+        send_many = getattr(notary, 'send_many', None)
+        if send_many is not None:
+            return send_many(queries, read_only=read_only, compact=compact)
+        return [notary.send(x, read_only=read_only, compact=compact) for x in queries]
+
+    def _send_batch_chunk(self, chunk_query: GremlinQuery) -> List[Any]:
+        try:
+            return self._write_notary.send(chunk_query)
+        finally:
+            if self._query_cache is not None:
+                self._query_cache.invalidate_query(str(chunk_query))
+
     def __enter__(self):
-        self._batch_commands = []
+        # a command in the block may depend on one before it, an edge on its vertexes, so chunks go one at a time
+        self._batch_writer = self.batch_writer(max_workers=1)
+        self._batch_results = []
         self._batch_mode = True
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self._batch_mode = False
+        batch_writer, self._batch_writer = self._batch_writer, None
         if not exc_type and not exc_val:
-            self._batch_mode = False
-            if self._batch_commands:
-                commands = ';'.join(self._batch_commands)
-                self.execute(commands)
-            self._batch_commands = []
+            try:
+                self._batch_results = batch_writer.flush_or_raise()
+            except TridentBatchException as e:
+                self._batch_results = e.command_results
+                raise
+            finally:
+                batch_writer.close()
             return True
+        batch_writer.close()
         raise (exc_type(exc_val))
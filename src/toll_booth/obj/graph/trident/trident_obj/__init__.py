@@ -2,6 +2,8 @@ from typing import List, Dict, Any
 
 import rapidjson
 
+from toll_booth.obj.graph.trident.trident_obj.properties import TridentProperty
+
 
 def _parse_property_value(property_attributes: List[Any]) -> Dict[str, Any]:
     if len(property_attributes) > 2:
@@ -20,6 +22,9 @@ def _parse_property_value(property_attributes: List[Any]) -> Dict[str, Any]:
 def parse_object_properties(property_name: str, object_properties: List[Any]) -> Dict[str, Any]:
     property_attributes = []
     for object_property in object_properties:
+        if isinstance(object_property, TridentProperty):
+            property_attributes.append(object_property.value)
+            continue
         property_attributes.append(object_property['_property_value'])
     gql = {
         '__typename': 'ObjectProperty',
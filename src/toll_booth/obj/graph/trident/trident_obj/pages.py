@@ -5,11 +5,17 @@ from algernon.aws.squirrel import SneakyKipper
 
 
 class PaginationToken(AlgObject):
+    """Where a client is in a paginated result, handed to them encrypted as next_token
+
+        a token with a last_internal_id is a cursor, the next page starts after that id, in id order.
+        tokens without one, issued before cursors existed, page by offset from inclusive_start
+    """
     def __init__(self,
                  username: str,
                  inclusive_start: int,
                  page_size: int,
-                 pagination_id: str = None):
+                 pagination_id: str = None,
+                 last_internal_id: str = None):
         if not pagination_id:
             import uuid
             pagination_id = uuid.uuid4().hex
@@ -17,12 +23,13 @@ class PaginationToken(AlgObject):
         self._inclusive_start = inclusive_start
         self._page_size = page_size
         self._pagination_id = pagination_id
+        self._last_internal_id = last_internal_id
 
     @classmethod
     def parse_json(cls, json_dict: Dict[str, Any]):
         return cls(
             json_dict['username'], json_dict['inclusive_start'],
-            json_dict['page_size'], json_dict['pagination_id']
+            json_dict['page_size'], json_dict['pagination_id'], json_dict.get('last_internal_id')
         )
 
     @classmethod
@@ -31,9 +38,14 @@ class PaginationToken(AlgObject):
         obj_dict = ajson.loads(json_string)
         return cls(
             username, obj_dict['inclusive_start'],
-            obj_dict['page_size'], obj_dict['pagination_id']
+            obj_dict['page_size'], obj_dict['pagination_id'], obj_dict.get('last_internal_id')
         )
 
+    @classmethod
+    def for_cursor(cls, username: str, page_size: int):
+        """the token for the first page of a new pagination, by cursor"""
+        return cls(username, 0, page_size, last_internal_id='')
+
     @property
     def to_gql(self):
         encrypted_value = self.package()
@@ -47,13 +59,35 @@ class PaginationToken(AlgObject):
     def page_size(self):
         return self._page_size
 
-    def increment(self) -> None:
+    @property
+    def pagination_id(self):
+        return self._pagination_id
+
+    @property
+    def last_internal_id(self):
+        return self._last_internal_id
+
+    @property
+    def is_cursor(self) -> bool:
+        return self._last_internal_id is not None
+
+    def copy(self) -> 'PaginationToken':
+        return PaginationToken(
+            self._username, self._inclusive_start, self._page_size, self._pagination_id, self._last_internal_id)
+
+    def increment(self, last_internal_id: str = None) -> None:
+        """moves to the next page, and for a cursor past the last id of the page just served, if it had any"""
         self._inclusive_start += self._page_size
+        if self.is_cursor and last_internal_id is not None:
+            self._last_internal_id = last_internal_id
 
     def package(self) -> str:
-        unencrypted_text = ajson.dumps({
+        token_values = {
             'pagination_id': self._pagination_id,
             'inclusive_start': self._inclusive_start,
             'page_size': self._page_size
-        })
+        }
+        if self.is_cursor:
+            token_values['last_internal_id'] = self._last_internal_id
+        unencrypted_text = ajson.dumps(token_values)
         return SneakyKipper('pagination').encrypt(unencrypted_text, {'username': self._username})
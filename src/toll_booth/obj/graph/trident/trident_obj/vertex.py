@@ -2,6 +2,7 @@ from typing import Dict, List, Any
 
 from algernon import AlgObject
 
+from toll_booth.obj.graph.edge_counts import is_edge_count_key
 from toll_booth.obj.graph.trident.trident_obj.properties import TridentProperty
 from toll_booth.obj.graph.trident.trident_obj import parse_object_properties
 
@@ -33,6 +34,8 @@ class TridentVertex(AlgObject):
         }
         gql_properties = []
         for property_name, vertex_properties in self._vertex_properties.items():
+            if is_edge_count_key(property_name):
+                continue
             property_value = parse_object_properties(property_name, vertex_properties)
             if property_name in ['id_value', 'identifier_stem']:
                 gql[property_name] = property_value
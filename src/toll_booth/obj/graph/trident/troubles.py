@@ -0,0 +1,62 @@
+class NeptuneException(RuntimeError):
+    """raised when the remote database refuses or fails a command, and it should not be sent again"""
+    def __init__(self, status_code, error_code, detailed_message, command):
+        self._status_code = status_code
+        self._error_code = error_code
+        self._detailed_message = detailed_message
+        self._command = command
+        msg = f'error passing command to remote database: {status_code} {error_code}: {detailed_message}, ' \
+            f'command: {command}'
+        super().__init__(msg)
+
+    @property
+    def status_code(self):
+        return self._status_code
+
+    @property
+    def error_code(self):
+        return self._error_code
+
+    @property
+    def detailed_message(self):
+        return self._detailed_message
+
+    @property
+    def command(self):
+        return self._command
+
+
+class TransientNeptuneException(NeptuneException):
+    """the remote database rejected the command without applying it, so it is always safe to send it again"""
+
+
+class AmbiguousNeptuneException(NeptuneException):
+    """the command may or may not have been applied, so it is only sent again if doing so is idempotent"""
+
+
+class TridentSocketClosedException(ConnectionError):
+    """the WebSocket session to the remote database closed with requests still waiting on it"""
+    def __init__(self, reason):
+        self._reason = reason
+        super().__init__(f'the session to the remote database closed: {reason}')
+
+    @property
+    def reason(self):
+        return self._reason
+
+
+class TridentBatchException(RuntimeError):
+    """raised once a batch is fully sent, when some of its commands failed, the rest of the batch was still applied"""
+    def __init__(self, command_results):
+        self._command_results = command_results
+        failed = [x for x in command_results if not x.succeeded]
+        super().__init__(f'{len(failed)} of {len(command_results)} commands in a batch failed, '
+                         f'first failure: {failed[0].exception}')
+
+    @property
+    def command_results(self):
+        return self._command_results
+
+    @property
+    def failed(self):
+        return [x for x in self._command_results if not x.succeeded]
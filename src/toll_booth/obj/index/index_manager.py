@@ -12,6 +12,7 @@ from botocore.exceptions import ClientError
 from multiprocessing.dummy import Pool as ThreadPool
 
 
+from toll_booth.obj import metrics, registry
 from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty
 from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
 from toll_booth.obj.index.indexes import UniqueIndex
@@ -143,10 +144,11 @@ class IndexManager:
         return potential_vertexes
 
     def get_object_key(self, internal_id: str):
-        response = self._table.query(
-            IndexName=self._internal_id_index.index_name,
-            KeyConditionExpression=Key('internal_id').eq(internal_id)
-        )
+        with metrics.timed('index_round_trip'):
+            response = self._table.query(
+                IndexName=self._internal_id_index.index_name,
+                KeyConditionExpression=Key('internal_id').eq(internal_id)
+            )
         if response['Count'] > 1:
             raise RuntimeError(f'internal_id value: {internal_id} has some how been indexed multiple times, '
                                f'big problem: {response["Items"]}')
@@ -157,7 +159,8 @@ class IndexManager:
     def delete_object(self, internal_id: str):
         existing_object_key = self.get_object_key(internal_id)
         if existing_object_key:
-            self._table.delete_item(Key=existing_object_key)
+            with metrics.timed('index_round_trip'):
+                self._table.delete_item(Key=existing_object_key)
 
     def _index_object(self, scalar_object: Union[InputVertex, InputEdge]):
         """Adds an object to the index per the schema
@@ -196,7 +199,8 @@ class IndexManager:
         if condition_expressions:
             args['ConditionExpression'] = ' AND '.join(condition_expressions)
         try:
-            results = self._table.put_item(**args)
+            with metrics.timed('index_round_trip'):
+                results = self._table.put_item(**args)
             return results
         except ClientError as e:
             if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
@@ -219,7 +223,7 @@ class IndexManager:
         found_vertexes = []
         object_type, vertex_properties = scan_args['object_type'], scan_args['vertex_properties']
         segment, total_segments = scan_args['segment'], scan_args['total_segments']
-        paginator = boto3.client('dynamodb').get_paginator('scan')
+        paginator = registry.get_boto3_client('dynamodb').get_paginator('scan')
         filter_properties = [f'(object_type = :ot OR begins_with(identifier_stem, :stub))']
         expression_names = {}
         expression_values = {
@@ -250,6 +254,7 @@ class IndexManager:
             'TotalSegments': total_segments
         }
         iterator = paginator.paginate(**scan_kwargs)
-        for entry in iterator:
-            found_vertexes.extend(entry.get('Items', []))
+        with metrics.timed('index_round_trip'):
+            for entry in iterator:
+                found_vertexes.extend(entry.get('Items', []))
         return found_vertexes
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+_namespace = 'alg_gql'
+
+
+class ListSink:
+    """keeps the emitted metric documents in memory, for local runs and tests"""
+    def __init__(self):
+        self.documents: List[Dict[str, Any]] = []
+
+    def __call__(self, document: Dict[str, Any]):
+        self.documents.append(document)
+
+
+def _stdout_sink(document: Dict[str, Any]):
+    print(json.dumps(document, default=str), flush=True)
+
+
+class InvocationMetrics:
+    """Collects the timings, counts and byte totals recorded during one invocation
+
+        recording is thread safe, so the workers resolving a BatchInvoke all add to the same invocation
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, float] = {}
+        self._counts: Dict[str, float] = {}
+        self._sizes: Dict[str, float] = {}
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        return dict(self._timings)
+
+    @property
+    def counts(self) -> Dict[str, float]:
+        return dict(self._counts)
+
+    @property
+    def sizes(self) -> Dict[str, float]:
+        return dict(self._sizes)
+
+    def add_time(self, phase_name: str, milliseconds: float):
+        with self._lock:
+            self._timings[phase_name] = self._timings.get(phase_name, 0) + milliseconds
+
+    def add_count(self, metric_name: str, value: float = 1):
+        with self._lock:
+            self._counts[metric_name] = self._counts.get(metric_name, 0) + value
+
+    def add_bytes(self, metric_name: str, byte_count: int):
+        with self._lock:
+            self._sizes[metric_name] = self._sizes.get(metric_name, 0) + byte_count
+
+    def to_emf(self, dimensions: Dict[str, str] = None) -> Dict[str, Any]:
+        if dimensions is None:
+            dimensions = {}
+        metric_definitions = []
+        document = {}
+        with self._lock:
+            for unit, values in (('Milliseconds', self._timings), ('Count', self._counts), ('Bytes', self._sizes)):
+                for metric_name, metric_value in values.items():
+                    metric_definitions.append({'Name': metric_name, 'Unit': unit})
+                    document[metric_name] = metric_value
+        document.update(dimensions)
+        document['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': os.getenv('METRICS_NAMESPACE', _namespace),
+                'Dimensions': [list(dimensions.keys())],
+                'Metrics': metric_definitions
+            }]
+        }
+        return document
+
+
+_current = InvocationMetrics()
+_sink = None
+_flush_hooks = []
+
+
+def set_sink(sink):
+    global _sink
+    _sink = sink
+
+
+def add_flush_hook(hook):
+    """hook is called just before every flush, to record gauges such as the size of a container wide cache"""
+    if hook not in _flush_hooks:
+        _flush_hooks.append(hook)
+
+
+def get_current() -> InvocationMetrics:
+    return _current
+
+
+@contextmanager
+def timed(phase_name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current.add_time(phase_name, (time.perf_counter() - start) * 1000)
+
+
+def record_time(phase_name: str, milliseconds: float):
+    _current.add_time(phase_name, milliseconds)
+
+
+def record_count(metric_name: str, value: float = 1):
+    _current.add_count(metric_name, value)
+
+
+def record_bytes(metric_name: str, byte_count: int):
+    _current.add_bytes(metric_name, byte_count)
+
+
+def flush(dimensions: Dict[str, str] = None) -> Dict[str, Any]:
+    """emits everything recorded since the last flush as a single Embedded Metric Format document"""
+    global _current
+    for hook in _flush_hooks:
+        try:
+            hook()
+        except Exception as e:
+            logging.warning(f'a metrics flush hook failed: {e}')
+    finished, _current = _current, InvocationMetrics()
+    document = finished.to_emf(dimensions)
+    sink = _sink
+    if sink is None:
+        if os.getenv('METRICS_SINK', 'stdout') != 'stdout':
+            return document
+        sink = _stdout_sink
+    sink(document)
+    return document
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+import boto3
+
+_lock = threading.RLock()
+_shared: Dict[str, Tuple[str, Any]] = {}
+_per_thread = threading.local()
+_generation = 0
+
+
+def _fingerprint(*values) -> str:
+    joined = '|'.join(str(x) for x in values)
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()
+
+
+def _credential_fingerprint() -> str:
+    return _fingerprint(
+        os.getenv('AWS_REGION'), os.getenv('AWS_ACCESS_KEY_ID'),
+        os.getenv('AWS_SECRET_ACCESS_KEY'), os.getenv('AWS_SESSION_TOKEN'))
+
+
+def _get_shared(resource_name: str, fingerprint: str, factory: Callable[[], Any]) -> Any:
+    with _lock:
+        existing = _shared.get(resource_name)
+        if existing is not None and existing[0] == fingerprint:
+            return existing[1]
+        if existing is not None:
+            logging.info(f'configuration for {resource_name} has changed, rebuilding it')
+        resource = factory()
+        _shared[resource_name] = (fingerprint, resource)
+        return resource
+
+
+def _get_per_thread(resource_name: str, fingerprint: str, factory: Callable[[], Any]) -> Any:
+    resources = getattr(_per_thread, 'resources', None)
+    if resources is None or getattr(_per_thread, 'generation', None) != _generation:
+        resources = {}
+        _per_thread.resources = resources
+        _per_thread.generation = _generation
+    existing = resources.get(resource_name)
+    if existing is not None and existing[0] == fingerprint:
+        return existing[1]
+    resource = factory()
+    resources[resource_name] = (fingerprint, resource)
+    return resource
+
+
+def get_boto3_client(service_name: str):
+    """boto3 clients are thread safe, so one is shared across the container"""
+    return _get_shared(
+        f'client#{service_name}', _credential_fingerprint(), lambda: boto3.client(service_name))
+
+
+def get_boto3_resource(service_name: str):
+    """boto3 resources are not thread safe, so one is kept per thread"""
+    return _get_per_thread(
+        f'resource#{service_name}', _credential_fingerprint(), lambda: boto3.resource(service_name))
+
+
+def get_ogm():
+    from toll_booth.obj.graph.ogm import Ogm
+
+    fingerprint = _fingerprint(
+        os.getenv('GRAPH_DB_ENDPOINT'), os.getenv('GRAPH_DB_READER_ENDPOINT'), os.getenv('GRAPH_DB_READER_ENDPOINTS'),
+        os.getenv('GRAPH_DB_TRANSPORT'), _credential_fingerprint())
+    return _get_shared('ogm', fingerprint, Ogm)
+
+
+def get_index_manager(table_name: str = None):
+    from toll_booth.obj.index.index_manager import IndexManager
+
+    if table_name is None:
+        table_name = os.environ['INDEX_TABLE_NAME']
+    fingerprint = _fingerprint(table_name, _credential_fingerprint())
+    return _get_per_thread(f'index_manager#{table_name}', fingerprint, lambda: IndexManager(table_name))
+
+
+def reset():
+    global _generation
+    with _lock:
+        _shared.clear()
+        _generation += 1
@@ -3,7 +3,7 @@ from typing import Dict, Any
 
 from aws_xray_sdk.core import xray_recorder
 
-from toll_booth.obj.graph.ogm import Ogm
+from toll_booth.obj.graph.loader import get_request_loader
 
 known_fields = ('edges',)
 
@@ -17,7 +17,7 @@ def handler(type_name: str,
             request: Dict[str, Any],
             identity: Dict[str, Any]) -> Any:
     if type_name == 'EdgeConnection':
-        ogm = Ogm()
+        loader = get_request_loader()
         if field_name == 'edges':
             logging.debug('request resolved to EdgeConnection.edges')
             if identity in ('None', None):
@@ -31,5 +31,6 @@ def handler(type_name: str,
             edge_label = source.get('edge_label')
             page_size = args.get('page_size')
             next_token = args.get('token')
-            connected_edges = ogm.get_connected_edge_page(username, internal_id, edge_label, page_size, next_token)
+            connected_edges = loader.load_connected_edge_page(
+                username, internal_id, edge_label, page_size, next_token)
             return connected_edges
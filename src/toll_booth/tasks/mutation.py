@@ -4,9 +4,9 @@ from typing import Union
 import boto3
 from aws_xray_sdk.core import xray_recorder
 
+from toll_booth.obj import registry
 from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
-from toll_booth.obj.graph.ogm import Ogm
-from toll_booth.obj.index.index_manager import IndexManager
+from toll_booth.obj.graph.trident.troubles import TridentBatchException
 from toll_booth.obj.index.troubles import UniqueIndexViolationException
 
 known_fields = (
@@ -15,14 +15,15 @@ known_fields = (
     'delete_vertex_index', 'delete_vertex_graph',
     'delete_edge_index', 'delete_edge_graph',
     'add_vertex_index', 'add_vertex_graph',
-    'add_edge_index', 'add_edge_graph'
+    'add_edge_index', 'add_edge_graph',
+    'rebuild_edge_counts'
 )
 
 
 @xray_recorder.capture()
 def _graph_vertex(vertex_scalar: InputVertex):
     logging.debug(f'started the graph vertex operation for: {vertex_scalar}')
-    ogm = Ogm()
+    ogm = registry.get_ogm()
     graph_results = ogm.graph_vertex(vertex_scalar)
     logging.debug(f'completed the graph vertex operation for: {vertex_scalar}, results: {graph_results}')
     results = {'graph_results': graph_results}
@@ -32,7 +33,7 @@ def _graph_vertex(vertex_scalar: InputVertex):
 @xray_recorder.capture()
 def _delete_graphed_vertex(internal_id: str):
     logging.debug(f'started the delete graphed vertex operation for: {internal_id}')
-    ogm = Ogm()
+    ogm = registry.get_ogm()
     graph_results = ogm.delete_vertex(internal_id)
     logging.debug(f'completed the delete graphed vertex operation for: {internal_id}, results: {graph_results}')
     results = {'graph_results': graph_results}
@@ -42,7 +43,7 @@ def _delete_graphed_vertex(internal_id: str):
 @xray_recorder.capture()
 def _graph_edge(edge_scalar: InputEdge):
     logging.debug(f'started the graph edge operation for: {edge_scalar}')
-    ogm = Ogm()
+    ogm = registry.get_ogm()
     graph_results = ogm.graph_edge(edge_scalar)
     logging.debug(f'completed the graph edge operation for: {edge_scalar}, results: {graph_results}')
     results = {'graph_results': graph_results}
@@ -52,17 +53,29 @@ def _graph_edge(edge_scalar: InputEdge):
 @xray_recorder.capture()
 def _delete_graphed_edge(internal_id: str):
     logging.debug(f'started the delete graphed edge operation for: {internal_id}')
-    ogm = Ogm()
+    ogm = registry.get_ogm()
     graph_results = ogm.delete_edge(internal_id)
     logging.debug(f'completed the delete graphed edge operation for: {internal_id}, results: {graph_results}')
     results = {'graph_results': graph_results}
     return results
 
 
+@xray_recorder.capture()
+def _rebuild_edge_counts(internal_ids):
+    logging.debug(f'started the rebuild edge counts operation for: {internal_ids}')
+    ogm = registry.get_ogm()
+    command_results = ogm.rebuild_edge_counts(internal_ids)
+    if any(not x.succeeded for x in command_results):
+        raise TridentBatchException(command_results)
+    logging.debug(f'completed the rebuild edge counts operation for: {internal_ids}, results: {command_results}')
+    results = {'graph_results': len(command_results)}
+    return results
+
+
 @xray_recorder.capture()
 def _index_object(gql_scalar: Union[InputVertex, InputEdge]):
     logging.debug(f'started the index object operation for: {gql_scalar}')
-    index_manager = IndexManager()
+    index_manager = registry.get_index_manager()
     try:
         index_results = index_manager.index_object(gql_scalar)
     except UniqueIndexViolationException as e:
@@ -76,7 +89,7 @@ def _index_object(gql_scalar: Union[InputVertex, InputEdge]):
 @xray_recorder.capture()
 def _delete_indexed_object(internal_id: str):
     logging.debug(f'started the delete indexed object operation for: {internal_id}')
-    index_manager = IndexManager()
+    index_manager = registry.get_index_manager()
     index_results = index_manager.delete_object(internal_id)
     logging.debug(f'completed the delete indexed object operation for: {internal_id}, results: {index_results}')
     results = {'index_results': index_results}
@@ -170,3 +183,9 @@ def handler(type_name, field_name, args, source, result, request, identity):
             results = _graph_edge(edge_scalar)
             logging.debug(f'completed an addEdge_graph command, results: {results}')
             return True
+        if field_name == 'rebuild_edge_counts':
+            logging.debug(f'request resolved to Mutation.rebuildEdgeCounts')
+            internal_ids = args['internal_ids']
+            results = _rebuild_edge_counts(internal_ids)
+            logging.debug(f'completed a rebuildEdgeCounts command, results: {results}')
+            return True
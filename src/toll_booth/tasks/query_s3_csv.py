@@ -1,11 +1,11 @@
 import logging
 
-import boto3
+from toll_booth.obj import registry
 
 
 def query_s3_csv(bucket_name, file_key, expression):
     results = []
-    client = boto3.client('s3')
+    client = registry.get_boto3_client('s3')
     response = client.select_object_content(
         Bucket=bucket_name,
         Key=file_key,
@@ -1,19 +1,67 @@
 import logging
+import os
+from typing import Any, Dict, List, Tuple
 
 from aws_xray_sdk.core import xray_recorder
 
-from toll_booth.obj.graph.ogm import Ogm
+from toll_booth.obj.graph.loader import get_request_loader
 
 known_fields = ('connected_edges',)
+batch_fields = ('connected_edges',)
 
 
 @xray_recorder.capture('vertex')
 def handler(type_name, field_name, args, source, result, request, identity):
-    ogm = Ogm()
+    loader = get_request_loader()
     if type_name == 'Vertex':
         if field_name == 'connected_edges':
             logging.debug('request resolved to Vertex.connected_edges')
             internal_id = source.get('internal_id')
             edge_labels = args.get('edge_labels')
-            connected_edges = ogm.query_edge_connections(internal_id, edge_labels)
+            connected_edges = loader.load_edge_connections(internal_id, edge_labels)
             return connected_edges
+
+
+@xray_recorder.capture('vertex_batch')
+def batch_handler(type_name: str, field_name: str, entries: List[Tuple[Dict[str, Any], ...]]) -> List[Any]:
+    """resolves a whole BatchInvoke of Vertex fields at once
+
+    Args:
+        type_name: the GQL type being resolved
+        field_name: the GQL field being resolved
+        entries: the (args, source, result, request, identity) of each entry in the batch
+
+    Returns:
+        the results, in the same order as the entries
+    """
+    loader = get_request_loader()
+    if type_name == 'Vertex':
+        if field_name == 'connected_edges':
+            logging.debug(f'request resolved to a batch of {len(entries)} Vertex.connected_edges')
+            return _batch_connected_edges(loader, entries)
+    raise RuntimeError(f'could not resolve how to batch {type_name}.{field_name}')
+
+
+def _batch_connected_edges(loader, entries):
+    max_batch_size = int(os.getenv('EDGE_CONNECTION_BATCH_SIZE', 250))
+    label_groups = {}
+    for entry in entries:
+        args, source = entry[0], entry[1]
+        edge_labels = args.get('edge_labels')
+        label_key = tuple(edge_labels) if edge_labels else ()
+        label_groups.setdefault(label_key, set()).add(source.get('internal_id'))
+    edge_connections = {}
+    for label_key, internal_ids in label_groups.items():
+        internal_ids = sorted(internal_ids)
+        for pointer in range(0, len(internal_ids), max_batch_size):
+            batch_ids = internal_ids[pointer:pointer + max_batch_size]
+            batch_results = loader.load_edge_connections_many(batch_ids, list(label_key))
+            for internal_id, connected_edges in zip(batch_ids, batch_results):
+                edge_connections[(label_key, internal_id)] = connected_edges
+    results = []
+    for entry in entries:
+        args, source = entry[0], entry[1]
+        edge_labels = args.get('edge_labels')
+        label_key = tuple(edge_labels) if edge_labels else ()
+        results.append(edge_connections.get((label_key, source.get('internal_id'))))
+    return results
@@ -0,0 +1,28 @@
+import pytest
+import rapidjson
+from algernon import ajson
+
+from tests.test_setup.benchmarks import best_of, report
+from toll_booth.obj.graph.gql_scalars.connected_edges import ConnectedEdge, ConnectedEdgePage, PageInfo
+from toll_booth.obj.graph.serializers import GqlDecoder, GqlEncoder
+
+
+def _round_trip(results):
+    return rapidjson.loads(ajson.dumps(results), object_hook=GqlDecoder.object_hook)
+
+
+def _generate_edge_page(page_size):
+    edges = [ConnectedEdge(f'edge_{x}', '_fake_edge_', f'vertex_{x}') for x in range(page_size)]
+    return ConnectedEdgePage(edges, PageInfo('some_token', True))
+
+
+@pytest.mark.benchmark
+class TestGqlEncodingBenchmark:
+    @pytest.mark.parametrize('page_size', [100, 1000, 10000])
+    def test_encoder_against_round_trip(self, page_size):
+        edge_page = _generate_edge_page(page_size)
+        assert GqlEncoder.encode(edge_page) == _round_trip(edge_page)
+        round_trip_time = best_of(_round_trip, edge_page)
+        encoder_time = best_of(GqlEncoder.encode, edge_page)
+        report(f'gql encoding, {page_size} edges', round_trip=round_trip_time, single_pass=encoder_time)
+        assert encoder_time < round_trip_time
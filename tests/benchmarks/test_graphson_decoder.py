@@ -0,0 +1,84 @@
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+import rapidjson
+
+from tests.test_setup.benchmarks import best_of, report
+from toll_booth.obj.graph.trident.decoders import GraphsonDecoder
+from toll_booth.obj.graph.trident.trident_obj.edge import TridentEdge
+from toll_booth.obj.graph.trident.trident_obj.properties import TridentProperty
+from toll_booth.obj.graph.trident.trident_obj.vertex import TridentVertex
+
+
+def _if_chain_object_hook(obj):
+    """the decoder as it stood before the dispatch table, kept here as the baseline"""
+    if '@type' not in obj:
+        return obj
+    obj_type = obj['@type']
+    obj_value = obj['@value']
+    if obj_type == 'g:T':
+        if obj_value == 'id':
+            return 'internal_id'
+        if obj_value == 'label':
+            return 'label'
+    if obj_type == 'g:Int32':
+        return Decimal(obj_value)
+    if obj_type == 'g:Int64':
+        return Decimal(obj_value)
+    if obj_type == 'g:List':
+        return obj_value
+    if obj_type == 'g:Set':
+        return set(obj_value)
+    if obj_type == 'g:Date':
+        return datetime.datetime.fromtimestamp(obj_value/1000)
+    if obj_type == 'g:Map':
+        created_map = {}
+        i = 0
+        while i < len(obj_value):
+            created_map[obj_value[i]] = obj_value[i + 1]
+            i += 2
+        return created_map
+    if obj_type == 'g:Vertex':
+        return TridentVertex(obj_value['id'], obj_value['label'], obj_value.get('properties'))
+    if obj_type == 'g:Edge':
+        to_vertex = TridentVertex(obj_value['inV'], obj_value['inVLabel'])
+        from_vertex = TridentVertex(obj_value['outV'], obj_value['outVLabel'])
+        return TridentEdge(obj_value['id'], obj_value['label'], from_vertex, to_vertex)
+    if obj_type == 'g:VertexProperty':
+        return TridentProperty(obj_value['label'], obj_value['value'])
+    return obj
+
+
+def _generate_value_maps(element_count):
+    elements = []
+    for x in range(element_count):
+        value_map = [{'@type': 'g:T', '@value': 'id'}, f'vertex_{x}', {'@type': 'g:T', '@value': 'label'}, 'Person']
+        for y in range(8):
+            value_map.extend([f'count_{y}', {'@type': 'g:Int64', '@value': x * y}])
+        value_map.extend(['score', {'@type': 'g:Double', '@value': x / 7}])
+        elements.append({'@type': 'g:Map', '@value': value_map})
+    return json.dumps({'result': {'data': {'@type': 'g:List', '@value': elements}}}).encode('utf-8')
+
+
+def _if_chain_decode(response_content):
+    return rapidjson.loads(response_content, object_hook=_if_chain_object_hook)
+
+
+@pytest.mark.benchmark
+class TestGraphsonDecoderBenchmark:
+    @pytest.mark.parametrize('element_count', [10000, 100000])
+    def test_value_maps_against_if_chain(self, element_count):
+        response_content = _generate_value_maps(element_count // 10)
+        decoder = GraphsonDecoder()
+        native_decoder = GraphsonDecoder(native_numbers=True)
+        if_chain_time = best_of(_if_chain_decode, response_content, rounds=3)
+        table_time = best_of(decoder.loads, response_content, rounds=3)
+        native_time = best_of(native_decoder.loads, response_content, rounds=3)
+        report(f'graphson decoder, {element_count} elements',
+               if_chain=if_chain_time, dispatch_table=table_time, native_numbers=native_time)
+        megabytes = len(response_content) / 1024 / 1024
+        print(f'throughput: {megabytes / table_time:.1f}MB/s decimal, {megabytes / native_time:.1f}MB/s native')
+        assert table_time < if_chain_time * 1.25
+        assert native_time < table_time
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+import rapidjson
+
+from tests.test_setup.benchmarks import best_of, report
+from toll_booth.obj.graph.trident.connections import TridentDecoder, decode_graphson_response
+
+
+def _three_pass_decode(response_content):
+    response_json = rapidjson.loads(response_content.decode('utf-8'))
+    results = response_json['result']['data']
+    return rapidjson.loads(rapidjson.dumps(results), object_hook=TridentDecoder.object_hook)
+
+
+def _edge_key(trident_edge):
+    return trident_edge.internal_id, trident_edge.label, trident_edge.in_id, trident_edge.out_id
+
+
+def _generate_response(element_count):
+    elements = []
+    for x in range(element_count):
+        elements.append({'@type': 'g:Edge', '@value': {
+            'id': f'edge_{x}', 'label': '_fake_edge_',
+            'inV': f'vertex_{x}', 'inVLabel': 'Person', 'outV': 'source_vertex', 'outVLabel': 'Person'
+        }})
+        elements.append({'@type': 'g:Map', '@value': [
+            'internal_id', f'vertex_{x}', 'count', {'@type': 'g:Int64', '@value': x}
+        ]})
+    response = {
+        'requestId': 'some_request',
+        'status': {'message': '', 'code': 200, 'attributes': {'@type': 'g:Map', '@value': []}},
+        'result': {'data': {'@type': 'g:List', '@value': elements}, 'meta': {'@type': 'g:Map', '@value': []}}
+    }
+    return json.dumps(response).encode('utf-8')
+
+
+@pytest.mark.benchmark
+class TestGraphsonDecodingBenchmark:
+    @pytest.mark.parametrize('element_count', [1000, 10000, 100000])
+    def test_single_pass_against_three_pass(self, element_count):
+        response_content = _generate_response(element_count // 2)
+        single_pass = decode_graphson_response(response_content)
+        three_pass = _three_pass_decode(response_content)
+        assert [_edge_key(x) for x in single_pass[::2]] == [_edge_key(x) for x in three_pass[::2]]
+        assert single_pass[1::2] == three_pass[1::2]
+        three_pass_time = best_of(_three_pass_decode, response_content, rounds=3)
+        single_pass_time = best_of(decode_graphson_response, response_content, rounds=3)
+        report(f'graphson decoding, {element_count} elements', three_pass=three_pass_time, single_pass=single_pass_time)
+        assert single_pass_time < three_pass_time
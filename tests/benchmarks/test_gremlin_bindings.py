@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from tests.test_setup.benchmarks import best_of, report
+from tests.test_setup.gremlin_server import StandInGremlinServer
+from toll_booth.obj.graph.generators import create_vertex_command
+from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty, LocalPropertyValue
+from toll_booth.obj.graph.trident.retries import RetryPolicy
+from toll_booth.obj.graph.trident.sockets import TridentSocketNotary
+
+_compile_seconds = 0.002
+
+
+class _CompilingResponder:
+    """answers like the Gremlin server, which compiles each distinct script once and caches it on its text"""
+    def __init__(self):
+        self._compiled = set()
+        self._lock = threading.Lock()
+        self.compilations = 0
+
+    def __call__(self, command):
+        with self._lock:
+            compiled = command in self._compiled
+            self._compiled.add(command)
+        if not compiled:
+            self.compilations += 1
+            time.sleep(_compile_seconds)
+        return [True]
+
+
+def _vertex_commands(start, count):
+    return [
+        create_vertex_command(
+            f'vertex_{x}', 'Patient',
+            ObjectProperty('id_value', LocalPropertyValue(str(x), 'N')),
+            ObjectProperty('identifier_stem', LocalPropertyValue('#Patient#', 'S')),
+            [ObjectProperty('first_name', LocalPropertyValue(f'name_{x}', 'S'))])
+        for x in range(start, start + count)]
+
+
+@pytest.mark.benchmark
+class TestGremlinBindingsBenchmark:
+    def test_bound_scripts_skip_compilation(self, monkeypatch):
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+        responder = _CompilingResponder()
+        server = StandInGremlinServer(responder)
+        notary = TridentSocketNotary(
+            '127.0.0.1', retry_policy=RetryPolicy(1), port=server.port, use_ssl=False, request_timeout=5)
+        command_count, batches = 100, iter(range(0, 100000, 100))
+
+        def _send_all(with_bindings):
+            monkeypatch.setenv('GRAPH_DB_USE_BINDINGS', 'true' if with_bindings else 'false')
+            for command in _vertex_commands(next(batches), command_count):
+                notary.send(command)
+        try:
+            inline = best_of(_send_all, False, rounds=3)
+            inline_compilations = responder.compilations
+            bound = best_of(_send_all, True, rounds=3)
+        finally:
+            notary.close()
+            server.close()
+        report('gremlin_bindings', inline=inline, bound=bound)
+        assert inline_compilations == 3 * command_count
+        assert responder.compilations == inline_compilations + 1
+        assert bound < inline
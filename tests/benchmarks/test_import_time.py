@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+from os import path
+
+import pytest
+
+_src_path = path.join(path.dirname(path.dirname(path.dirname(path.abspath(__file__)))), 'src')
+_route_only_modules = (
+    'toll_booth.tasks.vertex', 'toll_booth.tasks.mutation',
+    'toll_booth.tasks.edge_connection', 'toll_booth.tasks.query',
+    'toll_booth.obj.graph.ogm', 'toll_booth.obj.graph.trident.connections',
+    'toll_booth.obj.graph.gql_scalars.inputs', 'toll_booth.obj.index.index_manager'
+)
+
+
+def _measure_imports(statement):
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join([_src_path, environment.get('PYTHONPATH', '')])
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        env=environment, stderr=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    timings = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_time, cumulative_time, module_name = [x.strip() for x in line[len('import time:'):].split('|')]
+        timings[module_name] = (int(self_time), int(cumulative_time))
+    return timings
+
+
+@pytest.mark.benchmark
+class TestImportTimeBenchmark:
+    def test_cold_start_imports(self):
+        timings = _measure_imports('import toll_booth.handler')
+        toll_booth_timings = sorted(
+            [(x, y[1]) for x, y in timings.items() if x.startswith('toll_booth')], key=lambda x: -x[1])
+        print('\n[cold start imports, cumulative us]')
+        for module_name, cumulative_time in toll_booth_timings:
+            print(f'{module_name}: {cumulative_time}')
+        eager_route_modules = [x for x in _route_only_modules if x in timings]
+        assert not eager_route_modules, f'route only modules imported at cold start: {eager_route_modules}'
+        budget = int(os.getenv('COLD_START_IMPORT_BUDGET_US', 2000000))
+        assert timings['toll_booth.handler'][1] <= budget
+
+    def test_query_route_imports(self):
+        timings = _measure_imports('import toll_booth.handler; import toll_booth.tasks.query')
+        assert 'toll_booth.tasks.mutation' not in timings
+        assert 'toll_booth.obj.index.index_manager' not in timings
@@ -0,0 +1,55 @@
+import gzip
+import json
+
+import pytest
+
+from tests.test_setup.benchmarks import best_of, report
+from toll_booth.obj.graph.trident.decoders import UntypedGraphsonDecoder, decode_graphson_response
+
+
+def _edge_key(trident_edge):
+    return trident_edge.internal_id, trident_edge.label, trident_edge.in_id, trident_edge.out_id
+
+
+def _edge(x):
+    return {
+        'id': f'edge_{x}', 'label': '_fake_edge_', 'inV': f'vertex_{x}', 'inVLabel': 'Person',
+        'outV': 'source_vertex', 'outVLabel': 'Person'
+    }
+
+
+def _envelope(data, typed):
+    empty_map = {'@type': 'g:Map', '@value': []} if typed else {}
+    response = {
+        'requestId': 'some_request',
+        'status': {'message': '', 'code': 200, 'attributes': empty_map},
+        'result': {'data': data, 'meta': empty_map}
+    }
+    return json.dumps(response).encode('utf-8')
+
+
+def _edge_page(edge_count):
+    typed_edges = [{'@type': 'g:Edge', '@value': _edge(x)} for x in range(edge_count)]
+    untyped_edges = [dict(_edge(x), properties={}) for x in range(edge_count)]
+    return _envelope({'@type': 'g:List', '@value': typed_edges}, True), _envelope(untyped_edges, False)
+
+
+@pytest.mark.benchmark
+class TestResponseSizeBenchmark:
+    @pytest.mark.parametrize('edge_count', [1000, 10000])
+    def test_edge_page_sizes(self, edge_count):
+        typed, untyped = _edge_page(edge_count)
+        untyped_decoder = UntypedGraphsonDecoder()
+        typed_edges = decode_graphson_response(typed)
+        untyped_edges = decode_graphson_response(untyped, untyped_decoder)
+        assert [_edge_key(x) for x in typed_edges] == [_edge_key(x) for x in untyped_edges]
+        sizes = {
+            'typed': len(typed), 'typed_gzip': len(gzip.compress(typed)),
+            'untyped': len(untyped), 'untyped_gzip': len(gzip.compress(untyped))
+        }
+        print(f'\n[edge page bytes, {edge_count} edges] ' + ', '.join(f'{x}: {y}' for x, y in sizes.items()))
+        typed_time = best_of(decode_graphson_response, typed, rounds=3)
+        untyped_time = best_of(decode_graphson_response, untyped, untyped_decoder, rounds=3)
+        report(f'edge page decoding, {edge_count} edges', typed=typed_time, untyped=untyped_time)
+        assert sizes['untyped'] < sizes['typed']
+        assert sizes['typed_gzip'] < sizes['typed'] / 4
@@ -0,0 +1,30 @@
+import pytest
+
+from tests.test_setup.benchmarks import best_of, report
+from toll_booth.obj.graph.trident.connections import TridentNotary
+
+_amz_date = '20240101T120000Z'
+
+
+def _sign_commands(notary, commands, cached):
+    for command in commands:
+        if not cached:
+            notary._signing_key_cache = None
+        canonical_request, _ = notary._generate_canonical_request(_amz_date, command)
+        scope = notary._generate_scope(_amz_date[:8])
+        string_to_sign = notary._generate_string_to_sign(canonical_request, _amz_date, scope)
+        signature = notary._generate_signature(string_to_sign, _amz_date[:8])
+        notary._generate_headers(scope, signature, _amz_date)
+
+
+@pytest.mark.benchmark
+class TestSigV4SigningBenchmark:
+    def test_cached_signing_key(self, monkeypatch):
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+        notary = TridentNotary('some_endpoint')
+        commands = [f"g.V('vertex_{x}').bothE().count()" for x in range(5000)]
+        uncached_time = best_of(_sign_commands, notary, commands, False)
+        cached_time = best_of(_sign_commands, notary, commands, True)
+        report('sigv4 signing, 5000 commands', uncached=uncached_time, cached=cached_time)
+        assert cached_time < uncached_time
@@ -7,6 +7,8 @@ from tests.test_setup import mock_objs
 
 import pytest
 
+from toll_booth.obj import registry
+from toll_booth.obj.graph.loader import clear_request_loader
 from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
 
 _mock_vertex_data = {
@@ -230,6 +232,15 @@ def silence_x_ray():
     patch.stopall()
 
 
+@pytest.fixture(autouse=True)
+def reset_registry():
+    registry.reset()
+    clear_request_loader()
+    yield
+    clear_request_loader()
+    registry.reset()
+
+
 @pytest.fixture
 def mock_ogm():
     ogm_path = 'toll_booth.obj.graph.ogm.TridentDriver'
@@ -0,0 +1,15 @@
+import time
+
+
+def best_of(function, *args, rounds: int = 5, **kwargs) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def report(benchmark_name: str, **timings) -> None:
+    entries = ', '.join(f'{x}: {y * 1000:.2f}ms' for x, y in timings.items())
+    print(f'\n[{benchmark_name}] {entries}')
@@ -0,0 +1,150 @@
+import json
+import socket
+import threading
+from typing import Any, Callable, List
+
+from toll_booth.obj.graph.trident.sockets import OP_BINARY, OP_CLOSE, OP_PING, OP_TEXT, accept_key, encode_frame, \
+    read_frame
+
+
+class StandInError(Exception):
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.message = message
+        super().__init__(message)
+
+
+def _graphson_list(values: List[Any]):
+    return {'@type': 'g:List', '@value': values}
+
+
+class StandInGremlinServer:
+    """A local stand in for the Neptune WebSocket endpoint
+
+        each request is answered on its own thread, so slow requests finish after fast ones, and results
+        longer than batch_size are streamed back as 206 partial batches, the way the Gremlin server does it
+    """
+    def __init__(self, responder: Callable[[str], List[Any]], batch_size: int = 64):
+        self._responder = responder
+        self._batch_size = batch_size
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(8)
+        self._lock = threading.Lock()
+        self._connections = []
+        self.handshakes = []
+        self.requests = []
+        self.bindings = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    @property
+    def port(self) -> int:
+        return self._listener.getsockname()[1]
+
+    def drop_connections(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    def close(self):
+        self._listener.close()
+        self.drop_connections()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._connections.append(connection)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        reader = connection.makefile('rb')
+        send_lock = threading.Lock()
+
+        def read_exact(byte_count):
+            data = reader.read(byte_count)
+            if len(data) != byte_count:
+                raise EOFError()
+            return data
+
+        def send(opcode, payload):
+            with send_lock:
+                connection.sendall(encode_frame(opcode, payload, masked=False))
+
+        try:
+            self._accept_handshake(connection, reader)
+            while True:
+                fin, opcode, payload = read_frame(read_exact)
+                if opcode == OP_CLOSE:
+                    send(OP_CLOSE, payload)
+                    return
+                if opcode == OP_PING:
+                    continue
+                if opcode == OP_BINARY:
+                    request = json.loads(payload[payload[0] + 1:].decode('utf-8'))
+                    threading.Thread(target=self._answer, args=(request, send), daemon=True).start()
+        except (EOFError, OSError):
+            return
+
+    def _accept_handshake(self, connection, reader):
+        request_headers = {}
+        reader.readline()
+        while True:
+            header_line = reader.readline().decode('latin-1').strip()
+            if not header_line:
+                break
+            header_name, _, header_value = header_line.partition(':')
+            request_headers[header_name.strip().lower()] = header_value.strip()
+        self.handshakes.append(request_headers)
+        websocket_key = request_headers['sec-websocket-key'].encode('ascii')
+        response = 'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n' \
+            f'Sec-WebSocket-Accept: {accept_key(websocket_key)}\r\n\r\n'
+        connection.sendall(response.encode('latin-1'))
+
+    def _answer(self, request, send):
+        request_id = request['requestId']
+        command = request['args']['gremlin']
+        with self._lock:
+            self.requests.append(command)
+            self.bindings.append(request['args'].get('bindings'))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            results = self._responder(command)
+        except StandInError as e:
+            answers = [(e.status_code, None, e.message)]
+        else:
+            answers = [(204, None, '')]
+            if results:
+                batches = [results[x:x + self._batch_size] for x in range(0, len(results), self._batch_size)]
+                answers = [(206, _graphson_list(x), '') for x in batches[:-1]]
+                answers.append((200, _graphson_list(batches[-1]), ''))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        try:
+            for status_code, data, message in answers:
+                self._respond(send, request_id, status_code, data, message)
+        except OSError:
+            # the client closed the connection before the answer was ready, as a test that is done with it may
+            return
+
+    @staticmethod
+    def _respond(send, request_id, status_code, data, message=''):
+        response = {
+            'requestId': request_id,
+            'status': {'code': status_code, 'message': message, 'attributes': {'@type': 'g:Map', '@value': []}},
+            'result': {'data': data, 'meta': {'@type': 'g:Map', '@value': []}}
+        }
+        send(OP_TEXT, json.dumps(response).encode('utf-8'))
@@ -0,0 +1,217 @@
+import json
+import re
+import threading
+import time
+
+import pytest
+
+from tests.test_setup.gremlin_server import StandInError, StandInGremlinServer
+from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
+from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty, LocalPropertyValue
+from toll_booth.obj.graph.ogm import Ogm
+from toll_booth.obj.graph.trident.batching import TridentBatchWriter, build_chunk_query
+from toll_booth.obj.graph.trident.queries import GremlinQuery
+from toll_booth.obj.graph.trident.retries import RetryPolicy
+from toll_booth.obj.graph.trident.sockets import TridentSocketNotary
+from toll_booth.obj.graph.trident.trident_driver import TridentDriver
+from toll_booth.obj.graph.trident.troubles import AmbiguousNeptuneException, NeptuneException, \
+    TridentBatchException
+
+_chunk_step = re.compile(r'\.by\((.*?)\.fold\(\)\)')
+_upserted_id = re.compile(r'(?:(?:g\.|by\()V|hasId)\((_p\d+)\)\.fold')
+
+
+class _ChunkNotary:
+    """runs each chunk as the server would, all or nothing, failing any chunk holding a bad command"""
+    def __init__(self, delay: float = 0, error_type=NeptuneException):
+        self.chunks = []
+        self.applied = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._delay = delay
+        self._error_type = error_type
+        self._lock = threading.Lock()
+
+    def send(self, command, read_only=False):
+        commands = _chunk_commands(str(command))
+        with self._lock:
+            self.chunks.append(commands)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self._delay)
+        with self._lock:
+            self.in_flight -= 1
+            if any('bad' in x for x in commands):
+                raise self._error_type(500, 'ConstraintViolationException', 'no', command)
+            self.applied.extend(commands)
+        return _chunk_results([[x] for x in commands])
+
+
+def _chunk_commands(chunk_text):
+    """the commands of a chunk, each rooted at g again"""
+    return [f'g.{x}' for x in _chunk_step.findall(chunk_text)] or [chunk_text]
+
+
+def _chunk_results(command_results):
+    if len(command_results) == 1:
+        return command_results[0]
+    return [{f'r{x}': y for x, y in enumerate(command_results)}]
+
+
+def _commands(count, bad=()):
+    return [GremlinQuery.build('g.V({}).drop()', 'bad' if x in bad else f'v{x}') for x in range(count)]
+
+
+@pytest.mark.trident_batching
+class TestTridentBatchWriter:
+    def test_chunk_query(self):
+        chunk_query = build_chunk_query(_commands(2))
+        assert chunk_query.script == \
+            "g.inject(0).project('r0', 'r1').by(V(_p0).drop().fold()).by(V(_p1).drop().fold())"
+        assert chunk_query.bindings == {'_p0': 'v0', '_p1': 'v1'}
+        assert build_chunk_query(_commands(1)).script == 'g.V(_p0).drop()'
+
+    def test_unchainable_commands_are_sent_alone(self):
+        notary = _ChunkNotary()
+        writer = TridentBatchWriter(notary.send, max_commands=10, max_workers=1)
+        for command in _commands(2) + [GremlinQuery.build('g.E({}).drop()', 'e0')] + _commands(2):
+            writer.add(command)
+        assert [x.succeeded for x in writer.flush()] == [True] * 5
+        assert [len(x) for x in notary.chunks] == [2, 1, 2]
+        assert notary.chunks[1] == ["g.E('e0').drop()"]
+
+    def test_chunks_are_bounded(self):
+        notary = _ChunkNotary()
+        writer = TridentBatchWriter(notary.send, max_bytes=10000, max_commands=4, max_workers=1)
+        for command in _commands(10):
+            writer.add(command)
+        results = writer.flush()
+        assert [len(x) for x in notary.chunks] == [4, 4, 2]
+        assert [x.results for x in results] == [[f"g.V('v{x}').drop()"] for x in range(10)]
+        writer = TridentBatchWriter(notary.send, max_bytes=40, max_commands=100, max_workers=1)
+        for command in _commands(4):
+            writer.add(command)
+        writer.flush()
+        assert [len(x) for x in notary.chunks[3:]] == [2, 2]
+
+    def test_failures_are_isolated(self):
+        notary = _ChunkNotary()
+        writer = TridentBatchWriter(notary.send, max_commands=8, max_workers=1)
+        for command in _commands(8, bad={3}):
+            writer.add(command)
+        results = writer.flush()
+        assert [x.succeeded for x in results] == [x != 3 for x in range(8)]
+        assert len(notary.applied) == 7
+        assert len(notary.chunks) == 7
+
+    def test_ambiguous_failures_are_not_resent(self):
+        notary = _ChunkNotary(error_type=AmbiguousNeptuneException)
+        writer = TridentBatchWriter(notary.send, max_commands=4, max_workers=1)
+        for command in ['g.addV(\'v0\')', 'g.addV(\'bad\')', 'g.addV(\'v2\')', 'g.addV(\'v3\')']:
+            writer.add(command)
+        assert [x.succeeded for x in writer.flush()] == [False] * 4
+        assert len(notary.chunks) == 1
+
+    def test_chunks_are_sent_concurrently(self):
+        notary = _ChunkNotary(delay=0.05)
+        with TridentBatchWriter(notary.send, max_commands=2, max_workers=4) as writer:
+            for command in _commands(8):
+                writer.add(command)
+        assert notary.max_in_flight == 4
+        assert len(notary.applied) == 8
+
+    def test_chunks_are_traversals(self, monkeypatch):
+        def _responder(command):
+            # the way Neptune answers anything that is not a traversal rooted at g
+            if not command.startswith('g.'):
+                raise StandInError(499, json.dumps({'code': 'MalformedQueryException', 'detailedMessage': command}))
+            commands = _chunk_commands(command)
+            if len(commands) == 1:
+                return commands
+            entries = []
+            for position, chunk_command in enumerate(commands):
+                entries.extend([f'r{position}', {'@type': 'g:List', '@value': [chunk_command]}])
+            return [{'@type': 'g:Map', '@value': entries}]
+
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+        server = StandInGremlinServer(_responder)
+        notary = TridentSocketNotary(
+            '127.0.0.1', retry_policy=RetryPolicy(1), port=server.port, use_ssl=False, request_timeout=5)
+        try:
+            driver = TridentDriver(read_notary=notary, write_notary=notary, query_cache=None)
+            with driver:
+                for command in _commands(3):
+                    driver.execute(command)
+        finally:
+            notary.close()
+            server.close()
+        assert [x.results for x in driver.batch_results] == [[f"g.V('v{x}').drop()"] for x in range(3)]
+        assert all(x.startswith('g.') for x in server.requests)
+
+    def test_driver_batch_mode_keeps_order(self, monkeypatch):
+        monkeypatch.setenv('GRAPH_DB_BATCH_MAX_COMMANDS', '2')
+        monkeypatch.setenv('GRAPH_DB_BATCH_CONCURRENCY', '4')
+        notary = _ChunkNotary(delay=0.01)
+        driver = TridentDriver(read_notary=notary, write_notary=notary, query_cache=None)
+        with driver:
+            for command in _commands(8):
+                driver.execute(command)
+        assert notary.max_in_flight == 1
+        assert notary.applied == [f"g.V('v{x}').drop()" for x in range(8)]
+
+    def test_driver_batch_mode(self):
+        notary = _ChunkNotary()
+        driver = TridentDriver(read_notary=notary, write_notary=notary, query_cache=None)
+        with pytest.raises(TridentBatchException) as e:
+            with driver:
+                for command in _commands(5, bad={0}):
+                    driver.execute(command)
+        assert len(e.value.failed) == 1
+        assert len(driver.batch_results) == 5
+        assert len(notary.applied) == 4
+
+
+class _UpsertNotary:
+    """fails any chunk upserting an object whose id starts with bad, returning the upserted ids otherwise"""
+    def __init__(self):
+        self.chunks = []
+
+    def send(self, command, read_only=False):
+        bindings = command.bindings
+        internal_ids = [bindings[x] for x in _upserted_id.findall(command.script)]
+        self.chunks.append(command)
+        if any(x.startswith('bad') for x in internal_ids):
+            raise NeptuneException(500, 'ConstraintViolationException', 'no', command)
+        return _chunk_results([[x] for x in internal_ids])
+
+
+def _vertex(internal_id):
+    id_value = ObjectProperty('id_value', LocalPropertyValue(internal_id, 'S'))
+    identifier_stem = ObjectProperty('identifier_stem', LocalPropertyValue('#Person#', 'S'))
+    return InputVertex(internal_id, id_value, identifier_stem, 'Person')
+
+
+@pytest.mark.trident_batching
+class TestOgmUpserts:
+    def test_graph_vertexes(self, monkeypatch):
+        monkeypatch.setenv('GRAPH_DB_BATCH_MAX_COMMANDS', '4')
+        monkeypatch.setenv('GRAPH_DB_BATCH_CONCURRENCY', '1')
+        notary = _UpsertNotary()
+        ogm = Ogm(TridentDriver(read_notary=notary, write_notary=notary, query_cache=None))
+        internal_ids = [f'v{x}' if x != 5 else 'bad5' for x in range(10)]
+        results = ogm.graph_vertexes([_vertex(x) for x in internal_ids])
+        assert [x.succeeded for x in results] == [x != 5 for x in range(10)]
+        assert [x.results for x in results if x.succeeded] == [[x] for x in internal_ids if x != 'bad5']
+        assert notary.chunks[0].script.count('fold().coalesce(unfold(), addV(') == 4
+        assert ogm.graph_vertexes([]) == []
+
+    def test_graph_edges(self):
+        notary = _UpsertNotary()
+        ogm = Ogm(TridentDriver(read_notary=notary, write_notary=notary, query_cache=None))
+        edges = [InputEdge(f'e{x}', 'knows', f'v{x}', f'v{x + 1}') for x in range(3)]
+        results = ogm.graph_edges(edges)
+        assert [x.results for x in results] == [[f'e{x}'] for x in range(3)]
+        assert len(notary.chunks) == 1
+        assert notary.chunks[0].script.startswith("g.inject(0).project('r0', 'r1', 'r2').by(V(_p0).outE(_p1)")
+        assert notary.chunks[0].script.count('addE(') == 3
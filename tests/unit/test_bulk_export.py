@@ -0,0 +1,102 @@
+import csv
+import json
+import os
+from decimal import Decimal
+
+import pytest
+from algernon import ajson
+
+from toll_booth.obj.graph.bulk_export import BulkLoadExporter
+from toll_booth.obj.graph.generators import create_vertex_command
+from toll_booth.obj.graph.gql_scalars.inputs import InputVertex, InputEdge
+from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty, LocalPropertyValue
+from toll_booth.obj.graph.trident.connections import generate_payload
+
+
+def _vertex(internal_id, vertex_properties=None):
+    id_value = ObjectProperty('id_value', LocalPropertyValue(internal_id, 'S'))
+    identifier_stem = ObjectProperty('identifier_stem', LocalPropertyValue('#Person#', 'S'))
+    return InputVertex(internal_id, id_value, identifier_stem, 'Person', vertex_properties)
+
+
+def _read(file_path):
+    with open(file_path, newline='', encoding='utf-8') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+class _S3Client:
+    def __init__(self):
+        self.uploaded = {}
+
+    def upload_file(self, file_name, bucket_name, file_key):
+        with open(file_name, encoding='utf-8') as shard:
+            self.uploaded[(bucket_name, file_key)] = shard.read()
+
+
+@pytest.mark.bulk_export
+class TestBulkLoadExporter:
+    def test_vertexes(self, tmp_path):
+        name = ObjectProperty('name', LocalPropertyValue('a;b', 'S'))
+        active = ObjectProperty('active', LocalPropertyValue('true', 'B'))
+        with BulkLoadExporter(str(tmp_path)) as exporter:
+            assert exporter.export_vertexes([_vertex('v0', [name, active]), _vertex('v1', [active, name])]) == 2
+        written = exporter.written
+        assert written == [os.path.join(str(tmp_path), 'vertexes-00001.csv')]
+        rows = _read(written[0])
+        assert rows[0] == [
+            '~id', '~label', 'active:String[]', 'id_value:String[]', 'identifier_stem:String[]', 'name:String[]']
+        assert [x[0] for x in rows[1:]] == ['v0', 'v1']
+        assert rows[1][2].startswith('true;')
+        assert rows[1][5].startswith('a\\;b;')
+        map_value = rows[1][5][len('a\\;b;'):].replace('\\;', ';')
+        assert ajson.loads(map_value)['__typename'] == 'LocalPropertyValue'
+
+    def test_numbers_match_the_upsert(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('GRAPH_DB_USE_BINDINGS', 'true')
+        vertex_properties = [
+            ObjectProperty('count', LocalPropertyValue(Decimal('3'), 'N')),
+            ObjectProperty('total', LocalPropertyValue(Decimal('4.0'), 'N')),
+            ObjectProperty('ratio', LocalPropertyValue(Decimal('2.5'), 'N'))
+        ]
+        vertex = _vertex('v0', list(vertex_properties))
+        with BulkLoadExporter(str(tmp_path)) as exporter:
+            exporter.export_vertexes([vertex])
+        header, row = _read(exporter.written[0])
+        property_names = [x.split(':')[0] for x in header[2:]]
+        assert len(property_names) == len(set(property_names))
+        exported = {x.split(':')[0]: y.split(';')[0] for x, y in zip(header[2:], row[2:])}
+        command = create_vertex_command(
+            'v0', 'Person', vertex.id_value, vertex.identifier_stem, list(vertex_properties))
+        bindings = json.loads(generate_payload(command))['bindings']
+        bound = {}
+        for binding_number in range(3, len(bindings), 2):
+            bound.setdefault(bindings[f'_p{binding_number}'], bindings[f'_p{binding_number + 1}'])
+        for property_name in ('count', 'total', 'ratio'):
+            assert exported[property_name] == str(bound[property_name])
+
+    def test_edges_keep_the_last_value(self, tmp_path):
+        edge = InputEdge('e0', 'knows', 'v0', 'v1', [ObjectProperty('since', LocalPropertyValue('2019', 'S'))])
+        with BulkLoadExporter(str(tmp_path)) as exporter:
+            exporter.export_edges([edge])
+        rows = _read(exporter.written[0])
+        assert rows[0] == ['~id', '~from', '~to', '~label', 'id_value:String', 'identifier_stem:String', 'since:String']
+        assert rows[1][:4] == ['e0', 'v0', 'v1', 'knows']
+        assert ajson.loads(rows[1][6])['property_value'] == '2019'
+
+    def test_shards_are_bounded(self, tmp_path):
+        with BulkLoadExporter(str(tmp_path), shard_bytes=2000, max_open_shards=1) as exporter:
+            exporter.export_vertexes(_vertex(f'v{x}') for x in range(40))
+            exporter.export_edges([InputEdge('e0', 'knows', 'v0', 'v1')])
+        vertex_shards = [x for x in exporter.written if 'vertexes' in x]
+        assert len(vertex_shards) > 1
+        assert all(os.path.getsize(x) < 2500 for x in vertex_shards)
+        assert sum(len(_read(x)) - 1 for x in vertex_shards) == 40
+        assert len(exporter.written) == len(vertex_shards) + 1
+
+    def test_s3_destination(self):
+        s3_client = _S3Client()
+        with BulkLoadExporter('s3://some-bucket/loads/run-1/', s3_client=s3_client) as exporter:
+            exporter.export_vertexes([_vertex('v0')])
+        assert exporter.written == ['s3://some-bucket/loads/run-1/vertexes-00001.csv']
+        assert list(s3_client.uploaded) == [('some-bucket', 'loads/run-1/vertexes-00001.csv')]
+        assert s3_client.uploaded[('some-bucket', 'loads/run-1/vertexes-00001.csv')].startswith('~id,~label')
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from toll_booth.obj.config_cache import ConfigCache
+
+_variable_names = ['GRAPH_DB_ENDPOINT', 'GRAPH_DB_READER_ENDPOINT']
+_parameters = {
+    'Parameters': [
+        {'Name': 'GRAPH_DB_ENDPOINT', 'Value': 'some_writer_endpoint'},
+        {'Name': 'GRAPH_DB_READER_ENDPOINT', 'Value': 'some_reader_endpoint'}
+    ]
+}
+
+
+@pytest.mark.config_cache
+class TestConfigCache:
+    def test_warm_loads_skip_parameter_store(self):
+        with patch('toll_booth.obj.config_cache.registry') as mock_registry:
+            mock_registry.get_boto3_client.return_value.get_parameters.return_value = _parameters
+            config_cache = ConfigCache(_variable_names, ttl=300)
+            for _ in range(5):
+                config_cache.load()
+            assert mock_registry.get_boto3_client.return_value.get_parameters.call_count == 1
+            assert config_cache.stats['misses'] == 1
+            assert config_cache.stats['hits'] == 4
+            assert os.environ['GRAPH_DB_ENDPOINT'] == 'some_writer_endpoint'
+
+    def test_expired_cache_reloads(self):
+        with patch('toll_booth.obj.config_cache.registry') as mock_registry:
+            mock_registry.get_boto3_client.return_value.get_parameters.return_value = _parameters
+            config_cache = ConfigCache(_variable_names, ttl=0)
+            config_cache.load()
+            config_cache.load()
+            assert mock_registry.get_boto3_client.return_value.get_parameters.call_count == 2
+            assert config_cache.stats['misses'] == 2
+
+    def test_invalidate(self):
+        with patch('toll_booth.obj.config_cache.registry') as mock_registry:
+            mock_registry.get_boto3_client.return_value.get_parameters.return_value = _parameters
+            config_cache = ConfigCache(_variable_names, ttl=300)
+            config_cache.load()
+            config_cache.invalidate()
+            assert config_cache.is_expired
+            config_cache.load()
+            assert mock_registry.get_boto3_client.return_value.get_parameters.call_count == 2
+
+    def test_background_refresh_serves_stale_values(self):
+        with patch('toll_booth.obj.config_cache.registry') as mock_registry:
+            mock_registry.get_boto3_client.return_value.get_parameters.return_value = _parameters
+            config_cache = ConfigCache(_variable_names, ttl=0, background_refresh=True)
+            config_cache.load()
+            values = config_cache.load()
+            assert values['GRAPH_DB_READER_ENDPOINT'] == 'some_reader_endpoint'
+            config_cache._refresh_thread.join()
+            assert config_cache.stats['refreshes'] == 1
+            assert config_cache.stats['misses'] == 1
+
+    def test_slow_background_refresh_does_not_block(self):
+        with patch('toll_booth.obj.config_cache.registry') as mock_registry:
+            get_parameters = mock_registry.get_boto3_client.return_value.get_parameters
+            get_parameters.return_value = _parameters
+            config_cache = ConfigCache(_variable_names, ttl=0, background_refresh=True)
+            config_cache.load()
+            fetching, release = threading.Event(), threading.Event()
+
+            def _slow_get_parameters(Names):
+                fetching.set()
+                release.wait(5)
+                return _parameters
+            get_parameters.side_effect = _slow_get_parameters
+            try:
+                config_cache.load()
+                assert fetching.wait(5)
+                started = time.perf_counter()
+                values = config_cache.load()
+                assert time.perf_counter() - started < 0.5
+                assert values['GRAPH_DB_ENDPOINT'] == 'some_writer_endpoint'
+            finally:
+                release.set()
+            config_cache._refresh_thread.join()
+            assert config_cache.stats['refreshes'] == 1
@@ -0,0 +1,136 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from toll_booth.obj.graph.trident.connections import TridentNotary
+from toll_booth.obj.graph.trident.credentials import CredentialProvider, TridentCredentials, \
+    fetch_trident_credentials
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Fetcher:
+    def __init__(self, delay: float = 0, expires_in: float = None, clock=None):
+        self.calls = 0
+        self._delay = delay
+        self._expires_in = expires_in
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self._delay)
+        expires_at = None
+        if self._expires_in is not None:
+            expires_at = self._clock() + self._expires_in
+        return TridentCredentials(f'access_key_{call}', f'secret_key_{call}', f'token_{call}', expires_at)
+
+
+@pytest.mark.trident_credentials
+class TestCredentialProvider:
+    def test_credentials_are_cached(self):
+        clock = _Clock()
+        fetcher = _Fetcher()
+        provider = CredentialProvider(fetcher, ttl=600, refresh_ahead=60, clock=clock)
+        assert provider.get().access_key == 'access_key_1'
+        clock.now += 500
+        assert provider.get().access_key == 'access_key_1'
+        clock.now += 50
+        assert provider.get().access_key == 'access_key_2'
+        assert fetcher.calls == 2
+
+    def test_expiry_is_respected(self):
+        clock = _Clock()
+        fetcher = _Fetcher(expires_in=120, clock=clock)
+        provider = CredentialProvider(fetcher, ttl=3600, refresh_ahead=60, clock=clock)
+        provider.get()
+        clock.now += 61
+        assert provider.get().session_token == 'token_2'
+
+    def test_fetches_are_single_flight(self):
+        fetcher = _Fetcher(delay=0.1)
+        provider = CredentialProvider(fetcher, ttl=600, refresh_ahead=60)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(provider.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert fetcher.calls == 1
+        assert {x.access_key for x in results} == {'access_key_1'}
+
+    def test_failed_refresh_keeps_current(self):
+        clock = _Clock()
+        fetcher = MagicMock(side_effect=[TridentCredentials('access_key', 'secret_key'), RuntimeError('no')])
+        provider = CredentialProvider(fetcher, ttl=600, refresh_ahead=60, clock=clock)
+        provider.get()
+        clock.now += 570
+        assert provider.get().access_key == 'access_key'
+
+    def test_refusals_refetch_once(self):
+        clock = _Clock()
+        fetcher = _Fetcher()
+        provider = CredentialProvider(fetcher, ttl=600, refresh_ahead=60, min_refetch=10, clock=clock)
+        refused = provider.get()
+        provider.invalidate(refused)
+        assert provider.get() is refused
+        clock.now += 11
+        provider.invalidate(refused)
+        provider.invalidate(refused)
+        replacement = provider.get()
+        assert replacement.access_key == 'access_key_2'
+        clock.now += 11
+        provider.invalidate(refused)
+        assert provider.get() is replacement
+        assert fetcher.calls == 2
+
+    def test_invalidate_races_get(self):
+        provider = CredentialProvider(_Fetcher(), ttl=600, refresh_ahead=60, min_refetch=0)
+        errors = []
+
+        def _get():
+            try:
+                for _ in range(2000):
+                    provider.get()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=_get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in range(2000):
+            provider.invalidate()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+    def test_environment(self, monkeypatch):
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+        monkeypatch.setenv('AWS_SESSION_TOKEN', 'some_token')
+        monkeypatch.setenv('AWS_CREDENTIAL_EXPIRATION', '2024-01-01T00:00:00Z')
+        credentials = fetch_trident_credentials()
+        assert (credentials.access_key, credentials.session_token) == ('some_access_key', 'some_token')
+        assert credentials.expires_at == 1704067200
+
+    def test_notaries_share_a_provider(self):
+        fetcher = _Fetcher()
+        provider = CredentialProvider(fetcher, ttl=600, refresh_ahead=60)
+        writer = TridentNotary('some_writer', credential_provider=provider)
+        reader = TridentNotary('some_reader', credential_provider=provider)
+        writer_headers = writer.generate_signed_headers('GET', '/gremlin')
+        reader_headers = reader.generate_signed_headers('GET', '/gremlin')
+        assert fetcher.calls == 1
+        assert writer_headers['x-amz-security-token'] == reader_headers['x-amz-security-token'] == 'token_1'
+        provider.invalidate()
+        assert 'access_key_2' in writer.generate_signed_headers('GET', '/gremlin')['Authorization']
@@ -1,8 +1,11 @@
+from decimal import Decimal
+
 import pytest
 import rapidjson
 
-from toll_booth.obj.graph.serializers import GqlDecoder
+from toll_booth.obj.graph.serializers import GqlDecoder, GqlEncoder
 from toll_booth.obj.graph.trident.connections import TridentDecoder
+from toll_booth.obj.graph.trident.decoders import GraphsonDecoder, UntypedGraphsonDecoder, decode_graphson_response
 from algernon import ajson
 
 
@@ -44,3 +47,91 @@ class TestGqlDecoder:
         strung_response = ajson.dumps(event)
         rebuilt_response = rapidjson.loads(strung_response, object_hook=GqlDecoder.object_hook)
         assert rebuilt_response
+
+
+@pytest.mark.gql_encoder
+class TestGqlEncoder:
+    def test_encode_vertex(self, db_get_vertex_response):
+        vertex = rapidjson.loads(rapidjson.dumps(db_get_vertex_response), object_hook=TridentDecoder.object_hook)
+        gql = GqlEncoder.encode(vertex)
+        assert gql == rapidjson.loads(ajson.dumps(vertex), object_hook=GqlDecoder.object_hook)
+
+    def test_encode_vertex_properties(self, db_vertex_vertex_properties_response):
+        vertex_properties = rapidjson.loads(
+            rapidjson.dumps(db_vertex_vertex_properties_response), object_hook=TridentDecoder.object_hook)
+        gql = GqlEncoder.encode(vertex_properties)
+        assert gql == rapidjson.loads(ajson.dumps(vertex_properties), object_hook=GqlDecoder.object_hook)
+
+
+@pytest.mark.graphson_decoder
+class TestGraphsonDecoder:
+    def test_matches_trident_decoder(self, db_get_vertex_response):
+        graphson = rapidjson.dumps(db_get_vertex_response)
+        decoded = GraphsonDecoder().loads(graphson)
+        legacy = rapidjson.loads(graphson, object_hook=TridentDecoder.object_hook)
+        assert GqlEncoder.encode(decoded) == GqlEncoder.encode(legacy)
+
+    def test_numbers(self):
+        graphson = rapidjson.dumps({'@type': 'g:List', '@value': [
+            {'@type': 'g:Int32', '@value': 1},
+            {'@type': 'g:Int64', '@value': 9007199254740993},
+            {'@type': 'g:Double', '@value': 1.5},
+        ]})
+        assert GraphsonDecoder().loads(graphson) == [Decimal(1), Decimal(9007199254740993), Decimal('1.5')]
+        native = GraphsonDecoder(native_numbers=True).loads(graphson)
+        assert native == [1, 9007199254740993, 1.5]
+        assert [type(x) for x in native] == [int, int, float]
+
+    def test_maps_and_t(self):
+        graphson = rapidjson.dumps({'@type': 'g:Map', '@value': [
+            {'@type': 'g:T', '@value': 'id'}, 'some_id',
+            {'@type': 'g:T', '@value': 'key'}, 'some_key',
+            'uuid', {'@type': 'g:UUID', '@value': '41d2e28a-20a4-4ab0-b379-d810dede3786'},
+        ]})
+        assert GraphsonDecoder().loads(graphson) == {
+            'internal_id': 'some_id', 'key': 'some_key', 'uuid': '41d2e28a-20a4-4ab0-b379-d810dede3786'}
+
+    def test_pluggable_handlers(self):
+        graphson = rapidjson.dumps({'@type': 'g:List', '@value': [{'@type': 'g:Direction', '@value': 'OUT'}]})
+        assert GraphsonDecoder().loads(graphson) == [{'@type': 'g:Direction', '@value': 'OUT'}]
+        decoder = GraphsonDecoder(handlers={'g:Direction': str.lower})
+        assert decoder.loads(graphson) == ['out']
+
+
+def _graphson_response(data):
+    return rapidjson.dumps({'requestId': 'some_request', 'status': {'code': 200}, 'result': {'data': data}})
+
+
+@pytest.mark.graphson_decoder
+class TestUntypedGraphsonDecoder:
+    def test_matches_typed(self):
+        property_map = '{"__typename": "LocalPropertyValue", "data_type": "N", "property_value": 1001}'
+        typed = _graphson_response({'@type': 'g:List', '@value': [
+            {'@type': 'g:Vertex', '@value': {'id': 'vertex_1', 'label': 'Patient', 'properties': {'id_value': [
+                {'@type': 'g:VertexProperty', '@value': {
+                    'id': {'@type': 'g:Int64', '@value': 1}, 'label': 'id_value',
+                    'value': {'@type': 'g:Int64', '@value': 1001}}},
+                {'@type': 'g:VertexProperty', '@value': {
+                    'id': {'@type': 'g:Int64', '@value': 2}, 'label': 'id_value', 'value': property_map}}
+            ]}}},
+            {'@type': 'g:Edge', '@value': {
+                'id': 'edge_1', 'label': '_rel_', 'inV': 'vertex_1', 'inVLabel': 'Patient',
+                'outV': 'vertex_2', 'outVLabel': 'Provider'}}
+        ]})
+        untyped = _graphson_response([
+            {'id': 'vertex_1', 'label': 'Patient', 'properties': {'id_value': [
+                {'id': 1, 'value': 1001, 'label': 'id_value'}, {'id': 2, 'value': property_map, 'label': 'id_value'}
+            ]}},
+            {'id': 'edge_1', 'label': '_rel_', 'inV': 'vertex_1', 'inVLabel': 'Patient',
+             'outV': 'vertex_2', 'outVLabel': 'Provider', 'properties': {}}
+        ])
+        typed_vertex, typed_edge = decode_graphson_response(typed)
+        untyped_vertex, untyped_edge = decode_graphson_response(untyped, UntypedGraphsonDecoder())
+        assert untyped_vertex.to_gql == typed_vertex.to_gql
+        assert untyped_vertex.vertex_properties['id_value'][0].value == Decimal(1001)
+        assert (untyped_edge.internal_id, untyped_edge.label, untyped_edge.in_id, untyped_edge.out_id) == \
+            (typed_edge.internal_id, typed_edge.label, typed_edge.in_id, typed_edge.out_id)
+
+    def test_other_results_pass_through(self):
+        untyped = _graphson_response([{'some_label': 3}, 1.5, 'some_id'])
+        assert decode_graphson_response(untyped, UntypedGraphsonDecoder()) == [{'some_label': 3}, Decimal('1.5'), 'some_id']
@@ -0,0 +1,111 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from toll_booth.obj.graph.edge_counts import edge_count_key, edge_counts_ready
+from toll_booth.obj.graph.generators import create_edge_command, create_vertex_command
+from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty, LocalPropertyValue
+from toll_booth.obj.graph.ogm import Ogm
+from toll_booth.obj.graph.trident import TridentDriver
+from toll_booth.obj.graph.trident.caching import QueryResultCache
+from toll_booth.obj.graph.trident.retries import is_idempotent_command
+from toll_booth.obj.graph.trident.trident_obj.properties import TridentProperty
+from toll_booth.obj.graph.trident.trident_obj.vertex import TridentVertex
+
+
+def _stem(value):
+    return ObjectProperty('identifier_stem', LocalPropertyValue(value, 'S'))
+
+
+def _id_value(value):
+    return ObjectProperty('id_value', LocalPropertyValue(value, 'S'))
+
+
+@pytest.fixture
+def notary():
+    notary = MagicMock()
+    notary.send.side_effect = lambda command, read_only=False, compact=False: []
+    return notary
+
+
+@pytest.fixture
+def ogm(notary, monkeypatch):
+    monkeypatch.setenv('MATERIALIZED_EDGE_COUNTS', 'true')
+    monkeypatch.setenv('GRAPH_DB_BATCH_CONCURRENCY', '1')
+    return Ogm(TridentDriver(read_notary=notary, write_notary=notary, query_cache=None))
+
+
+def _sent(notary):
+    return [str(x[0][0]) for x in notary.send.call_args_list]
+
+
+@pytest.mark.edge_counts
+class TestMaterializedEdgeCounts:
+    def test_upserts_move_the_counters(self):
+        command = create_edge_command(
+            'e1', 'knows', _id_value('e1'), _stem('#edge#knows'), 'v1', 'v2', count_edges=True)
+        assert command.render().endswith(
+            f".sideEffect(bothV().property(single, '{edge_count_key('knows')}', "
+            f"union(values('{edge_count_key('knows')}'), constant(1)).sum())))")
+        assert is_idempotent_command(command)
+        assert 'sideEffect' not in create_edge_command(
+            'e1', 'knows', _id_value('e1'), _stem('#edge#knows'), 'v1', 'v2', count_edges=False).render()
+        command = create_vertex_command('v1', 'Person', _id_value('v1'), _stem('#Person#'), count_edges=True)
+        assert f"property(single, '{edge_counts_ready}', true))" in command.render()
+
+    def test_counters_are_read_in_place_of_the_edges(self, ogm, notary):
+        notary.send.side_effect = lambda command, read_only=False, compact=False: [
+            {edge_count_key('knows'): 3, edge_count_key('likes'): 0}]
+        edge_connections = ogm.query_edge_connections('v1')
+        assert [(x['edge_label'], x['total_count']) for x in edge_connections] == [('knows', 3)]
+        assert f"choose(has('{edge_counts_ready}')" in _sent(notary)[0]
+        notary.send.side_effect = lambda command, read_only=False, compact=False: [{'v1': {'knows': 2}}]
+        edge_connections = ogm.query_edge_connections_many(['v1'], ['knows'])
+        assert edge_connections['v1'][0]['total_count'] == 2
+        assert f"properties('{edge_count_key('knows')}')" in _sent(notary)[1]
+
+    def test_deletes_bring_the_counters_down(self, ogm, notary):
+        notary.send.side_effect = lambda command, read_only=False, compact=False: ['knows'] if read_only else []
+        ogm.delete_edge('e1')
+        command = notary.send.call_args_list[-1][0][0]
+        assert str(command) == (
+            f"g.E('e1').sideEffect(bothV().property(single, '{edge_count_key('knows')}', "
+            f"union(values('{edge_count_key('knows')}'), constant(-1)).sum())).drop()")
+        notary.send.side_effect = lambda command, read_only=False, compact=False: \
+            [{'v2': {'knows': 2}}] if read_only else [[]]
+        ogm.delete_vertex('v1')
+        sent = _sent(notary)
+        assert sent[-2] == "g.V('v1').drop()"
+        assert "g.V('v2').property(single" in sent[-1] and 'constant(-2)' in sent[-1]
+        assert not is_idempotent_command(notary.send.call_args_list[-1][0][0])
+
+    def test_deletes_read_from_the_writer(self, notary, monkeypatch):
+        monkeypatch.setenv('MATERIALIZED_EDGE_COUNTS', 'true')
+        read_notary = MagicMock()
+        notary.send.side_effect = lambda command, read_only=False, compact=False: \
+            [{'v2': {'knows': 1}}] if 'group()' in str(command) else ['knows'] if read_only else []
+        driver = TridentDriver(
+            read_notary=read_notary, write_notary=notary, query_cache=QueryResultCache(100, 1024 * 1024, 60))
+        driver.query_cache.put("g.E('e1').label()", ['stale'])
+        Ogm(driver).delete_edge('e1')
+        Ogm(driver).delete_vertex('v1')
+        sent = _sent(notary)
+        assert edge_count_key('knows') in sent[sent.index("g.E('e1').label()") + 1]
+        assert "g.V('v2').property(single" in sent[-1]
+        assert read_notary.send.call_count == 0
+
+    def test_rebuild(self, ogm, notary):
+        notary.send.side_effect = lambda command, read_only=False, compact=False: \
+            [{'v1': {'knows': 4}, 'v2': {}}] if read_only else [{'r0': [], 'r1': []}]
+        results = ogm.rebuild_edge_counts(['v1', 'v2'])
+        assert [x.succeeded for x in results] == [True, True]
+        chunk = _sent(notary)[-1]
+        assert f"property(single, '{edge_count_key('knows')}', 4)" in chunk
+        assert chunk.count(f"property(single, '{edge_counts_ready}', true)") == 2
+
+    def test_counters_are_not_vertex_properties(self):
+        vertex = TridentVertex('v1', 'Person', {
+            edge_count_key('knows'): [TridentProperty(edge_count_key('knows'), 3)],
+            edge_counts_ready: [TridentProperty(edge_counts_ready, True)]
+        })
+        assert 'vertex_properties' not in vertex.to_gql
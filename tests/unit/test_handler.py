@@ -0,0 +1,71 @@
+import importlib
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+handler_module = importlib.import_module('toll_booth.handler')
+
+
+def _slow_resolve(event):
+    time.sleep(0.05)
+    if event['field_name'] == 'broken':
+        raise RuntimeError('something went wrong')
+    return event['field_name']
+
+
+@pytest.mark.batch_handler
+class TestBatchHandler:
+    def test_batch_keeps_order(self):
+        events = [{'field_name': f'field_{x}'} for x in range(20)]
+        with patch.object(handler_module, '_resolve_entry', side_effect=_slow_resolve):
+            results = handler_module._resolve_batch(events)
+        assert results == [{'data': f'field_{x}'} for x in range(20)]
+
+    def test_batch_isolates_errors(self):
+        events = [{'field_name': 'first'}, {'field_name': 'broken'}, {'field_name': 'last'}]
+        with patch.object(handler_module, '_resolve_entry', side_effect=_slow_resolve):
+            results = handler_module._resolve_batch(events)
+        assert results[0] == {'data': 'first'} and results[2] == {'data': 'last'}
+        assert results[1] == {'data': None, 'errorMessage': 'something went wrong', 'errorType': 'RuntimeError'}
+
+    def test_batch_concurrency_is_capped(self, monkeypatch):
+        monkeypatch.setenv('BATCH_MAX_WORKERS', '3')
+        lock = threading.Lock()
+        counts = {'in_flight': 0, 'peak': 0}
+
+        def _counted_resolve(event):
+            with lock:
+                counts['in_flight'] += 1
+                counts['peak'] = max(counts['peak'], counts['in_flight'])
+            time.sleep(0.02)
+            with lock:
+                counts['in_flight'] -= 1
+            return event
+
+        events = [{'field_name': x} for x in range(12)]
+        with patch.object(handler_module, '_resolve_entry', side_effect=_counted_resolve):
+            handler_module._resolve_batch(events)
+        assert counts['peak'] <= 3
+
+    def test_batch_connected_edges_use_one_query(self):
+        events = [{
+            'type_name': 'Vertex',
+            'field_name': 'connected_edges',
+            'context': {
+                'arguments': {}, 'source': {'internal_id': f'vertex_{x}'},
+                'result': None, 'request': {}, 'identity': {}
+            }
+        } for x in range(100)]
+        edge_connections = {
+            f'vertex_{x}': [{'edge_label': '_fake_edge_', 'total_count': x}] for x in range(100) if x != 7
+        }
+        with patch('toll_booth.obj.registry.get_ogm') as mock_get_ogm:
+            mock_ogm = mock_get_ogm.return_value
+            mock_ogm.query_edge_connections_many.return_value = edge_connections
+            results = handler_module._resolve_batch(events)
+        assert mock_ogm.query_edge_connections_many.call_count == 1
+        assert not mock_ogm.query_edge_connections.called
+        assert results[3] == {'data': [{'edge_label': '_fake_edge_', 'total_count': 3}]}
+        assert results[7] == {'data': []}
@@ -0,0 +1,75 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from toll_booth.obj.graph.loader import OgmLoader
+
+
+def _mock_ogm():
+    ogm = MagicMock(name='ogm')
+    ogm.query_vertexes.side_effect = lambda ids: {x: f'vertex#{x}' for x in ids if x != 'missing'}
+    ogm.query_edge_connections_many.side_effect = lambda ids, labels: {
+        x: [{'edge_label': 'some_label'}] for x in ids if x != 'missing'}
+    return ogm
+
+
+@pytest.mark.loader
+class TestOgmLoader:
+    def test_repeated_lookups_are_memoized(self):
+        ogm = _mock_ogm()
+        loader = OgmLoader(ogm)
+        assert loader.load_vertex('vertex_1') == 'vertex#vertex_1'
+        assert loader.load_vertex('vertex_1') == 'vertex#vertex_1'
+        assert ogm.query_vertexes.call_count == 1
+        assert loader.stats['hits'] == 1
+
+    def test_many_lookups_are_deduped_and_batched(self):
+        ogm = _mock_ogm()
+        loader = OgmLoader(ogm)
+        loader.load_vertex('vertex_1')
+        results = loader.load_vertexes(['vertex_1', 'vertex_2', 'vertex_2', 'missing'])
+        assert results == ['vertex#vertex_1', 'vertex#vertex_2', 'vertex#vertex_2', None]
+        ogm.query_vertexes.assert_called_with(['vertex_2', 'missing'])
+
+    def test_in_flight_lookups_are_coalesced(self):
+        ogm = _mock_ogm()
+
+        def _slow_page(*args):
+            time.sleep(0.05)
+            return 'some_page'
+
+        ogm.get_connected_edge_page.side_effect = _slow_page
+        loader = OgmLoader(ogm)
+        results = []
+        workers = [threading.Thread(
+            target=lambda: results.append(loader.load_connected_edge_page('user', 'vertex_1', 'label', 10)))
+            for _ in range(5)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert results == ['some_page'] * 5
+        assert ogm.get_connected_edge_page.call_count == 1
+
+    def test_failed_lookups_are_not_memoized(self):
+        ogm = _mock_ogm()
+        ogm.query_vertex_properties.side_effect = [RuntimeError('boom'), ['some_property']]
+        loader = OgmLoader(ogm)
+        with pytest.raises(RuntimeError):
+            loader.load_vertex_properties('vertex_1')
+        assert loader.load_vertex_properties('vertex_1') == ['some_property']
+
+    def test_missing_vertexes_have_no_edge_connections(self):
+        loader = OgmLoader(_mock_ogm())
+        assert loader.load_edge_connections('missing') == []
+        assert loader.load_edge_connections_many(['vertex_1', 'missing']) == [[{'edge_label': 'some_label'}], []]
+
+    def test_clear(self):
+        ogm = _mock_ogm()
+        loader = OgmLoader(ogm)
+        loader.load_edge_connections('vertex_1', ['some_label'])
+        loader.clear()
+        loader.load_edge_connections('vertex_1', ['some_label'])
+        assert ogm.query_edge_connections_many.call_count == 2
@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from toll_booth.obj import metrics
+
+
+@pytest.fixture
+def metric_sink():
+    sink = metrics.ListSink()
+    metrics.set_sink(sink)
+    metrics.flush()
+    sink.documents.clear()
+    yield sink
+    metrics.set_sink(None)
+
+
+@pytest.mark.metrics
+class TestMetrics:
+    def test_flush_emits_emf(self, metric_sink):
+        with metrics.timed('neptune_round_trip'):
+            time.sleep(0.01)
+        metrics.record_bytes('neptune_response_bytes', 2048)
+        metrics.record_count('neptune_requests')
+        metrics.record_count('neptune_requests')
+        metrics.flush({'type_name': 'Vertex', 'field_name': 'connected_edges'})
+        document = metric_sink.documents[0]
+        assert document['neptune_round_trip'] >= 10
+        assert document['neptune_response_bytes'] == 2048
+        assert document['neptune_requests'] == 2
+        assert document['type_name'] == 'Vertex'
+        emf_definition = document['_aws']['CloudWatchMetrics'][0]
+        assert emf_definition['Dimensions'] == [['type_name', 'field_name']]
+        units = {x['Name']: x['Unit'] for x in emf_definition['Metrics']}
+        assert units == {
+            'neptune_round_trip': 'Milliseconds', 'neptune_requests': 'Count', 'neptune_response_bytes': 'Bytes'}
+
+    def test_flush_starts_a_new_invocation(self, metric_sink):
+        metrics.record_count('neptune_requests')
+        metrics.flush()
+        metrics.flush()
+        assert 'neptune_requests' not in metric_sink.documents[1]
@@ -0,0 +1,132 @@
+import pytest
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.ogm import Ogm
+from toll_booth.obj.graph.prefetch import EdgePagePrefetcher, reset_edge_page_prefetcher
+from toll_booth.obj.graph.trident.trident_obj import pages
+from toll_booth.obj.graph.trident.trident_obj.edge import TridentEdge
+from toll_booth.obj.graph.trident.trident_obj.pages import PaginationToken
+from toll_booth.obj.graph.trident.trident_obj.vertex import TridentVertex
+
+
+class _PlainKipper:
+    def __init__(self, *args):
+        pass
+
+    def encrypt(self, text, context):
+        return text
+
+    def decrypt(self, text, context):
+        return text
+
+
+class _EdgeDriver:
+    """answers edge page queries from a list of edges, in storage order for offsets and id order for cursors"""
+    def __init__(self, edges):
+        self.edges = edges
+        self.queries = []
+
+    def execute(self, query, read_only=False, compact=False):
+        self.queries.append(query)
+        bindings = list(query.bindings.values())
+        if '.range(' in query.script:
+            return self.edges[bindings[-2]:bindings[-1]]
+        ordered = sorted(self.edges, key=lambda x: x.internal_id)
+        if '.has(id, gt(' in query.script:
+            ordered = [x for x in ordered if x.internal_id > bindings[2]]
+        return ordered[:bindings[-1]]
+
+
+def _edge(x):
+    return TridentEdge(f'edge_{x:03}', '_rel_', TridentVertex('source', 'Patient'), TridentVertex(f'v_{x}', 'Provider'))
+
+
+def _page_through(ogm, page_size):
+    pages_served, next_token = [], None
+    while True:
+        page = ogm.get_connected_edge_page('some_user', 'source', '_rel_', page_size, next_token)
+        pages_served.append([x.internal_id for x in page.to_gql['edges']])
+        if not page.to_gql['page_info'].to_gql['more']:
+            return pages_served
+        next_token = page.to_gql['page_info'].to_gql['next_token'].package()
+
+
+@pytest.fixture(autouse=True)
+def plain_tokens(monkeypatch):
+    monkeypatch.setattr(pages, 'SneakyKipper', _PlainKipper)
+
+
+@pytest.mark.pagination
+class TestCursorPagination:
+    def test_token_round_trip(self):
+        token = PaginationToken.for_cursor('some_user', 10)
+        token.increment('edge_009')
+        restored = PaginationToken.from_encrypted_token(token.package(), 'some_user')
+        assert (restored.last_internal_id, restored.inclusive_start, restored.is_cursor) == ('edge_009', 10, True)
+        legacy = PaginationToken.from_encrypted_token(PaginationToken('some_user', 20, 10).package(), 'some_user')
+        assert not legacy.is_cursor and legacy.inclusive_start == 20
+
+    def test_pages_resume_after_the_cursor(self, monkeypatch):
+        monkeypatch.setenv('EDGE_PAGINATION', 'cursor')
+        driver = _EdgeDriver([_edge(x) for x in reversed(range(25))])
+        served = _page_through(Ogm(driver), 10)
+        assert [len(x) for x in served] == [10, 10, 5]
+        assert sum(served, []) == [f'edge_{x:03}' for x in range(25)]
+        assert all('.range(' not in x.script for x in driver.queries)
+        assert driver.queries[-1].script.endswith('.has(id, gt(_p2)).order().by(id).limit(_p3)')
+
+    def test_pages_are_stable_when_edges_are_added(self, monkeypatch):
+        monkeypatch.setenv('EDGE_PAGINATION', 'cursor')
+        driver = _EdgeDriver([_edge(x) for x in range(0, 40, 2)])
+        first = Ogm(driver).get_connected_edge_page('some_user', 'source', '_rel_', 5)
+        driver.edges.insert(0, _edge(1))
+        next_token = first.to_gql['page_info'].to_gql['next_token'].package()
+        second = Ogm(driver).get_connected_edge_page('some_user', 'source', '_rel_', 5, next_token)
+        assert [x.internal_id for x in second.to_gql['edges']] == [f'edge_{x:03}' for x in range(10, 20, 2)]
+
+    def test_offset_is_the_default(self):
+        driver = _EdgeDriver([_edge(x) for x in range(25)])
+        page = Ogm(driver).get_connected_edge_page('some_user', 'source', '_rel_', 10)
+        assert driver.queries[-1].script.endswith('.range(_p2, _p3)')
+        assert not page.to_gql['page_info'].to_gql['next_token'].is_cursor
+
+    def test_offset_tokens_keep_working(self):
+        driver = _EdgeDriver([_edge(x) for x in range(25)])
+        legacy_token = PaginationToken('some_user', 10, 10).package()
+        page = Ogm(driver).get_connected_edge_page('some_user', 'source', '_rel_', 10, legacy_token)
+        assert [x.internal_id for x in page.to_gql['edges']] == [f'edge_{x:03}' for x in range(10, 20)]
+        assert '.range(' in driver.queries[-1].script
+        assert not page.to_gql['page_info'].to_gql['next_token'].is_cursor
+
+
+@pytest.mark.pagination
+class TestEdgePagePrefetch:
+    def test_next_pages_are_served_from_memory(self, monkeypatch):
+        monkeypatch.setenv('EDGE_PAGE_PREFETCH', 'true')
+        monkeypatch.setenv('EDGE_PAGE_PREFETCH_WINDOW', '2')
+        reset_edge_page_prefetcher()
+        driver = _EdgeDriver([_edge(x) for x in range(25)])
+        try:
+            served = _page_through(Ogm(driver), 5)
+        finally:
+            reset_edge_page_prefetcher()
+        assert sum(served, []) == [f'edge_{x:03}' for x in range(25)]
+        assert len(driver.queries) == 5
+        assert metrics.get_current().counts['edge_page_prefetch_hits'] >= 3
+
+    def test_pages_are_scoped(self):
+        prefetcher = EdgePagePrefetcher(window=1, ttl=60, max_entries=10, max_workers=1)
+        token = PaginationToken.for_cursor('some_user', 5)
+        prefetcher.schedule(token, lambda x: ('some_page', False), ('vertex_1', '_rel_', 5))
+        assert prefetcher.take(token, ('vertex_2', '_rel_', 5)) is None
+        assert prefetcher.take(token, ('vertex_1', '_rel_', 5)) == 'some_page'
+        assert prefetcher.take(token, ('vertex_1', '_rel_', 5)) is None
+
+    def test_failed_prefetches_fall_back(self):
+        prefetcher = EdgePagePrefetcher(window=1, ttl=60, max_entries=10, max_workers=1)
+        token = PaginationToken.for_cursor('some_user', 5)
+
+        def _fail(pagination_token):
+            raise RuntimeError('no')
+        prefetcher.schedule(token, _fail)
+        assert prefetcher.take(token) is None
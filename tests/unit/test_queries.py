@@ -0,0 +1,100 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from tests.test_setup.gremlin_server import StandInGremlinServer
+from toll_booth.obj.graph.generators import create_vertex_command
+from toll_booth.obj.graph.gql_scalars.object_properties import ObjectProperty, LocalPropertyValue
+from toll_booth.obj.graph.trident.caching import QueryResultCache
+from toll_booth.obj.graph.trident.connections import generate_payload
+from toll_booth.obj.graph.trident.queries import GremlinQuery, quote_literal
+from toll_booth.obj.graph.trident.retries import RetryPolicy, is_idempotent_command
+from toll_booth.obj.graph.trident.sockets import TridentSocketNotary
+from toll_booth.obj.graph.trident.trident_driver import TridentDriver
+
+
+def _vertex_command(internal_id, id_value):
+    return create_vertex_command(
+        internal_id, 'Patient',
+        ObjectProperty('id_value', LocalPropertyValue(id_value, 'N')),
+        ObjectProperty('identifier_stem', LocalPropertyValue("#Patient#{\"o'brien\": \"$x\"}#", 'S')),
+        [ObjectProperty('active', LocalPropertyValue('true', 'B'))])
+
+
+class _RecordingNotary:
+    def __init__(self):
+        self.commands = []
+
+    def send(self, command, read_only=False, compact=False):
+        self.commands.append(command)
+        if command.script.startswith('g.inject(0).project('):
+            return [{f'r{x}': [] for x in range(command.script.count('.by('))}]
+        return [str(command)]
+
+
+@pytest.mark.gremlin_queries
+class TestGremlinQuery:
+    def test_values_are_bound(self):
+        query = GremlinQuery.build('g.V({}).hasLabel({})', 'some_id', ['a', 'b'])
+        assert query.script == 'g.V(_p0).hasLabel(_p1, _p2)'
+        assert query.bindings == {'_p0': 'some_id', '_p1': 'a', '_p2': 'b'}
+        assert str(query) == "g.V('some_id').hasLabel('a', 'b')"
+
+    def test_literals_are_escaped(self):
+        assert quote_literal("o'brien \\ $x") == "'o\\'brien \\\\ $x'"
+        assert quote_literal(Decimal('1.5')) == '1.5'
+        assert quote_literal(True) == 'true'
+        assert quote_literal(datetime(2019, 1, 2)) == "datetime('2019-01-02T00:00:00')"
+
+    def test_join_renumbers_bindings(self):
+        first = GremlinQuery.build('g.V({})', 'one')
+        second = GremlinQuery.build('g.V({}).property({}, {})', 'two', 'name', 'value')
+        joined = GremlinQuery.join([first, second, 'g.V().count()'])
+        assert joined.script == 'g.V(_p0);g.V(_p1).property(_p2, _p3);g.V().count()'
+        assert str(joined) == "g.V('one');g.V('two').property('name', 'value');g.V().count()"
+
+    def test_vertex_command_template_is_stable(self):
+        first, second = _vertex_command('vertex_1', '1001'), _vertex_command('vertex_2', '1002')
+        assert first.script == second.script
+        assert first.bindings['_p0'] == 'vertex_1'
+        assert is_idempotent_command(first)
+        assert str(first).startswith("g.V('vertex_1').fold().coalesce(unfold(), addV('Patient')")
+
+    def test_payload(self, monkeypatch):
+        query = _vertex_command('vertex_1', '1001')
+        monkeypatch.setenv('GRAPH_DB_USE_BINDINGS', 'false')
+        assert json.loads(generate_payload(query)) == {'gremlin': str(query)}
+        monkeypatch.setenv('GRAPH_DB_USE_BINDINGS', 'true')
+        payload = json.loads(generate_payload(query))
+        assert payload['gremlin'] == query.script
+        assert payload['bindings']['_p0'] == 'vertex_1'
+        assert 1001 in payload['bindings'].values()
+
+    def test_socket_notary_sends_bindings(self, monkeypatch):
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+        monkeypatch.setenv('GRAPH_DB_USE_BINDINGS', 'true')
+        server = StandInGremlinServer(lambda x: [x])
+        notary = TridentSocketNotary(
+            '127.0.0.1', retry_policy=RetryPolicy(1), port=server.port, use_ssl=False, request_timeout=5)
+        try:
+            assert notary.send(GremlinQuery.build('g.V({})', 'some_id'), read_only=True) == ['g.V(_p0)']
+            assert server.bindings == [{'_p0': 'some_id'}]
+        finally:
+            notary.close()
+            server.close()
+
+    def test_driver_caches_on_rendered_text(self):
+        notary = _RecordingNotary()
+        driver = TridentDriver(read_notary=notary, write_notary=notary, query_cache=QueryResultCache())
+        driver.execute(GremlinQuery.build('g.V({})', 'vertex_1'), read_only=True)
+        driver.execute("g.V('vertex_1')", read_only=True)
+        assert len(notary.commands) == 1
+        with driver:
+            driver.execute(GremlinQuery.build('g.V({}).drop()', 'vertex_1'))
+            driver.execute(GremlinQuery.build('g.V({}).drop()', 'vertex_2'))
+        assert notary.commands[-1].script == \
+            "g.inject(0).project('r0', 'r1').by(V(_p0).drop().fold()).by(V(_p1).drop().fold())"
+        assert driver.query_cache.stats['entries'] == 0
@@ -0,0 +1,140 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.ogm import Ogm
+from toll_booth.obj.graph.trident import TridentDriver
+from toll_booth.obj.graph.trident.caching import QueryResultCache, extract_internal_ids
+from toll_booth.obj.graph.trident.trident_obj.edge import TridentEdge
+from toll_booth.obj.graph.trident.trident_obj.vertex import TridentVertex
+
+
+@pytest.fixture
+def notary():
+    notary = MagicMock()
+    notary.send.side_effect = lambda command, read_only=False, compact=False: [command]
+    return notary
+
+
+@pytest.fixture
+def driver(notary):
+    return TridentDriver(read_notary=notary, write_notary=notary, query_cache=QueryResultCache(100, 1024 * 1024, 60))
+
+
+@pytest.mark.query_cache
+class TestQueryResultCache:
+    def test_extract_internal_ids(self):
+        command = "g.E('edge_1').fold().coalesce(unfold(), addE('knows').from(g.V('vertex_1')).to(g.V(\"vertex_2\")))"
+        assert extract_internal_ids(command) == {'edge_1', 'vertex_1', 'vertex_2'}
+        assert extract_internal_ids("g.V('a', 'b').group().by(id)") == {'a', 'b'}
+        assert extract_internal_ids("g.V().hasLabel('Person')") == set()
+
+    def test_reads_are_cached_on_normalized_text(self, driver, notary):
+        assert driver.execute("g.V('vertex_1')", read_only=True) == ["g.V('vertex_1')"]
+        assert driver.execute("g.V('vertex_1')  ", read_only=True) == ["g.V('vertex_1')"]
+        assert notary.send.call_count == 1
+        assert driver.query_cache.stats['hits'] == 1
+
+    def test_compact_reads_are_cached_apart(self, driver, notary):
+        notary.send.side_effect = lambda command, read_only=False, compact=False: [('compact', compact)]
+        assert driver.execute("g.V('vertex_1')", read_only=True, compact=True) == [('compact', True)]
+        assert driver.execute("g.V('vertex_1')", read_only=True) == [('compact', False)]
+        assert driver.execute("g.V('vertex_1')", read_only=True, compact=True) == [('compact', True)]
+        assert notary.send.call_count == 2
+        driver.invalidate(['vertex_1'])
+        assert driver.query_cache.stats['entries'] == 0
+
+    def test_writes_invalidate_what_they_touch(self, driver, notary):
+        driver.execute("g.V('vertex_1').bothE().count()", read_only=True)
+        driver.execute("g.V('vertex_2').bothE().count()", read_only=True)
+        driver.execute("g.V().hasLabel('Person')", read_only=True)
+        driver.execute("g.E('edge_1').fold().coalesce(unfold(), addE('knows').from(g.V('vertex_1')).to(g.V('vertex_3')))")
+        driver.execute("g.V('vertex_1').bothE().count()", read_only=True)
+        driver.execute("g.V('vertex_2').bothE().count()", read_only=True)
+        assert notary.send.call_count == 5
+        assert driver.query_cache.stats['entries'] == 2
+        assert driver.query_cache.stats['hits'] == 1
+
+    def test_execute_many_invalidates_its_writes(self, driver, notary):
+        notary.send_many = None
+        driver.execute("g.V('vertex_1').bothE().count()", read_only=True)
+        driver.execute("g.V('vertex_2').bothE().count()", read_only=True)
+        notary.send.side_effect = RuntimeError('the write failed part way')
+        with pytest.raises(RuntimeError):
+            driver.execute_many(["g.V('vertex_1').property('name', 'x')", "g.V('vertex_2').property('name', 'y')"])
+        assert driver.query_cache.stats['entries'] == 0
+
+    def test_execute_many_reads_through_the_cache(self, driver, notary):
+        notary.send_many = None
+        driver.execute("g.V('vertex_1')", read_only=True)
+        results = driver.execute_many(["g.V('vertex_1')", "g.V('vertex_2')"], read_only=True)
+        assert results == [["g.V('vertex_1')"], ["g.V('vertex_2')"]]
+        assert notary.send.call_count == 2
+        assert driver.query_cache.stats['entries'] == 2
+
+    def test_execute_many_joins_the_batch(self, driver, notary):
+        notary.send.side_effect = lambda command, read_only=False, compact=False: [{'r0': [], 'r1': []}]
+        with driver:
+            assert driver.execute_many(["g.addV('Person')", "g.V('vertex_1').drop()"]) is None
+        assert notary.send.call_count == 1
+        assert len(driver.batch_results) == 2
+
+    def test_deleting_a_known_edge_invalidates_its_vertexes(self):
+        query_cache = QueryResultCache(100, 1024 * 1024, 60)
+        edge = TridentEdge('edge_1', 'knows', TridentVertex('vertex_1', 'Person'), TridentVertex('vertex_2', 'Person'))
+        query_cache.put("g.V('vertex_1').bothE()", [edge])
+        query_cache.put("g.V('vertex_2').bothE().count()", [1])
+        query_cache.invalidate(['edge_1'])
+        assert query_cache.stats['entries'] == 0
+
+    def test_ogm_delete_edge_looks_up_the_vertexes(self, driver, notary):
+        notary.send.side_effect = lambda command, read_only=False, compact=False: ['vertex_1', 'vertex_2'] if read_only else []
+        driver.query_cache.put("g.V('vertex_2').bothE().count()", [1])
+        Ogm(driver).delete_edge('edge_1')
+        assert driver.query_cache.stats['entries'] == 0
+        assert driver.query_cache.get("g.V('vertex_2').bothE().count()") is None
+
+    def test_ogm_delete_vertex_invalidates_the_neighbours(self, driver, notary):
+        notary.send.side_effect = lambda command, read_only=False, compact=False: ['vertex_2'] if read_only else []
+        driver.query_cache.put("g.V('vertex_2').bothE().group().by(label).by(count())", [{'knows': 1}])
+        driver.query_cache.put("g.V('vertex_1')", ['vertex_1'])
+        Ogm(driver).delete_vertex('vertex_1')
+        assert "g.V('vertex_1').both().id()" in [str(x[0][0]) for x in notary.send.call_args_list]
+        assert driver.query_cache.stats['entries'] == 0
+
+    def test_stale_reads_are_not_stored(self):
+        query_cache = QueryResultCache(100, 1024 * 1024, 60)
+        generation = query_cache.generation
+        query_cache.invalidate(['vertex_1'])
+        query_cache.put("g.V('vertex_1')", ['stale'], generation)
+        assert query_cache.get("g.V('vertex_1')") is None
+
+    def test_bounded_by_entries_bytes_and_age(self):
+        query_cache = QueryResultCache(2, 1024 * 1024, 60)
+        for x in range(3):
+            query_cache.put(f"g.V('vertex_{x}')", [x])
+        assert query_cache.get("g.V('vertex_0')") is None
+        assert query_cache.stats['evictions'] == 1
+        query_cache = QueryResultCache(100, 2000, 60)
+        query_cache.put("g.V('vertex_1')", ['x' * 1500])
+        query_cache.put("g.V('vertex_2')", ['x' * 1500])
+        assert query_cache.stats['entries'] == 1
+        assert query_cache.stats['bytes'] <= 2000
+        query_cache = QueryResultCache(100, 1024 * 1024, 0)
+        query_cache.put("g.V('vertex_1')", [1])
+        assert query_cache.get("g.V('vertex_1')") is None
+
+    def test_metrics(self, driver):
+        sink = metrics.ListSink()
+        metrics.set_sink(sink)
+        metrics.flush()
+        driver.execute("g.V('vertex_1')", read_only=True)
+        driver.execute("g.V('vertex_1')", read_only=True)
+        driver.query_cache.publish_metrics()
+        document = metrics.flush()
+        metrics.set_sink(None)
+        assert document['query_cache_hits'] == 1
+        assert document['query_cache_misses'] == 1
+        assert 'query_cache_hit_ratio' not in document
+        assert document['query_cache_bytes'] > 0
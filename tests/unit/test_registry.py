@@ -0,0 +1,50 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from toll_booth.obj import registry
+
+
+@pytest.mark.registry
+@pytest.mark.usefixtures('unit_test_environment')
+class TestRegistry:
+    def test_ogm_reused_across_invocations(self):
+        with patch('toll_booth.obj.graph.ogm.Ogm') as mock_ogm:
+            first = registry.get_ogm()
+            second = registry.get_ogm()
+        assert first is second
+        assert mock_ogm.call_count == 1
+
+    def test_ogm_rebuilt_when_endpoint_changes(self, monkeypatch):
+        with patch('toll_booth.obj.graph.ogm.Ogm') as mock_ogm:
+            registry.get_ogm()
+            monkeypatch.setenv('GRAPH_DB_READER_ENDPOINT', 'some_new_reader_endpoint')
+            registry.get_ogm()
+        assert mock_ogm.call_count == 2
+
+    def test_ogm_rebuilt_when_credentials_change(self, monkeypatch):
+        with patch('toll_booth.obj.graph.ogm.Ogm') as mock_ogm:
+            registry.get_ogm()
+            monkeypatch.setenv('AWS_SESSION_TOKEN', 'some_rotated_token')
+            registry.get_ogm()
+        assert mock_ogm.call_count == 2
+
+    def test_boto3_resources_kept_per_thread(self):
+        found = []
+        with patch('toll_booth.obj.registry.boto3') as mock_boto:
+            mock_boto.resource.side_effect = lambda x: object()
+            found.append(registry.get_boto3_resource('dynamodb'))
+            found.append(registry.get_boto3_resource('dynamodb'))
+            worker = threading.Thread(target=lambda: found.append(registry.get_boto3_resource('dynamodb')))
+            worker.start()
+            worker.join()
+        assert found[0] is found[1]
+        assert found[0] is not found[2]
+
+    def test_reset(self):
+        with patch('toll_booth.obj.registry.boto3') as mock_boto:
+            registry.get_boto3_client('ssm')
+            registry.reset()
+            registry.get_boto3_client('ssm')
+        assert mock_boto.client.call_count == 2
@@ -0,0 +1,93 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.trident.connections import TridentNotary
+from toll_booth.obj.graph.trident.retries import RetryPolicy, classify_response, is_idempotent_command
+from toll_booth.obj.graph.trident.troubles import NeptuneException, TransientNeptuneException, \
+    AmbiguousNeptuneException
+
+_upsert = "g.V('some_id').fold().coalesce(unfold(), addV('Person').property(id, 'some_id'))"
+
+
+def _response(status_code, body):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = json.dumps(body)
+    response.content = response.text.encode('utf-8')
+    return response
+
+
+def _error(error_code, status_code=500):
+    return _response(status_code, {'requestId': 'some_request', 'code': error_code, 'detailedMessage': 'failed'})
+
+
+_success = _response(200, {'result': {'data': {'@type': 'g:List', '@value': []}}})
+
+
+@pytest.fixture
+def notary(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+    metrics.set_sink(metrics.ListSink())
+    metrics.flush()
+    yield TridentNotary('some_endpoint', session=MagicMock(), retry_policy=RetryPolicy(4, 0, 0))
+    metrics.set_sink(None)
+
+
+@pytest.mark.retries
+class TestRetries:
+    def test_idempotency(self):
+        assert is_idempotent_command("g.V('some_id').bothE().count()")
+        assert is_idempotent_command(_upsert)
+        assert is_idempotent_command(f"{_upsert};g.E('some_edge').drop()")
+        assert not is_idempotent_command("g.addV('Person')")
+        assert not is_idempotent_command(f"{_upsert};g.addV('Person')")
+
+    @pytest.mark.parametrize('status_code, error_code, expected', [
+        (500, 'ConcurrentModificationException', TransientNeptuneException),
+        (429, None, TransientNeptuneException),
+        (400, 'ReadOnlyViolationException', TransientNeptuneException),
+        (500, 'InternalFailureException', AmbiguousNeptuneException),
+        (503, None, AmbiguousNeptuneException),
+        (400, 'MalformedQueryException', NeptuneException),
+    ])
+    def test_classification(self, status_code, error_code, expected):
+        exception = classify_response(status_code, json.dumps({'code': error_code}), 'g.V()')
+        assert type(exception) is expected
+        assert isinstance(exception, RuntimeError)
+
+    def test_write_conflicts_retried(self, notary):
+        notary._session.post.side_effect = [_error('ConcurrentModificationException')] * 2 + [_success]
+        assert notary.send("g.addV('Person')") == []
+        assert notary._session.post.call_count == 3
+        assert metrics.get_current().counts['neptune_retries'] == 2
+
+    def test_ambiguous_failures_only_retried_when_idempotent(self, notary):
+        notary._session.post.side_effect = [_error('InternalFailureException'), _success]
+        with pytest.raises(AmbiguousNeptuneException):
+            notary.send("g.addV('Person')")
+        notary._session.post.side_effect = [_error('InternalFailureException'), _success]
+        assert notary.send(_upsert) == []
+        notary._session.post.side_effect = [requests.exceptions.ConnectionError(), _success]
+        assert notary.send("g.V().count()", read_only=True) == []
+
+    def test_read_only_violation_drops_connections(self, notary):
+        notary._session.post.side_effect = [_error('ReadOnlyViolationException', 400), _success]
+        notary.send(_upsert)
+        notary._session.close.assert_called_once()
+
+    def test_retries_exhausted(self, notary):
+        notary._session.post.side_effect = [_error('ThrottlingException')] * 4
+        with pytest.raises(TransientNeptuneException):
+            notary.send(_upsert)
+        assert notary._session.post.call_count == 4
+        assert metrics.get_current().counts['neptune_retries_exhausted'] == 1
+
+    def test_backoff_is_bounded(self):
+        retry_policy = RetryPolicy(5, 0.05, 0.2)
+        with patch('toll_booth.obj.graph.trident.retries.random.uniform', side_effect=lambda x, y: y):
+            assert [retry_policy.get_delay(x) for x in range(4)] == [0.05, 0.1, 0.2, 0.2]
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from toll_booth.obj.graph.trident.retries import RetryPolicy
+from toll_booth.obj.graph.trident.routing import ReaderEndpoint, ReaderPool
+from toll_booth.obj.graph.trident.troubles import NeptuneException, AmbiguousNeptuneException
+
+
+class _FakeNotary:
+    def __init__(self, name, delay=0.0, failures=0, exception=None):
+        self.name = name
+        self.delay = delay
+        self.failures = failures
+        self.exception = exception
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send(self, command, read_only=False, compact=False):
+        with self._lock:
+            self.calls += 1
+            failing = self.failures > 0
+            if failing:
+                self.failures -= 1
+        time.sleep(self.delay)
+        if failing:
+            raise self.exception or ConnectionError(f'{self.name} is down')
+        return [self.name]
+
+
+def _pool(*notaries, **kwargs):
+    kwargs.setdefault('retry_policy', RetryPolicy(3, 0, 0))
+    kwargs.setdefault('hedge_reads', False)
+    return ReaderPool([ReaderEndpoint(x.name, x) for x in notaries], **kwargs)
+
+
+@pytest.mark.reader_pool
+class TestReaderPool:
+    def test_reads_favor_the_faster_replica(self):
+        fast, slow = _FakeNotary('fast', 0.001), _FakeNotary('slow', 0.02)
+        reader_pool = _pool(fast, slow)
+        for _ in range(20):
+            reader_pool.send('g.V()')
+        assert slow.calls == 1
+        assert fast.calls == 19
+
+    def test_in_flight_spreads_concurrent_reads(self):
+        first, second = _FakeNotary('first', 0.05), _FakeNotary('second', 0.05)
+        reader_pool = _pool(first, second)
+        reader_pool.send('g.V()')
+        reader_pool.send('g.V()')
+        reader_pool.send_many(['g.V()'] * 8)
+        assert first.calls >= 4 and second.calls >= 4
+
+    def test_failed_reads_retry_on_another_replica(self):
+        broken, healthy = _FakeNotary('broken', failures=1), _FakeNotary('healthy')
+        reader_pool = _pool(broken, healthy)
+        assert reader_pool.send('g.V()') in (['broken'], ['healthy'])
+        broken.failures = 1
+        reader_pool.endpoints[0].ewma_ms = 0
+        reader_pool.endpoints[1].ewma_ms = 100
+        assert reader_pool.send('g.V()') == ['healthy']
+
+    def test_unhealthy_replica_is_ejected_and_probed(self):
+        broken, healthy = _FakeNotary('broken', failures=100), _FakeNotary('healthy')
+        reader_pool = _pool(broken, healthy, failure_threshold=2, ejection_seconds=0.05)
+        reader_pool.endpoints[1].ewma_ms = 100
+        for _ in range(5):
+            assert reader_pool.send('g.V()') == ['healthy']
+        assert broken.calls == 2
+        assert reader_pool.endpoints[0].ejected_until is not None
+        time.sleep(0.06)
+        broken.failures = 0
+        assert reader_pool.send('g.V()') == ['broken']
+        assert reader_pool.endpoints[0].ejected_until is None
+
+    def test_query_errors_do_not_eject(self):
+        malformed = NeptuneException(400, 'MalformedQueryException', 'bad query', 'g.V(')
+        broken = _FakeNotary('broken', failures=10, exception=malformed)
+        reader_pool = _pool(broken, failure_threshold=1)
+        with pytest.raises(NeptuneException):
+            reader_pool.send('g.V(')
+        assert reader_pool.endpoints[0].ejected_until is None
+        assert broken.calls == 1
+
+    def test_slow_reads_are_hedged(self):
+        primary, backup = _FakeNotary('primary'), _FakeNotary('backup')
+        reader_pool = _pool(primary, backup, hedge_reads=True, hedge_min_samples=5)
+        for _ in range(10):
+            reader_pool.send('g.V()')
+        reader_pool.endpoints[0].ewma_ms = 0
+        reader_pool.endpoints[1].ewma_ms = 1
+        primary.delay = 0.5
+        start = time.perf_counter()
+        assert reader_pool.send('g.V()') == ['backup']
+        assert time.perf_counter() - start < 0.5
+
+    def test_hedge_survives_a_failed_primary(self):
+        primary = _FakeNotary('primary', exception=AmbiguousNeptuneException(500, None, 'down', 'g.V()'))
+        backup = _FakeNotary('backup')
+        reader_pool = _pool(primary, backup, hedge_reads=True, hedge_min_samples=1, retry_policy=RetryPolicy(1))
+        reader_pool.send('g.V()')
+        reader_pool.endpoints[0].ewma_ms = 0
+        reader_pool.endpoints[1].ewma_ms = 1
+        primary.delay, primary.failures = 0.2, 1
+        assert reader_pool.send('g.V()') == ['backup']
+
+    def test_hedged_reads_can_be_sent_many(self, monkeypatch):
+        monkeypatch.setenv('READER_POOL_MAX_WORKERS', '2')
+        first, second = _FakeNotary('first', 0.01), _FakeNotary('second', 0.01)
+        reader_pool = _pool(first, second, hedge_reads=True, hedge_min_samples=1)
+        reader_pool.send('g.V()')
+        results = []
+        sender = threading.Thread(target=lambda: results.extend(reader_pool.send_many(['g.V()'] * 20)), daemon=True)
+        sender.start()
+        sender.join(5)
+        assert not sender.is_alive()
+        assert len(results) == 20
+
+    def test_endpoints_from_configuration(self, monkeypatch):
+        monkeypatch.setenv('GRAPH_DB_READER_ENDPOINTS', 'reader_one, reader_two,')
+        reader_pool = ReaderPool.get_for_reader(notary_class=lambda x, retry_policy: _FakeNotary(x))
+        assert [x.endpoint for x in reader_pool.endpoints] == ['reader_one', 'reader_two']
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+from tests.test_setup.gremlin_server import StandInError, StandInGremlinServer
+from toll_booth.obj.graph.trident import TridentDriver
+from toll_booth.obj.graph.trident.retries import RetryPolicy
+from toll_booth.obj.graph.trident.sockets import TridentSocketNotary
+from toll_booth.obj.graph.trident.troubles import NeptuneException, TridentSocketClosedException
+
+
+def _count_responder(command):
+    if command.startswith('slow'):
+        time.sleep(0.2)
+    if command == 'empty':
+        return []
+    if command == 'conflict':
+        raise StandInError(500, json.dumps({'code': 'ConstraintViolationException', 'detailedMessage': 'no'}))
+    if command.startswith('range'):
+        return [{'@type': 'g:Int64', '@value': x} for x in range(int(command.split(' ')[1]))]
+    return [command]
+
+
+@pytest.fixture
+def server():
+    stand_in = StandInGremlinServer(_count_responder, batch_size=10)
+    yield stand_in
+    stand_in.close()
+
+
+@pytest.fixture
+def socket_notary(server, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+    notary = TridentSocketNotary(
+        '127.0.0.1', retry_policy=RetryPolicy(3, 0, 0), port=server.port, use_ssl=False, request_timeout=5)
+    yield notary
+    notary.close()
+
+
+@pytest.mark.trident_sockets
+class TestTridentSocketNotary:
+    def test_handshake_is_signed(self, server, socket_notary):
+        assert socket_notary.send('g.V()', read_only=True) == ['g.V()']
+        handshake = server.handshakes[0]
+        assert handshake['authorization'].startswith('AWS4-HMAC-SHA256 Credential=some_access_key/')
+        assert 'x-amz-date' in handshake
+
+    def test_partial_content_is_gathered(self, socket_notary):
+        assert socket_notary.send('range 35', read_only=True) == [Decimal(x) for x in range(35)]
+        assert socket_notary.send('empty', read_only=True) == []
+
+    def test_requests_are_multiplexed(self, server, socket_notary):
+        results = {}
+
+        def _send(command):
+            results[command] = socket_notary.send(command, read_only=True)
+
+        threads = [threading.Thread(target=_send, args=(f'slow {x}',)) for x in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == {f'slow {x}': [f'slow {x}'] for x in range(5)}
+        assert len(server.handshakes) == 1
+        assert server.max_in_flight == 5
+
+    def test_send_many_pipelines_one_session(self, server, socket_notary):
+        start = time.perf_counter()
+        results = socket_notary.send_many([f'slow {x}' for x in range(5)] + ['fast'], read_only=True)
+        assert time.perf_counter() - start < 5 * 0.2
+        assert results == [[f'slow {x}'] for x in range(5)] + [['fast']]
+
+    def test_errors_are_classified(self, socket_notary):
+        with pytest.raises(NeptuneException) as exception_info:
+            socket_notary.send('conflict')
+        assert exception_info.value.error_code == 'ConstraintViolationException'
+
+    def test_dropped_session_is_reopened(self, server, socket_notary):
+        socket_notary.send('g.V()', read_only=True)
+        server.drop_connections()
+        time.sleep(0.05)
+        assert socket_notary.send('g.V()', read_only=True) == ['g.V()']
+        assert len(server.handshakes) == 2
+
+    def test_dropped_session_is_not_retried_for_unsafe_writes(self, server, socket_notary):
+        socket_notary.send('g.V()', read_only=True)
+        trident_socket = socket_notary._get_socket()
+        future = trident_socket.submit('slow g.addV()')
+        server.drop_connections()
+        with pytest.raises(TridentSocketClosedException):
+            future.result(5)
+
+    def test_driver_selects_transport(self, socket_notary):
+        driver = TridentDriver(read_notary=socket_notary, write_notary=socket_notary)
+        assert driver.execute('g.V()', read_only=True) == ['g.V()']
+        assert driver.execute_many(['a', 'b'], read_only=True) == [['a'], ['b']]
+        with pytest.raises(RuntimeError):
+            TridentDriver(transport='carrier_pigeon')
@@ -0,0 +1,135 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from toll_booth.obj import metrics
+from toll_booth.obj.graph.ogm import Ogm
+from toll_booth.obj.graph.trident import TridentDriver
+from toll_booth.obj.graph.trident.connections import TridentNotary
+from toll_booth.obj.graph.trident.credentials import CredentialProvider
+from toll_booth.obj.graph.trident.retries import RetryPolicy
+
+
+def _sign(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def _reference_authorization(host, amz_date, payload, access_key, secret_key, region):
+    date_stamp = amz_date[:8]
+    payload_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    canonical_request = f'POST\n/gremlin/\n\nhost:{host}\nx-amz-date:{amz_date}\n\nhost;x-amz-date\n{payload_hash}'
+    scope = f'{date_stamp}/{region}/neptune-db/aws4_request'
+    request_hash = hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    string_to_sign = f'AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n{request_hash}'
+    signing_key = _sign(_sign(_sign(_sign(f'AWS4{secret_key}'.encode('utf-8'), date_stamp), region), 'neptune-db'), 'aws4_request')
+    signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders=host;x-amz-date, Signature={signature}'
+
+
+class _SlowSession:
+    def __init__(self, delay):
+        self._delay = delay
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.authorizations = []
+
+    def post(self, request_url, headers, data):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.authorizations.append(headers['Authorization'])
+        time.sleep(self._delay)
+        with self._lock:
+            self.in_flight -= 1
+        command = json.loads(data)['gremlin']
+        response = MagicMock(status_code=200, headers={})
+        response.text = json.dumps({'result': {'data': {'@type': 'g:List', '@value': [command]}}})
+        response.content = response.text.encode('utf-8')
+        return response
+
+
+@pytest.fixture
+def notary(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+    monkeypatch.delenv('AWS_SESSION_TOKEN', raising=False)
+    return TridentNotary('some_endpoint', credential_provider=CredentialProvider())
+
+
+@pytest.mark.trident_notary
+class TestTridentNotary:
+    @pytest.mark.parametrize('amz_date', ['20240101T000000Z', '20240101T235959Z', '20240102T000001Z'])
+    def test_signing_matches_reference(self, notary, amz_date):
+        canonical_request, payload = notary._generate_canonical_request(amz_date, 'g.V().count()')
+        scope = notary._generate_scope(amz_date[:8])
+        string_to_sign = notary._generate_string_to_sign(canonical_request, amz_date, scope)
+        signature = notary._generate_signature(string_to_sign, amz_date[:8])
+        headers = notary._generate_headers(scope, signature, amz_date)
+        expected = _reference_authorization(
+            'some_endpoint:8182', amz_date, payload, 'some_access_key', 'some_secret_key', notary._region)
+        assert headers['Authorization'] == expected
+        assert headers['x-amz-date'] == amz_date
+
+    def test_signing_key_derived_once_per_day(self, notary):
+        with patch.object(TridentNotary, '_sign', wraps=TridentNotary._sign) as mock_sign:
+            first_key = notary._get_signature_key('20240101', 'some_secret_key')
+            second_key = notary._get_signature_key('20240101', 'some_secret_key')
+            assert first_key == second_key
+            assert mock_sign.call_count == 4
+            notary._get_signature_key('20240102', 'some_secret_key')
+            assert mock_sign.call_count == 8
+
+    def test_rotated_secret_derives_new_key(self, notary):
+        first_key = notary._get_signature_key('20240101', 'some_secret_key')
+        assert notary._get_signature_key('20240101', 'some_rotated_secret_key') != first_key
+
+    def test_content_negotiation(self, monkeypatch):
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+        response = MagicMock(status_code=200, content=b'{"result": {"data": []}}',
+                             headers={'Content-Encoding': 'gzip', 'Content-Length': '10'})
+        session = MagicMock()
+        session.post.return_value = response
+        metrics.flush()
+        notary = TridentNotary('some_endpoint', session=session, compact_responses=True)
+        notary.send("g.V('some_id')", read_only=True)
+        notary.send("g.V('some_id')", read_only=True, compact=True)
+        accepted = [x[1]['headers']['Accept'] for x in session.post.call_args_list]
+        assert accepted == ['application/vnd.gremlin-v3.0+json', 'application/vnd.gremlin-v3.0+json;types=false']
+        assert all(x[1]['headers']['Accept-Encoding'] == 'gzip' for x in session.post.call_args_list)
+        sizes = metrics.get_current().sizes
+        assert sizes['neptune_response_wire_bytes'] == 20
+        assert sizes['neptune_response_bytes_saved'] == 2 * (len(response.content) - 10)
+        assert metrics.get_current().counts['neptune_compact_responses'] == 1
+        TridentNotary('some_endpoint', session=session, compact_responses=False).send("g.V()", compact=True)
+        assert session.post.call_args[1]['headers']['Accept'] == 'application/vnd.gremlin-v3.0+json'
+
+    def test_send_many_overlaps_round_trips(self, monkeypatch):
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'some_access_key')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'some_secret_key')
+        session = _SlowSession(0.05)
+        notary = TridentNotary('some_endpoint', session=session, retry_policy=RetryPolicy(1),
+                               credential_provider=CredentialProvider(), max_concurrency=4)
+        queries = [f"g.V('vertex_{x}')" for x in range(8)]
+        started = time.perf_counter()
+        results = TridentDriver(read_notary=notary, write_notary=notary, query_cache=None).execute_many(
+            queries, read_only=True)
+        assert time.perf_counter() - started < 0.35
+        assert results == [[x] for x in queries]
+        assert session.max_in_flight == 4
+        assert all(x.startswith('AWS4-HMAC-SHA256 Credential=some_access_key/') for x in session.authorizations)
+
+    def test_vertex_lookups_are_fanned_out(self, monkeypatch):
+        monkeypatch.setenv('VERTEX_LOOKUP_CHUNK_SIZE', '2')
+        driver = MagicMock()
+        driver.execute_many.side_effect = lambda queries, read_only, compact: [
+            [MagicMock(vertex_id=y) for y in x.bindings.values()] for x in queries]
+        vertexes = Ogm(driver).query_vertexes([f'vertex_{x}' for x in range(5)])
+        assert sorted(vertexes) == [f'vertex_{x}' for x in range(5)]
+        assert len(driver.execute_many.call_args[0][0]) == 3